@@ -1,13 +1,37 @@
 import os
-import json
 import re
-from groq import Groq
-from dotenv import load_dotenv
+import time
+import threading
 
-load_dotenv()
+import registro
 
-MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+registro.cargar_entorno()
+
+import llm
+from ai_json import ParserExtraccion, parsear
+from ai_reglas import extraer_por_reglas, campos_confiables
+from ai_recorte import recortar
+
+MODEL = llm.MODELOS[0]
+# Stream + parser incremental (ai_json): el resultado está listo con la llave de cierre.
+# IA_STREAM=0 pide la respuesta entera y la parsea al final (para comparar).
+IA_STREAM = os.getenv("IA_STREAM", "1") != "0"
+# Modo JSON de Groq: la respuesta es sólo el objeto (sin fences ni texto alrededor)
+_OPCIONES_LLM = {"response_format": {"type": "json_object"}}
+# Subirlo cada vez que cambie el prompt o el post-proceso: invalida el cache de extracciones.
+PROMPT_VERSION = "4"
+
+
+# clientes Groq: los crea el registro la primera vez que se usan (import groq incluido)
+# max_retries=0: los reintentos, timeouts y fallback los maneja llm.py
+def _crear_cliente():
+    from groq import Groq
+    return Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+
+
+def _crear_cliente_async():
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
 
 
 def _default_data():
@@ -46,42 +70,18 @@ def normalizar_fecha(valor):
     return None
 
 
-def _extract_json(text):
-    """
-    Intenta extraer un JSON válido aunque venga envuelto en ```json ...```
-    o con texto alrededor.
-    """
-    if not text:
-        raise ValueError("Respuesta IA vacía")
-
-    t = text.strip()
-
-    # quita fences ```json ... ```
-    t = re.sub(r"^```(?:json)?\s*", "", t, flags=re.IGNORECASE)
-    t = re.sub(r"\s*```$", "", t)
-
-    # si vino con texto extra, intentamos capturar el primer { ... } grande
-    if not (t.startswith("{") and t.endswith("}")):
-        m = re.search(r"(\{.*\})", t, flags=re.DOTALL)
-        if m:
-            t = m.group(1)
-
-    return json.loads(t)
-
-
-def extraer_datos_contrato(texto_contrato: str) -> dict:
-    prompt = f"""
+def _armar_prompt(texto_contrato, campos=None):
+    """campos: los que se le piden a la IA (por defecto, todos)."""
+    campos = campos or list(_default_data().keys())
+    formato = ",\n".join(f'  "{c}": string o null' for c in campos)
+    return f"""
 Analizá el siguiente contrato de alquiler en Argentina.
 
 Respondé EXCLUSIVAMENTE con un JSON válido, sin texto adicional.
 
 Formato EXACTO:
 {{
-  "inmobiliaria": string o null,
-  "inquilino": string o null,
-  "propietario": string o null,
-  "fecha_inicio": string o null,
-  "fecha_fin": string o null
+{formato}
 }}
 
 Reglas:
@@ -93,29 +93,196 @@ Contrato:
 \"\"\"{texto_contrato}\"\"\"
 """
 
-    raw = None
+
+def _mensajes(texto_contrato, campos=None):
+    return [
+        {"role": "system", "content": "Sos un extractor de datos legales. Respondés solo JSON válido."},
+        {"role": "user", "content": _armar_prompt(texto_contrato, campos)},
+    ]
+
+
+def _procesar_respuesta(data, campos=None):
+    """data: el objeto ya validado por ai_json (sólo claves del esquema)."""
+    out = _default_data()
+    out.update({k: data.get(k) for k in (campos or out.keys())})
+
+    out["fecha_inicio"] = normalizar_fecha(out.get("fecha_inicio"))
+    out["fecha_fin"] = normalizar_fecha(out.get("fecha_fin"))
+    return out
+
+
+# =========================================================
+# Pre-extracción por reglas + IA sólo para lo que falta
+# =========================================================
+_metricas = {
+    "extracciones": 0,
+    "llm_llamadas": 0,
+    "llm_evitadas": 0,       # extracciones resueltas sólo con reglas
+    "campos_reglas": 0,
+    "campos_llm": 0,
+    "ms_reglas": 0.0,
+    "ms_llm": 0.0,
+    "tokens_original": 0,    # texto del contrato, estimado (ai_recorte)
+    "tokens_enviados": 0,
+    "prompts_recortados": 0,
+}
+_metricas_lock = threading.Lock()
+
+
+def _pre_extraer(texto_contrato):
+    """Devuelve (pre, confiables, faltantes, ms)."""
+    t0 = time.perf_counter()
+    pre = extraer_por_reglas(texto_contrato)
+    confiables = campos_confiables(pre)
+    faltantes = [c for c in _default_data().keys() if c not in confiables]
+    return pre, confiables, faltantes, (time.perf_counter() - t0) * 1000
+
+
+def _combinar(pre, confiables, faltantes, res_llm, ms_reglas, ms_llm):
+    """
+    Junta lo de las reglas con lo de la IA (para los campos confiables
+    manda la regla) y registra tiempos por etapa.
+    """
+    out = _default_data()
+    if res_llm is not None:
+        out.update({c: res_llm["data"].get(c) for c in faltantes})
+    out.update({c: pre["data"][c] for c in confiables})
+
+    fuentes = {c: "reglas" for c in confiables}
+    fuentes.update({c: "llm" for c in faltantes if out.get(c) is not None})
+
+    with _metricas_lock:
+        _metricas["extracciones"] += 1
+        _metricas["campos_reglas"] += len(confiables)
+        _metricas["ms_reglas"] += ms_reglas
+        if res_llm is None:
+            _metricas["llm_evitadas"] += 1
+        else:
+            _metricas["llm_llamadas"] += 1
+            _metricas["campos_llm"] += sum(1 for c in faltantes if out.get(c) is not None)
+            _metricas["ms_llm"] += ms_llm
+            recorte = res_llm.get("recorte") or {}
+            _metricas["tokens_original"] += recorte.get("tokens_original", 0)
+            _metricas["tokens_enviados"] += recorte.get("tokens_enviados", 0)
+            _metricas["prompts_recortados"] += 1 if recorte.get("recortado") else 0
+
+    res = {
+        "ok": True if res_llm is None else res_llm["ok"],
+        "model": res_llm["model"] if res_llm is not None else "reglas",
+        "raw": res_llm["raw"] if res_llm is not None else None,
+        "data": out,
+        "fuentes": fuentes,
+        "confianza": {c: round(pre["confianza"][c], 2) for c in out.keys()},
+        "tiempos_ms": {"reglas": round(ms_reglas, 3), "llm": round(ms_llm, 1)},
+        "recorte": res_llm.get("recorte") if res_llm is not None else None,
+    }
+    if res_llm is not None:
+        res["intentos_llm"] = res_llm["intentos"]
+        if "error" in res_llm:
+            res["error"] = res_llm["error"]
+    return res
+
+
+def metricas_extraccion():
+    with _metricas_lock:
+        m = dict(_metricas)
+    n = m["extracciones"] or 1
+    llamadas = m["llm_llamadas"] or 1
+    return {
+        **{k: (round(v, 1) if isinstance(v, float) else v) for k, v in m.items()},
+        "ms_reglas_promedio": round(m["ms_reglas"] / n, 3),
+        "ms_llm_promedio": round(m["ms_llm"] / llamadas, 1),
+        "modelo": MODEL,
+        "modelos": llm.estado(),
+    }
+
+
+def _fallo_llm(e, recorte):
+    """Resultado de una llamada sin respuesta (llm.LLMError): el tipo decide 503 vs 422."""
+    print("❌ Error IA Groq:", repr(e))
+    return {
+        "ok": False, "model": MODEL, "raw": None, "data": _default_data(), "recorte": recorte,
+        "intentos": len(e.intentos),
+        "error": {"tipo": e.tipo, "detalle": str(e), "reintentar_en": e.reintentar_en},
+    }
+
+
+def _respuesta_invalida(e, recorte):
+    """El modelo respondió algo fuera del esquema (llm.RespuestaInvalida): 422."""
+    print("❌ Respuesta IA inválida:", repr(e))
+    return {
+        "ok": False, "model": MODEL, "raw": e.texto, "data": _default_data(), "recorte": recorte,
+        "intentos": len(e.intentos),
+        "error": {"tipo": "respuesta_invalida", "detalle": str(e), "reintentar_en": None},
+    }
+
+
+def _resultado_llm(res, campos, recorte):
+    datos = res["datos"]
+    if datos is None:  # sin stream: se parsea la respuesta entera
+        try:
+            datos = parsear(res["texto"])
+        except ValueError as e:
+            return _respuesta_invalida(llm.RespuestaInvalida(str(e), res["texto"], res["intentos"]), recorte)
+    return {
+        "ok": True, "model": res["modelo"], "raw": res["texto"], "data": _procesar_respuesta(datos, campos),
+        "recorte": recorte, "intentos": len(res["intentos"]),
+    }
+
+
+def _llamar_llm(texto_contrato, campos):
+    texto_llm, recorte = recortar(texto_contrato, campos)
     try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "Sos un extractor de datos legales. Respondés solo JSON válido."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
+        res = llm.completar(
+            _mensajes(texto_llm, campos), parser=ParserExtraccion if IA_STREAM else None, **_OPCIONES_LLM,
         )
+    except llm.LLMError as e:
+        return _fallo_llm(e, recorte)
+    except llm.RespuestaInvalida as e:
+        return _respuesta_invalida(e, recorte)
+    return _resultado_llm(res, campos, recorte)
+
+
+def extraer_datos_contrato(texto_contrato: str) -> dict:
+    """
+    Primero reglas (ai_reglas); la IA sólo se llama por los campos que las
+    reglas no llenaron con confianza, y si las reglas llenaron todo, no se llama.
+    """
+    pre, confiables, faltantes, ms_reglas = _pre_extraer(texto_contrato)
 
-        raw = (response.choices[0].message.content or "").strip()
-        data = _extract_json(raw)
+    res_llm, ms_llm = None, 0.0
+    if faltantes:
+        t0 = time.perf_counter()
+        res_llm = _llamar_llm(texto_contrato, faltantes)
+        ms_llm = (time.perf_counter() - t0) * 1000
 
-        # asegurar keys esperadas (evita que venga algo distinto)
-        out = _default_data()
-        out.update({k: data.get(k) for k in out.keys()})
+    return _combinar(pre, confiables, faltantes, res_llm, ms_reglas, ms_llm)
 
-        out["fecha_inicio"] = normalizar_fecha(out.get("fecha_inicio"))
-        out["fecha_fin"] = normalizar_fecha(out.get("fecha_fin"))
 
-        return {"ok": True, "model": MODEL, "raw": raw, "data": out}
+async def _llamar_llm_async(texto_contrato, campos):
+    texto_llm, recorte = recortar(texto_contrato, campos)
+    try:
+        res = await llm.completar_async(
+            _mensajes(texto_llm, campos), parser=ParserExtraccion if IA_STREAM else None, **_OPCIONES_LLM,
+        )
+    except llm.LLMError as e:
+        return _fallo_llm(e, recorte)
+    except llm.RespuestaInvalida as e:
+        return _respuesta_invalida(e, recorte)
+    return _resultado_llm(res, campos, recorte)
+
+
+async def extraer_datos_contrato_async(texto_contrato: str) -> dict:
+    """
+    Igual que extraer_datos_contrato pero sin bloquear el event loop
+    (lo usa el modo ASGI: muchas extracciones en vuelo en un solo proceso).
+    """
+    pre, confiables, faltantes, ms_reglas = _pre_extraer(texto_contrato)
+
+    res_llm, ms_llm = None, 0.0
+    if faltantes:
+        t0 = time.perf_counter()
+        res_llm = await _llamar_llm_async(texto_contrato, faltantes)
+        ms_llm = (time.perf_counter() - t0) * 1000
 
-    except Exception as e:
-        print("❌ Error IA Groq:", repr(e))
-        return {"ok": False, "model": MODEL, "raw": raw, "data": _default_data()}
\ No newline at end of file
+    return _combinar(pre, confiables, faltantes, res_llm, ms_reglas, ms_llm)
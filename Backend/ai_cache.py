@@ -0,0 +1,250 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+
+from db import db_connection, ejecutar
+from ai import extraer_datos_contrato, MODEL, PROMPT_VERSION
+
+IA_CACHE_TTL = int(os.getenv("IA_CACHE_TTL", str(30 * 24 * 3600)))  # seg. de vida de una extracción
+IA_CACHE_MEM_MAX = int(os.getenv("IA_CACHE_MEM_MAX", "1000"))       # entradas en memoria (LRU)
+IA_CACHE_DB_MAX = int(os.getenv("IA_CACHE_DB_MAX", "50000"))        # filas en ia_cache (LRU)
+IA_CACHE_PODA_CADA = int(os.getenv("IA_CACHE_PODA_CADA", "100"))    # podar la tabla cada N altas
+
+# Tier 1: memoria del proceso. TTLCache vence por TTL y, lleno, desaloja el menos usado.
+_mem = TTLCache(maxsize=IA_CACHE_MEM_MAX, ttl=IA_CACHE_TTL)
+_mem_lock = threading.Lock()
+_altas = 0
+
+_stats = {"hits_memoria": 0, "hits_db": 0, "misses": 0, "guardados": 0}
+
+
+def normalizar_texto(texto):
+    """
+    Misma clave para el mismo contrato aunque cambien espacios, saltos de línea
+    o la forma Unicode de los acentos.
+    """
+    t = unicodedata.normalize("NFC", texto or "")
+    return " ".join(t.split())
+
+
+def clave_cache(texto, modelo=MODEL, prompt_version=PROMPT_VERSION):
+    base = f"{modelo}\n{prompt_version}\n{normalizar_texto(texto)}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def _cacheable(res):
+    # lo que respondió un modelo de fallback no se guarda bajo la clave de MODEL
+    data = (res or {}).get("data") or {}
+    return (bool(res and res.get("ok")) and res.get("model") in (MODEL, "reglas")
+            and any(v is not None for v in data.values()))
+
+
+# =========================================================
+# Tier 2: tabla ia_cache
+# =========================================================
+def _leer_db(clave):
+    vigente_desde = datetime.now() - timedelta(seconds=IA_CACHE_TTL)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ejecutar(
+            cur,
+            "SELECT resultado FROM ia_cache WHERE clave = %s AND creado_en >= %s",
+            "SELECT resultado FROM ia_cache WHERE clave = %s AND creado_en >= %s",
+            "SELECT resultado FROM ia_cache WHERE clave = ? AND creado_en >= ?",
+            (clave, vigente_desde),
+        )
+        row = cur.fetchone()
+
+        if row:
+            # marca de uso para la poda LRU
+            ejecutar(
+                cur,
+                "UPDATE ia_cache SET hits = hits + 1, usado_en = %s WHERE clave = %s",
+                "UPDATE ia_cache SET hits = hits + 1, usado_en = %s WHERE clave = %s",
+                "UPDATE ia_cache SET hits = hits + 1, usado_en = ? WHERE clave = ?",
+                (datetime.now(), clave),
+            )
+            conn.commit()
+
+        cur.close()
+
+    return json.loads(row.get("resultado")) if row else None
+
+
+def _guardar_db(clave, res):
+    ahora = datetime.now()
+    params = (clave, MODEL, PROMPT_VERSION, json.dumps(res), ahora, ahora)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ejecutar(
+            cur,
+            """
+            INSERT INTO ia_cache (clave, modelo, prompt_version, resultado, creado_en, usado_en)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE resultado = VALUES(resultado),
+                creado_en = VALUES(creado_en), usado_en = VALUES(usado_en)
+            """,
+            """
+            INSERT INTO ia_cache (clave, modelo, prompt_version, resultado, creado_en, usado_en)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (clave) DO UPDATE SET resultado = EXCLUDED.resultado,
+                creado_en = EXCLUDED.creado_en, usado_en = EXCLUDED.usado_en
+            """,
+            """
+            INSERT INTO ia_cache (clave, modelo, prompt_version, resultado, creado_en, usado_en)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (clave) DO UPDATE SET resultado = excluded.resultado,
+                creado_en = excluded.creado_en, usado_en = excluded.usado_en
+            """,
+            params,
+        )
+        conn.commit()
+        cur.close()
+
+
+def podar_db():
+    """
+    Borra lo vencido por TTL y, si la tabla pasa IA_CACHE_DB_MAX filas,
+    las menos usadas recientemente.
+    """
+    vigente_desde = datetime.now() - timedelta(seconds=IA_CACHE_TTL)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ejecutar(
+            cur,
+            "DELETE FROM ia_cache WHERE creado_en < %s",
+            "DELETE FROM ia_cache WHERE creado_en < %s",
+            "DELETE FROM ia_cache WHERE creado_en < ?",
+            (vigente_desde,),
+        )
+
+        # usado_en de la fila N (las más recientes se quedan)
+        ejecutar(
+            cur,
+            "SELECT usado_en FROM ia_cache ORDER BY usado_en DESC LIMIT 1 OFFSET %s",
+            "SELECT usado_en FROM ia_cache ORDER BY usado_en DESC LIMIT 1 OFFSET %s",
+            "SELECT usado_en FROM ia_cache ORDER BY usado_en DESC LIMIT 1 OFFSET ?",
+            (IA_CACHE_DB_MAX,),
+        )
+        corte = cur.fetchone()
+        if corte:
+            ejecutar(
+                cur,
+                "DELETE FROM ia_cache WHERE usado_en <= %s",
+                "DELETE FROM ia_cache WHERE usado_en <= %s",
+                "DELETE FROM ia_cache WHERE usado_en <= ?",
+                (corte.get("usado_en"),),
+            )
+
+        conn.commit()
+        cur.close()
+
+
+def _de_cache(res, t0):
+    """
+    Lo que se devuelve en un hit: una copia (el tier de memoria no se comparte
+    entre requests) sin lo que describe a la extracción original (tiempos por
+    etapa, respuesta cruda, recorte del prompt, intentos): en un hit no se
+    llamó a nada. tiempos_ms pasa a ser sólo lo que tardó la búsqueda.
+    """
+    out = copy.deepcopy(res)
+    out.update({
+        "tiempos_ms": {"cache": round((time.perf_counter() - t0) * 1000, 3)},
+        "raw": None,
+        "recorte": None,
+        "intentos": 0,
+    })
+    return out
+
+
+# =========================================================
+# API
+# =========================================================
+def buscar(clave):
+    """
+    Busca en memoria y después en ia_cache. Devuelve (resultado, tier) o (None, None).
+    El resultado es una copia propia, con tiempos_ms de la búsqueda (ver _de_cache).
+    """
+    t0 = time.perf_counter()
+    with _mem_lock:
+        res = _mem.get(clave)
+        if res is not None:
+            _stats["hits_memoria"] += 1
+            return _de_cache(res, t0), "memoria"
+
+    try:
+        res = _leer_db(clave)
+    except Exception as e:
+        print("⚠️ ia_cache no disponible:", repr(e))
+        res = None
+
+    with _mem_lock:
+        if res is not None:
+            _mem[clave] = res
+            _stats["hits_db"] += 1
+            return _de_cache(res, t0), "db"
+        _stats["misses"] += 1
+    return None, None
+
+
+def guardar(clave, res):
+    """Guarda en ambos tiers (si la extracción vale la pena) y poda cada tanto."""
+    global _altas
+    if not _cacheable(res):
+        return
+
+    with _mem_lock:
+        _mem[clave] = copy.deepcopy(res)  # el que llamó se queda con res y lo puede modificar
+        _stats["guardados"] += 1
+        _altas += 1
+        podar = _altas % IA_CACHE_PODA_CADA == 0
+
+    try:
+        _guardar_db(clave, res)
+        if podar:
+            podar_db()
+    except Exception as e:
+        print("⚠️ No se pudo guardar en ia_cache:", repr(e))
+
+
+def extraer_con_cache(texto_contrato, limitador=None):
+    """
+    Igual que ai.extraer_datos_contrato, pero antes busca en memoria y en ia_cache.
+    La respuesta trae "cache": "memoria" | "db" | None.
+    Sólo se cachean extracciones exitosas.
+    limitador: opcional, con adquirir(); se respeta sólo si hay que llamar a la IA.
+    """
+    clave = clave_cache(texto_contrato)
+
+    res, tier = buscar(clave)
+    if res is not None:
+        return {**res, "cache": tier}
+
+    if limitador is not None:
+        limitador.adquirir()
+
+    res = extraer_datos_contrato(texto_contrato)
+    guardar(clave, res)
+    return {**(res or {}), "cache": None}
+
+
+def cache_stats():
+    with _mem_lock:
+        return {
+            **_stats,
+            "memoria_entradas": len(_mem),
+            "memoria_max": IA_CACHE_MEM_MAX,
+            "ttl_seg": IA_CACHE_TTL,
+            "modelo": MODEL,
+            "prompt_version": PROMPT_VERSION,
+        }
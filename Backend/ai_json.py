@@ -0,0 +1,144 @@
+import json
+
+# =========================================================
+# Parser incremental del JSON de extracción
+#
+# Groq en modo JSON (response_format json_object) + stream: el texto llega
+# de a fragmentos y se valida mientras llega, contra el esquema de
+# extracción: un objeto plano con las cinco claves y valores string o null.
+# - una clave desconocida, un valor de otro tipo o basura fuera del objeto
+#   cortan en el momento (JSONInvalido), sin esperar el resto
+# - con la llave de cierre el resultado está completo: no hace falta leer
+#   lo que quede del stream
+# Reemplaza la recuperación por regex (fences, texto alrededor) de ai.py:
+# en modo JSON el modelo devuelve sólo el objeto.
+# =========================================================
+CLAVES = ("inmobiliaria", "inquilino", "propietario", "fecha_inicio", "fecha_fin")
+
+_ESPACIOS = " \t\r\n"
+
+
+class JSONInvalido(ValueError):
+    """La respuesta no es un objeto del esquema de extracción."""
+
+
+class ParserExtraccion:
+    """
+    p = ParserExtraccion()
+    for fragmento in stream:
+        if p.alimentar(fragmento):
+            break
+    p.datos -> {clave: str | None}
+    """
+
+    def __init__(self, claves=CLAVES):
+        self.claves = frozenset(claves)
+        self.datos = {}
+        self.completo = False
+        self._estado = "inicio"
+        self._cadena = []       # caracteres crudos del string en curso (escapes incluidos)
+        self._escape = False
+        self._clave = None
+        self._literal = ""
+        self._leidos = 0
+
+    def alimentar(self, texto):
+        """Procesa un fragmento. True cuando el objeto ya cerró."""
+        for ch in texto or "":
+            if not self.completo:
+                self._caracter(ch)
+            elif ch not in _ESPACIOS:
+                self._error(f"texto después del objeto: {ch!r}")
+            self._leidos += 1
+        return self.completo
+
+    def terminar(self):
+        """Fin del stream: el objeto tiene que haber cerrado."""
+        if not self.completo:
+            self._error("respuesta incompleta" if self._leidos else "respuesta vacía")
+        return self.datos
+
+    def _error(self, motivo):
+        raise JSONInvalido(f"{motivo} (posición {self._leidos})")
+
+    def _caracter(self, ch):
+        estado = self._estado
+
+        if estado in ("clave", "valor"):
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._cerrar_cadena()
+                return
+            elif ch < " ":
+                self._error("carácter de control dentro de un string")
+            self._cadena.append(ch)
+            return
+
+        if estado == "null":
+            self._literal += ch
+            if not "null".startswith(self._literal):
+                self._error(f"valor inválido para {self._clave!r}: sólo string o null")
+            if self._literal == "null":
+                self._guardar(None)
+            return
+
+        if ch in _ESPACIOS:
+            return
+
+        if estado == "inicio":
+            if ch != "{":
+                self._error(f"se esperaba '{{' y llegó {ch!r}")
+            self._estado = "clave_o_fin"
+        elif estado in ("clave_o_fin", "clave_sig"):
+            if ch == '"':
+                self._estado, self._cadena = "clave", []
+            elif ch == "}" and estado == "clave_o_fin":
+                self.completo = True
+            else:
+                self._error(f"se esperaba una clave y llegó {ch!r}")
+        elif estado == "dos_puntos":
+            if ch != ":":
+                self._error(f"se esperaba ':' y llegó {ch!r}")
+            self._estado = "valor_inicio"
+        elif estado == "valor_inicio":
+            if ch == '"':
+                self._estado, self._cadena = "valor", []
+            elif ch == "n":
+                self._estado, self._literal = "null", "n"
+            else:
+                self._error(f"valor inválido para {self._clave!r}: sólo string o null")
+        elif estado == "coma_o_fin":
+            if ch == ",":
+                self._estado = "clave_sig"
+            elif ch == "}":
+                self.completo = True
+            else:
+                self._error(f"se esperaba ',' o '}}' y llegó {ch!r}")
+
+    def _cerrar_cadena(self):
+        try:
+            texto = json.loads('"' + "".join(self._cadena) + '"')
+        except ValueError:
+            self._error("escape inválido en un string")
+        if self._estado == "clave":
+            if texto not in self.claves:
+                self._error(f"clave fuera del esquema: {texto!r}")
+            if texto in self.datos:
+                self._error(f"clave repetida: {texto!r}")
+            self._clave, self._estado = texto, "dos_puntos"
+        else:
+            self._guardar(texto)
+
+    def _guardar(self, valor):
+        self.datos[self._clave] = valor
+        self._estado = "coma_o_fin"
+
+
+def parsear(texto, claves=CLAVES):
+    """La respuesta entera de una vez (lo que está en cache, o una respuesta sin stream)."""
+    p = ParserExtraccion(claves)
+    p.alimentar(texto)
+    return p.terminar()
@@ -0,0 +1,113 @@
+import os
+import re
+import unicodedata
+
+# =========================================================
+# Recorte del texto que va al prompt
+#
+# Contratos largos (con anexos, inventarios, reglamentos) inflan la latencia y
+# el costo de Groq y a veces pasan el contexto del modelo. Acá se normaliza el
+# texto, se parte en cláusulas y se dejan sólo las que probablemente tengan
+# partes y fechas, hasta IA_PROMPT_TOKENS tokens (estimados).
+# =========================================================
+IA_PROMPT_TOKENS = int(os.getenv("IA_PROMPT_TOKENS", "2000"))  # presupuesto para el texto del contrato
+CHARS_POR_TOKEN = 4  # estimación gruesa para español con tokenizers tipo Llama
+
+# términos por campo que se le pide a la IA (sin acentos, en minúscula)
+CLAVES = {
+    "inquilino": ("locatario", "locataria", "inquilino", "inquilina", "entre", "partes", "dni", "en adelante"),
+    "propietario": ("locador", "locadora", "propietario", "propietaria", "entre", "partes", "dni", "en adelante"),
+    "inmobiliaria": ("inmobiliaria", "intermedio", "corredor", "martillero", "administradora"),
+    "fecha_inicio": ("plazo", "vigencia", "desde", "a partir", "inicio", "comienza", "fecha", "meses"),
+    "fecha_fin": ("plazo", "vigencia", "hasta", "vencimiento", "vence", "finaliza", "fecha", "meses"),
+}
+
+# encabezados típicos de cláusula: "PRIMERA:", "CLÁUSULA 3", "ARTÍCULO 2°", "1.", "2)"
+_CORTE_CLAUSULA = re.compile(
+    r"\n\s*\n"
+    r"|\n(?=\s*(?:cl[aá]usula|art[ií]culo|primer[ao]|segund[ao]|tercer[ao]|cuart[ao]|quint[ao]|sext[ao]"
+    r"|s[eé]ptim[ao]|octav[ao]|noven[ao]|d[eé]cim[ao]|anexo)\b)"
+    r"|\n(?=\s*\d{1,3}\s*[.)°º-]\s)",
+    re.IGNORECASE,
+)
+_FECHA = re.compile(r"\b\d{1,2}[/\-]\d{1,2}[/\-]\d{4}\b|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}\s+de\s+[a-z]+\s+de\s+\d{4}\b")
+
+
+def estimar_tokens(texto):
+    return (len(texto or "") + CHARS_POR_TOKEN - 1) // CHARS_POR_TOKEN
+
+
+def normalizar(texto):
+    """NFC, espacios colapsados dentro de cada línea y como mucho una línea en blanco seguida."""
+    t = unicodedata.normalize("NFC", texto or "").replace("\r\n", "\n").replace("\r", "\n")
+    lineas = [" ".join(l.split()) for l in t.split("\n")]
+    t = "\n".join(lineas)
+    return re.sub(r"\n{3,}", "\n\n", t).strip()
+
+
+def dividir_clausulas(texto):
+    return [c.strip() for c in _CORTE_CLAUSULA.split(texto) if c and c.strip()]
+
+
+def _sin_acentos(texto):
+    return "".join(ch for ch in unicodedata.normalize("NFD", texto.lower()) if unicodedata.category(ch) != "Mn")
+
+
+def puntaje(clausula, campos):
+    """Apariciones de términos de los campos pedidos (+ fechas explícitas), por cada 100 tokens."""
+    t = _sin_acentos(clausula)
+    claves = {k for c in campos for k in CLAVES.get(c, ())}
+    hits = sum(t.count(k) for k in claves)
+    if any(c.startswith("fecha") for c in campos):
+        hits += 2 * len(_FECHA.findall(t))
+    # normalizado por largo: una cláusula corta y densa gana a un anexo largo
+    return hits * 100 / max(estimar_tokens(clausula), 25)
+
+
+def recortar(texto, campos=None, presupuesto=None):
+    """
+    Devuelve (texto_recortado, info). Si el texto normalizado entra en el
+    presupuesto se manda entero. Si no, se eligen cláusulas por puntaje
+    (la primera siempre: suele tener las partes) y se arman en su orden original.
+    """
+    campos = campos or list(CLAVES.keys())
+    presupuesto = presupuesto or IA_PROMPT_TOKENS
+
+    original = texto or ""
+    norm = normalizar(original)
+    info = {
+        "chars_original": len(original),
+        "tokens_original": estimar_tokens(original),
+        "recortado": False,
+    }
+
+    if estimar_tokens(norm) <= presupuesto:
+        return norm, {**info, "chars_enviados": len(norm), "tokens_enviados": estimar_tokens(norm)}
+
+    clausulas = dividir_clausulas(norm)
+    orden = sorted(range(1, len(clausulas)), key=lambda i: puntaje(clausulas[i], campos), reverse=True)
+
+    elegidas, usados = set(), 0
+    for i in [0] + orden:
+        costo = estimar_tokens(clausulas[i]) + 2  # + separador
+        if usados + costo > presupuesto:
+            if i == 0:
+                # primera cláusula gigante: va truncada
+                clausulas[0] = clausulas[0][: (presupuesto - 2) * CHARS_POR_TOKEN]
+                costo = estimar_tokens(clausulas[0]) + 2
+            elif puntaje(clausulas[i], campos) > 0:
+                continue
+            else:
+                break
+        elegidas.add(i)
+        usados += costo
+
+    reducido = "\n[...]\n".join(clausulas[i] for i in sorted(elegidas))
+    return reducido, {
+        **info,
+        "recortado": True,
+        "chars_enviados": len(reducido),
+        "tokens_enviados": estimar_tokens(reducido),
+        "clausulas_total": len(clausulas),
+        "clausulas_enviadas": len(elegidas),
+    }
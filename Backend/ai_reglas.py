@@ -0,0 +1,147 @@
+import os
+import re
+from datetime import date
+
+# =========================================================
+# Pre-extracción por reglas
+#
+# Muchos contratos salen de las mismas plantillas ("LOCADOR: ...",
+# "LOCATARIO: ...", "desde el dd/mm/yyyy hasta el dd/mm/yyyy"). Esos campos se
+# sacan acá con regex, cada uno con una confianza entre 0 y 1; la IA sólo se
+# consulta por los que quedan por debajo de REGLAS_CONFIANZA_MIN.
+# =========================================================
+REGLAS_CONFIANZA_MIN = float(os.getenv("REGLAS_CONFIANZA_MIN", "0.8"))
+
+CAMPOS = ("inmobiliaria", "inquilino", "propietario", "fecha_inicio", "fecha_fin")
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12,
+}
+
+# Nombre propio: empieza en mayúscula y corta en coma, punto y coma, salto de
+# línea, paréntesis, DNI/CUIT, "con domicilio" o "en adelante".
+_NOMBRE = r"([A-ZÁÉÍÓÚÑ][\wÁÉÍÓÚÑáéíóúñü.'&\- ]{1,80}?)"
+_FIN_NOMBRE = (
+    r"(?=\s*(?:,|;|\n|\(|\.\s|\.$|$|(?i:\bD\.?N\.?I\b|\bC\.?U\.?I\.?T\b|\bcon domicilio\b|\ben adelante\b)))"
+)
+
+_FECHA = (
+    r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4}"
+    r"|\d{4}-\d{2}-\d{2}"
+    r"|\d{1,2}°?\s+de\s+(?i:" + "|".join(MESES) + r")\s+(?:de(?:l)?\s+)?\d{4})"
+)
+
+# (campo, regex, confianza)
+_REGLAS_NOMBRES = [
+    ("propietario", r"(?i:\b(?:el\s+|la\s+)?(?:locador|locadora|propietario|propietaria))\s*[:\-]\s*" + _NOMBRE + _FIN_NOMBRE, 0.95),
+    ("inquilino", r"(?i:\b(?:el\s+|la\s+)?(?:locatario|locataria|inquilino|inquilina))\s*[:\-]\s*" + _NOMBRE + _FIN_NOMBRE, 0.95),
+    ("inmobiliaria", r"(?i:\binmobiliaria)\s*[:\-]\s*" + _NOMBRE + _FIN_NOMBRE, 0.95),
+    # "entre Juan Pérez, DNI ..., en adelante EL LOCADOR" (sin cruzar otro "en adelante")
+    (
+        "propietario",
+        r"(?i:\b(?:entre|y)\s+(?:el\s+señor\s+|la\s+señora\s+|el\s+sr\.\s*|la\s+sra\.\s*)?)" + _NOMBRE + _FIN_NOMBRE
+        + r"(?:(?!(?i:en adelante))[^;]){0,200}?(?i:en adelante)[^;]{0,40}?(?i:\b(?:el|la)\s+(?:locador|locadora))\b",
+        0.85,
+    ),
+    (
+        "inquilino",
+        r"(?i:\b(?:entre|y)\s+(?:el\s+señor\s+|la\s+señora\s+|el\s+sr\.\s*|la\s+sra\.\s*)?)" + _NOMBRE + _FIN_NOMBRE
+        + r"(?:(?!(?i:en adelante))[^;]){0,200}?(?i:en adelante)[^;]{0,40}?(?i:\b(?:el|la)\s+(?:locatario|locataria))\b",
+        0.85,
+    ),
+    # "por intermedio de Inmobiliaria Sur": suele ser la inmobiliaria, pero no siempre
+    ("inmobiliaria", r"(?i:por intermedio de|con intervención de)\s+(?:la\s+)?" + _NOMBRE + _FIN_NOMBRE, 0.7),
+]
+
+_REGLAS_FECHAS = [
+    ("fecha_inicio", r"(?i:fecha de inicio|inicio del contrato|comienza el)\s*[:\-]?\s*(?:el\s+)?" + _FECHA, 0.9),
+    ("fecha_fin", r"(?i:fecha de (?:finalización|finalizacion|vencimiento|fin)|vence(?:\s+el)?|finaliza(?:\s+el)?)\s*[:\-]?\s*(?:el\s+)?" + _FECHA, 0.9),
+]
+
+# "desde el 01/03/2024 hasta el 28/02/2026": las dos fechas juntas
+_RANGO = (
+    r"(?i:desde el(?:\s+día)?|a partir del(?:\s+día)?)\s+" + _FECHA
+    + r"[^.;\n]{0,40}?(?i:hasta el(?:\s+día)?|al)\s+" + _FECHA
+)
+
+
+def fecha_iso(texto):
+    """dd/mm/yyyy, dd-mm-yyyy, yyyy-mm-dd o "1 de marzo de 2024" -> YYYY-MM-DD (o None)."""
+    t = (texto or "").strip().lower()
+
+    m = re.fullmatch(r"(\d{1,2})[/\-](\d{1,2})[/\-](\d{4})", t)
+    if m:
+        d, mth, y = (int(x) for x in m.groups())
+    else:
+        m = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", t)
+        if m:
+            y, mth, d = (int(x) for x in m.groups())
+        else:
+            m = re.fullmatch(r"(\d{1,2})°?\s+de\s+([a-záéíóú]+)\s+(?:del?\s+)?(\d{4})", t)
+            if not m or m.group(2) not in MESES:
+                return None
+            d, mth, y = int(m.group(1)), MESES[m.group(2)], int(m.group(3))
+
+    try:
+        return date(y, mth, d).isoformat()
+    except ValueError:
+        return None
+
+
+def _limpiar_nombre(valor):
+    v = " ".join(valor.split()).strip(" .-'\"“”")
+    return v or None
+
+
+def _agregar(candidatos, campo, valor, confianza):
+    if valor:
+        candidatos.setdefault(campo, []).append((valor, confianza))
+
+
+def extraer_por_reglas(texto):
+    """
+    Devuelve {"data": {campo: valor | None}, "confianza": {campo: 0..1}}.
+    Si una regla encuentra valores distintos para el mismo campo, la confianza
+    baja a la mitad (ambiguo: mejor que decida la IA).
+    """
+    texto = texto or ""
+    candidatos = {}
+
+    for campo, patron, conf in _REGLAS_NOMBRES:
+        for m in re.finditer(patron, texto):
+            _agregar(candidatos, campo, _limpiar_nombre(m.group(1)), conf)
+
+    for m in re.finditer(_RANGO, texto):
+        _agregar(candidatos, "fecha_inicio", fecha_iso(m.group(1)), 0.95)
+        _agregar(candidatos, "fecha_fin", fecha_iso(m.group(2)), 0.95)
+
+    for campo, patron, conf in _REGLAS_FECHAS:
+        for m in re.finditer(patron, texto):
+            _agregar(candidatos, campo, fecha_iso(m.group(1)), conf)
+
+    data = {c: None for c in CAMPOS}
+    confianza = {c: 0.0 for c in CAMPOS}
+
+    for campo, lista in candidatos.items():
+        valor, conf = max(lista, key=lambda x: x[1])
+        distintos = {v.lower() for v, _ in lista}
+        if len(distintos) > 1:
+            conf *= 0.5
+        data[campo] = valor
+        confianza[campo] = conf
+
+    # chequeos cruzados
+    if data["inquilino"] and data["propietario"] and data["inquilino"].lower() == data["propietario"].lower():
+        confianza["inquilino"] = confianza["propietario"] = 0.0
+    if data["fecha_inicio"] and data["fecha_fin"] and data["fecha_fin"] <= data["fecha_inicio"]:
+        confianza["fecha_inicio"] = confianza["fecha_fin"] = 0.0
+
+    return {"data": data, "confianza": confianza}
+
+
+def campos_confiables(pre, minimo=None):
+    """Campos que la pre-extracción llenó con confianza suficiente."""
+    minimo = REGLAS_CONFIANZA_MIN if minimo is None else minimo
+    return [c for c in CAMPOS if pre["data"].get(c) and pre["confianza"].get(c, 0) >= minimo]
@@ -1,42 +1,61 @@
 import os
-from datetime import datetime, date
-
-from flask import Flask, request, jsonify
+import io
+import csv
+import base64
+import json
+import math
+import time
+import hashlib
+from datetime import datetime, date, timedelta
+
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 from flask_cors import CORS
 
-from db import get_db_connection, DB_ENGINE
-from mailer import send_email  # SMTP_HOST/SMTP_PORT/SMTP_USER/SMTP_PASS/MAIL_FROM
+from db import (
+    db_connection, get_db_connection, cursor_streaming, pool_stats, DB_ENGINE,
+    adaptar_sql, insert_and_get_id, sql_dias_hasta, empezar_transaccion,
+)
+import jobs
+import http_cache
+import metricas
+import tenants
+import partes
+import estadisticas
+import registro
+import plantillas
+from ai import metricas_extraccion
+from ai_cache import extraer_con_cache, cache_stats
+from busqueda import terminos, sql_busqueda
+from http_cache import incrementar_version
+from ingesta import ingerir, IA_BULK_MAX
+from notifier import despachar_envios  # RESEND_API_KEY/MAIL_FROM/NOTIF_WORKERS/NOTIF_LOTE
+from tenants import tenant_actual, TenantError
 
 app = Flask(__name__)
 CORS(app)
 
 
 # =========================================================
-# SQL helpers (MySQL / Postgres / SQLite)
+# Métricas por request (ver metricas.py y GET /api/metrics)
 # =========================================================
-def ejecutar(cur, sql_mysql, sql_pg, sql_sqlite, params=()):
-    if DB_ENGINE == "mysql":
-        cur.execute(sql_mysql, params)
-    elif DB_ENGINE in ("postgres", "postgresql"):
-        cur.execute(sql_pg, params)
-    else:
-        cur.execute(sql_sqlite, params)
+@app.before_request
+def _inicio_request():
+    g.t0 = time.perf_counter()
 
 
-def insert_and_get_id(cur, sql_mysql, sql_pg, sql_sqlite, params=()):
-    """
-    Inserta y devuelve id.
-    - Postgres: usa RETURNING id
-    - MySQL/SQLite: usa lastrowid
-    """
-    ejecutar(cur, sql_mysql, sql_pg, sql_sqlite, params)
+@app.after_request
+def _fin_request(resp):
+    t0 = g.pop("t0", None)
+    if t0 is not None:
+        # la regla (/api/contracts/<int:contrato_id>/renewal), no la URL: cardinalidad acotada
+        ruta = request.url_rule.rule if request.url_rule else "sin_ruta"
+        metricas.registrar_request(request.method, ruta, resp.status_code, time.perf_counter() - t0)
+    return resp
 
-    if DB_ENGINE in ("postgres", "postgresql"):
-        row = cur.fetchone()
-        # RealDictCursor -> {"id": ...}
-        return row["id"] if isinstance(row, dict) else row[0]
 
-    return getattr(cur, "lastrowid", None)
+@app.errorhandler(TenantError)
+def _tenant_invalido(e):
+    return jsonify({"error": str(e), "header": e.header}), e.status
 
 
 # =========================================================
@@ -55,14 +74,15 @@ def _parse_iso_date(d):
         return None
 
 
-def _estado_contrato(fecha_fin, umbral_dias=60):
-    hoy = date.today()
-    fin = _parse_iso_date(fecha_fin)
-
-    if not fin:
+def _estado_contrato(dias, umbral_dias=60):
+    """
+    dias: días restantes hasta fecha_fin, ya calculados en SQL (sql_dias_hasta).
+    None si el contrato no tiene fecha_fin.
+    """
+    if dias is None:
         return {"dias_restantes": None, "estado": "sin_fecha_fin", "requiere_aviso_60d": False}
 
-    dias = (fin - hoy).days
+    dias = int(dias)
 
     if dias < 0:
         return {"dias_restantes": dias, "estado": "vencido", "requiere_aviso_60d": False}
@@ -94,15 +114,119 @@ def ping():
 
 
 # =========================================================
-# POST /api/contracts (IA)
+# Salud del proceso (probes del orquestador)
+# - live: el proceso responde; no toca dependencias (una caída de la base no
+#   tiene que reiniciar el proceso). De paso arranca el calentado en un thread.
+# - ready: crea los recursos de registro.READY_RECURSOS y prueba la base;
+#   503 hasta que todo esté listo, así el primer request real llega con
+#   Groq, la Session HTTP y una conexión del pool ya armados.
 # =========================================================
-@app.route("/api/contracts", methods=["POST"])
-def crear_contrato():
+_INICIO = time.time()
+
+
+@app.route("/api/health/live", methods=["GET"])
+def health_live():
+    registro.calentar_en_fondo()
+    return jsonify({"ok": True, "pid": os.getpid(), "uptime_s": round(time.time() - _INICIO, 1)}), 200
+
+
+@app.route("/api/health/ready", methods=["GET"])
+def health_ready():
+    recursos = registro.calentar()
+
+    t0 = time.perf_counter()
     try:
-        from ai import extraer_datos_contrato
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 AS ok")
+            cur.fetchone()
+            cur.close()
+        base = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
     except Exception as e:
-        return jsonify({"error": "No se pudo cargar el motor de IA.", "detalle": repr(e)}), 500
+        base = {"ok": False, "error": repr(e)}
+
+    listo = base["ok"] and all(r["listo"] for r in recursos.values())
+    return jsonify({"ok": listo, "base": base, "recursos": recursos}), 200 if listo else 503
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    return Response(metricas.exportar(), content_type=metricas.CONTENT_TYPE)
+
+
+@app.route("/api/db/pool", methods=["GET"])
+def db_pool():
+    return jsonify(pool_stats()), 200
+
+
+# =========================================================
+# Tenants (inmobiliarias): administración, con TENANTS_ADMIN_TOKEN
+# =========================================================
+@app.route("/api/tenants", methods=["GET"])
+def listar_tenants():
+    tenants.exigir_admin(request.headers.get("Authorization"))
+    return jsonify(tenants.listar()), 200
+
+
+@app.route("/api/tenants", methods=["POST"])
+def crear_tenant():
+    tenants.exigir_admin(request.headers.get("Authorization"))
+    data = request.get_json() or {}
+    nombre = (data.get("nombre") or "").strip()
+    if not nombre:
+        return jsonify({"error": "Falta nombre"}), 400
+
+    tenant, creado = tenants.crear(nombre, data.get("slug"))
+    return jsonify(tenant), 201 if creado else 200
+
+
+# =========================================================
+# Partes normalizadas (ver partes.py)
+# =========================================================
+@app.route("/api/partes/buscar", methods=["GET"])
+def buscar_partes():
+    """Partes del tenant parecidas a ?nombre= (las que comparten bloque), con su similitud."""
+    nombre = (request.args.get("nombre") or "").strip()
+    tipo = request.args.get("tipo", "persona")
+    if not nombre:
+        return jsonify({"error": "Falta nombre"}), 400
+    if tipo not in partes.TIPOS:
+        return jsonify({"error": "tipo inválido", "valores": list(partes.TIPOS)}), 400
+
+    return jsonify({
+        "nombre": nombre,
+        "clave": partes.clave(partes.tokens(nombre, tipo)),
+        "umbral": partes.PARTES_UMBRAL,
+        "candidatos": partes.buscar(tenant_actual(), nombre, tipo),
+    }), 200
+
 
+# =========================================================
+# POST /api/contracts (IA)
+# =========================================================
+def fallo_ia(res):
+    """
+    Respuesta cuando la IA no dio datos -> (cuerpo, status, headers).
+    Si Groq no respondió (deadline o todos los modelos caídos) es un 503 con
+    Retry-After: el mismo pedido puede andar más tarde. Si respondió pero no
+    sirvió, 422.
+    """
+    error = res.get("error") or {}
+    cuerpo = {
+        "error": "La IA no pudo extraer datos del contrato.",
+        "ia_ok": res.get("ok"),
+        "ia_modelo": res.get("model"),
+        "ia_error": error or None,
+    }
+    if error.get("tipo") in ("deadline", "no_disponible"):
+        cuerpo["error"] = "La IA no está disponible en este momento."
+        return cuerpo, 503, {"Retry-After": str(max(1, math.ceil(error.get("reintentar_en") or 5)))}
+    return cuerpo, 422, {}
+
+
+@app.route("/api/contracts", methods=["POST"])
+def crear_contrato():
+    tenant_id = tenant_actual()
     data = request.get_json() or {}
     texto_contrato = data.get("texto_contrato")
     if not texto_contrato:
@@ -118,81 +242,173 @@ def crear_contrato():
     }
 
     try:
-        res = extraer_datos_contrato(texto_contrato) or res
+        res = extraer_con_cache(texto_contrato) or res
         extraidos = res.get("data") or extraidos
     except Exception as e:
         return jsonify({"error": "Error en IA", "detalle": repr(e)}), 500
 
     if (not res.get("ok")) or all(extraidos.get(k) is None for k in extraidos.keys()):
-        return jsonify({
-            "error": "La IA no pudo extraer datos del contrato.",
-            "ia_ok": res.get("ok"),
-            "ia_modelo": res.get("model"),
-        }), 422
-
-    conn = get_db_connection()
-    cur = conn.cursor()
+        cuerpo, status, headers = fallo_ia(res)
+        return jsonify(cuerpo), status, headers
 
     sql_mysql = """
-        INSERT INTO contratos (inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO contratos (
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+            inmobiliaria_id, inquilino_id, propietario_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
     sql_pg = """
-        INSERT INTO contratos (inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO contratos (
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+            inmobiliaria_id, inquilino_id, propietario_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         RETURNING id
     """
     sql_sqlite = """
-        INSERT INTO contratos (inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO contratos (
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+            inmobiliaria_id, inquilino_id, propietario_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
     params = (
+        tenant_id,
         extraidos.get("inmobiliaria"),
         extraidos.get("inquilino"),
         extraidos.get("propietario"),
         extraidos.get("fecha_inicio"),
         extraidos.get("fecha_fin"),
+        texto_contrato,
     )
 
-    contrato_id = insert_and_get_id(cur, sql_mysql, sql_pg, sql_sqlite, params)
-    conn.commit()
-
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)  # vínculos, contrato, resumen y versión: todo o nada
+        ids = partes.vincular_contrato(cur, tenant_id, extraidos)
+        params += (ids["inmobiliaria_id"], ids["inquilino_id"], ids["propietario_id"])
+        contrato_id = insert_and_get_id(cur, sql_mysql, sql_pg, sql_sqlite, params)
+        estadisticas.sumar(cur, tenant_id, estadisticas.altas([(extraidos.get("fecha_fin"), None)]))
+        incrementar_version(cur)
+        conn.commit()
+        cur.close()
 
     return jsonify({
         "id": contrato_id,
         "extraido": extraidos,
+        "partes": ids,
         "ia_ok": True,
         "ia_modelo": res.get("model"),
+        "ia_cache": res.get("cache"),
+        "ia_fuentes": res.get("fuentes"),
+        "ia_tiempos_ms": res.get("tiempos_ms"),
+        "ia_recorte": res.get("recorte"),
     }), 201
 
 
+@app.route("/api/ai/cache", methods=["GET"])
+def ia_cache_stats():
+    return jsonify(cache_stats()), 200
+
+
+@app.route("/api/cache/http", methods=["GET"])
+def http_cache_stats():
+    return jsonify(http_cache.cache_stats()), 200
+
+
+@app.route("/api/ai/metrics", methods=["GET"])
+def ia_metricas():
+    """Extracciones resueltas por reglas vs. IA y tiempo acumulado por etapa."""
+    return jsonify(metricas_extraccion()), 200
+
+
+# =========================================================
+# POST /api/contracts/bulk (IA, muchos contratos)
+# =========================================================
+def _leer_items_bulk():
+    """
+    Acepta:
+    - JSON: ["texto", ...] | [{"texto_contrato": ...}, ...] | {"contratos": [...]}
+    - NDJSON (application/x-ndjson): una línea por contrato, string u objeto
+    Devuelve [(indice, texto)]. Lanza ValueError si el cuerpo no sirve.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        items = []
+        for n, linea in enumerate(request.stream, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                items.append(json.loads(linea))
+            except ValueError:
+                raise ValueError(f"Línea {n}: JSON inválido")
+    else:
+        items = request.get_json(silent=True)
+        if isinstance(items, dict):
+            items = items.get("contratos")
+        if not isinstance(items, list):
+            raise ValueError('Se espera un array JSON, {"contratos": [...]} o NDJSON')
+
+    if not items:
+        raise ValueError("No hay contratos")
+    if len(items) > IA_BULK_MAX:
+        raise ValueError(f"Máximo {IA_BULK_MAX} contratos por request")
+
+    return [
+        (i, it.get("texto_contrato") if isinstance(it, dict) else it)
+        for i, it in enumerate(items)
+    ]
+
+
+@app.route("/api/contracts/bulk", methods=["POST"])
+def crear_contratos_bulk():
+    """
+    Por default responde NDJSON en streaming: una línea por contrato a medida
+    que se extrae y guarda, y una última línea {"resumen": {...}}.
+    Con ?async=1 lo encola como job y devuelve el job_id.
+    """
+    tenant_id = tenant_actual()
+    try:
+        textos = _leer_items_bulk()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get("async") in ("1", "true"):
+        # max_intentos=1: reintentar re-insertaría lo que ya se guardó
+        job_id, _ = jobs.encolar(
+            "ingesta_contratos", {"tenant_id": tenant_id, "textos": [t for _, t in textos]}, max_intentos=1,
+        )
+        return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+    def generar():
+        for item in ingerir(textos, tenant_id):
+            yield json.dumps(item, default=str) + "\n"
+
+    return Response(stream_with_context(generar()), mimetype="application/x-ndjson")
+
+
 # =========================================================
 # GET /api/contracts (simple)
 # =========================================================
 @app.route("/api/contracts", methods=["GET"])
+@http_cache.condicional("contratos")
 def listar_contratos():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT id, inmobiliaria, inquilino, propietario,
-               fecha_inicio, fecha_fin, decision_renovacion
-        FROM contratos
-        ORDER BY fecha_fin ASC
-    """)
-    rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql(f"""
+            SELECT id, inmobiliaria, inquilino, propietario,
+                   fecha_inicio, fecha_fin, decision_renovacion,
+                   {sql_dias_hasta("fecha_fin")} AS dias_restantes
+            FROM contratos
+            WHERE tenant_id = %s
+            ORDER BY fecha_fin ASC
+        """), (date.today(), tenant_actual()))
+        rows = cur.fetchall()
+        cur.close()
 
-    hoy = date.today()
     out = []
 
     for r in rows:
-        fin = _parse_iso_date(r.get("fecha_fin"))
-        dias_restantes = (fin - hoy).days if fin else None
+        dias_restantes = r.get("dias_restantes")
+        dias_restantes = int(dias_restantes) if dias_restantes is not None else None
         por_vencer = dias_restantes is not None and 0 <= dias_restantes <= 60
 
         out.append({
@@ -211,32 +427,277 @@ def listar_contratos():
 
 
 # =========================================================
-# PATCH /api/contracts/<id>/renewal
+# GET /api/contracts/export (NDJSON / CSV en streaming)
 # =========================================================
+EXPORT_COLUMNAS = [
+    "id", "inmobiliaria", "inquilino", "propietario", "fecha_inicio", "fecha_fin",
+    "dias_aviso", "decision_renovacion", "dias_restantes", "estado",
+]
+EXPORT_CHUNK = 500
+
+
+def _filas_export(umbral, tenant_id):
+    """
+    Generador de filas enriquecidas leídas con cursor del lado del servidor:
+    en memoria hay a lo sumo EXPORT_CHUNK filas, sin importar el tamaño de la tabla.
+    """
+    conn = get_db_connection()
+    completo = False
+    try:
+        cur = cursor_streaming(conn, nombre="export_contratos")
+        cur.execute(adaptar_sql(f"""
+            SELECT id, inmobiliaria, inquilino, propietario,
+                   fecha_inicio, fecha_fin, dias_aviso, decision_renovacion,
+                   {sql_dias_hasta("fecha_fin")} AS dias_restantes
+            FROM contratos
+            WHERE tenant_id = %s
+            ORDER BY id ASC
+        """), (date.today(), tenant_id))
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK)
+            if not rows:
+                break
+            for r in rows:
+                calc = _estado_contrato(r.get("dias_restantes"), umbral_dias=umbral)
+                yield {
+                    "id": r.get("id"),
+                    "inmobiliaria": r.get("inmobiliaria"),
+                    "inquilino": r.get("inquilino"),
+                    "propietario": r.get("propietario"),
+                    "fecha_inicio": str(r.get("fecha_inicio")) if r.get("fecha_inicio") else None,
+                    "fecha_fin": str(r.get("fecha_fin")) if r.get("fecha_fin") else None,
+                    "dias_aviso": r.get("dias_aviso", 60),
+                    "decision_renovacion": r.get("decision_renovacion"),
+                    "dias_restantes": calc["dias_restantes"],
+                    "estado": calc["estado"],
+                }
+        cur.close()
+        completo = True
+    finally:
+        # si el cliente cortó a mitad, la conexión puede tener un resultado
+        # sin consumir (SSCursor / named cursor): mejor descartarla
+        conn.close(descartar=not completo)
+
+
+@app.route("/api/contracts/export", methods=["GET"])
+def exportar_contratos():
+    formato = (request.args.get("format") or "ndjson").lower()
+    if formato not in ("ndjson", "csv"):
+        return jsonify({"error": "format inválido", "valores": ["ndjson", "csv"]}), 400
+
+    try:
+        umbral = int(request.args.get("umbral", "60"))
+    except ValueError:
+        umbral = 60
+
+    # se resuelve acá: los generadores corren fuera del contexto del request
+    tenant_id = tenant_actual()
+
+    if formato == "ndjson":
+        def generar():
+            for fila in _filas_export(umbral, tenant_id):
+                yield json.dumps(fila, ensure_ascii=False) + "\n"
+
+        return Response(generar(), mimetype="application/x-ndjson")
+
+    def generar_csv():
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNAS)
+        writer.writeheader()
+        n = 0
+        for fila in _filas_export(umbral, tenant_id):
+            writer.writerow(fila)
+            n += 1
+            if n % EXPORT_CHUNK == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+        yield buf.getvalue()
+
+    return Response(
+        generar_csv(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=contratos.csv"},
+    )
+
+
+# =========================================================
+# PATCH /api/contracts/<id>/renewal y PATCH /api/contracts/renewal (lote)
+#
+# Las dos pasan por aplicar_renovaciones: una transacción que bloquea las
+# filas pedidas, decide el resultado de cada id y aplica todos los cambios
+# con un solo UPDATE (por tanda de RENEWAL_TANDA ids).
+# Concurrencia optimista: si el item trae actualizado_en (el que devolvió
+# /api/contracts/list) y la fila cambió desde entonces, ese id queda en
+# "conflicto" y no se toca.
+# =========================================================
+DECISIONES = ("RENUEVA", "NO_RENUEVA")
+RENEWAL_BULK_MAX = 500
+RENEWAL_TANDA = 200  # 2 parámetros por id: debajo del límite de 999 de SQLite viejos
+
+
+def _version_fila(valor):
+    """actualizado_en como lo ve el cliente: el str del valor guardado."""
+    return str(valor) if valor is not None else None
+
+
+def sql_renovaciones(tenant_id, cambios, ahora):
+    """
+    cambios: [(id, decision)] -> (sql con %s, params) de un único UPDATE.
+    - Postgres: join contra una lista VALUES
+    - MySQL / SQLite: CASE id WHEN ... THEN ...
+    """
+    pares = [x for par in cambios for x in par]
+    if DB_ENGINE in ("postgres", "postgresql"):
+        valores = ", ".join(["(%s::int, %s)"] * len(cambios))
+        sql = f"""
+            UPDATE contratos c SET decision_renovacion = v.decision, actualizado_en = %s
+            FROM (VALUES {valores}) AS v (id, decision)
+            WHERE c.id = v.id AND c.tenant_id = %s
+        """
+        return sql, (ahora, *pares, tenant_id)
+
+    casos = " ".join(["WHEN %s THEN %s"] * len(cambios))
+    marcas = ", ".join(["%s"] * len(cambios))
+    sql = f"""
+        UPDATE contratos SET decision_renovacion = CASE id {casos} END, actualizado_en = %s
+        WHERE tenant_id = %s AND id IN ({marcas})
+    """
+    return sql, (*pares, ahora, tenant_id, *[cid for cid, _ in cambios])
+
+
+def aplicar_renovaciones(tenant_id, items):
+    """
+    items: [{"id", "decision", "actualizado_en" (opcional)}], válidos y sin ids repetidos.
+    Devuelve {id: {"resultado": actualizado | sin_cambios | conflicto | no_encontrado,
+    "decision", "actualizado_en"}} (decision/actualizado_en: los vigentes después).
+    """
+    ids = sorted(it["id"] for it in items)
+    ahora = datetime.now()
+    sql = f"""
+        SELECT id, fecha_fin, decision_renovacion, actualizado_en FROM contratos
+        WHERE tenant_id = %s AND id IN ({", ".join(["%s"] * len(ids))})
+        ORDER BY id
+    """
+
+    out = {}
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        # filas bloqueadas hasta el commit, tomadas en orden de id (dos lotes no se cruzan)
+        if DB_ENGINE == "mysql":
+            conn.begin()
+            cur.execute(sql + " FOR UPDATE", (tenant_id, *ids))
+        elif DB_ENGINE in ("postgres", "postgresql"):
+            cur.execute(sql + " FOR UPDATE", (tenant_id, *ids))
+        else:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(adaptar_sql(sql), (tenant_id, *ids))
+        filas = {r.get("id"): r for r in cur.fetchall()}
+
+        cambios, deltas = [], []
+        for it in items:
+            r = filas.get(it["id"])
+            if r is None:
+                out[it["id"]] = {"resultado": "no_encontrado"}
+                continue
+
+            actual = {"decision": r.get("decision_renovacion"), "actualizado_en": _version_fila(r.get("actualizado_en"))}
+            esperado = it.get("actualizado_en")
+            if esperado is not None and esperado.replace("T", " ") != actual["actualizado_en"]:
+                out[it["id"]] = {"resultado": "conflicto", **actual}
+            elif actual["decision"] == it["decision"]:
+                out[it["id"]] = {"resultado": "sin_cambios", **actual}
+            else:
+                cambios.append((it["id"], it["decision"]))
+                deltas += [(r.get("fecha_fin"), actual["decision"], -1), (r.get("fecha_fin"), it["decision"], 1)]
+                out[it["id"]] = {
+                    "resultado": "actualizado", "decision": it["decision"], "actualizado_en": _version_fila(ahora),
+                }
+
+        for i in range(0, len(cambios), RENEWAL_TANDA):
+            sql_update, params = sql_renovaciones(tenant_id, cambios[i:i + RENEWAL_TANDA], ahora)
+            cur.execute(adaptar_sql(sql_update), params)
+        if cambios:
+            estadisticas.sumar(cur, tenant_id, deltas)
+            incrementar_version(cur)
+        conn.commit()
+        cur.close()
+
+    return out
+
+
+def _item_renovacion(it, vistos):
+    """Valida un item del lote. Devuelve el mensaje de error, o None si sirve."""
+    if not isinstance(it, dict):
+        return "item inválido"
+    if not isinstance(it.get("id"), int) or isinstance(it.get("id"), bool):
+        return "id inválido"
+    if it.get("decision") not in DECISIONES:
+        return "decision inválida"
+    if it.get("actualizado_en") is not None and not isinstance(it.get("actualizado_en"), str):
+        return "actualizado_en inválido"
+    if it["id"] in vistos:
+        return "id repetido"
+    return None
+
+
 @app.route("/api/contracts/<int:contrato_id>/renewal", methods=["PATCH"])
 def actualizar_renovacion(contrato_id):
     data = request.get_json() or {}
     decision = data.get("decision")
 
-    if decision not in ("RENUEVA", "NO_RENUEVA"):
+    if decision not in DECISIONES:
         return jsonify({"error": "decision inválida"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    ejecutar(
-        cur,
-        "UPDATE contratos SET decision_renovacion = %s WHERE id = %s",  # mysql
-        "UPDATE contratos SET decision_renovacion = %s WHERE id = %s",  # pg
-        "UPDATE contratos SET decision_renovacion = ? WHERE id = ?",    # sqlite
-        (decision, contrato_id),
-    )
+    item = {"id": contrato_id, "decision": decision, "actualizado_en": data.get("actualizado_en")}
+    if _item_renovacion(item, set()):
+        return jsonify({"error": "actualizado_en inválido"}), 400
+
+    res = aplicar_renovaciones(tenant_actual(), [item])[contrato_id]
+    if res["resultado"] == "no_encontrado":
+        return jsonify({"error": "contrato no encontrado"}), 404
+    if res["resultado"] == "conflicto":
+        return jsonify({"error": "el contrato cambió desde actualizado_en", **res}), 409
+    return jsonify({"ok": True, **res}), 200
 
-    conn.commit()
-    cur.close()
-    conn.close()
 
-    return jsonify({"ok": True}), 200
+@app.route("/api/contracts/renewal", methods=["PATCH"])
+def actualizar_renovaciones():
+    """
+    Body: {"items": [{"id", "decision", "actualizado_en"?}, ...]} (o la lista sola).
+    Responde 200 con el resultado de cada item, en el orden recibido:
+    actualizado | sin_cambios | conflicto | no_encontrado | invalido.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Falta items"}), 400
+    if len(items) > RENEWAL_BULK_MAX:
+        return jsonify({"error": f"Máximo {RENEWAL_BULK_MAX} items por request"}), 400
+
+    errores, validos, vistos = {}, [], set()
+    for i, it in enumerate(items):
+        error = _item_renovacion(it, vistos)
+        if error:
+            errores[i] = error
+        else:
+            vistos.add(it["id"])
+            validos.append(it)
+
+    res = aplicar_renovaciones(tenant_actual(), validos) if validos else {}
+
+    salida = []
+    for i, it in enumerate(items):
+        if i in errores:
+            salida.append({"id": it.get("id") if isinstance(it, dict) else None, "resultado": "invalido", "error": errores[i]})
+        else:
+            salida.append({"id": it["id"], **res[it["id"]]})
+
+    conteo = {}
+    for s in salida:
+        conteo[s["resultado"]] = conteo.get(s["resultado"], 0) + 1
+    return jsonify({"items": salida, "resumen": conteo}), 200
 
 
 # =========================================================
@@ -246,29 +707,31 @@ def actualizar_renovacion(contrato_id):
 def crear_contrato_manual():
     data = request.get_json() or {}
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     sql_mysql = """
         INSERT INTO contratos (
-            inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
-            email_inquilino, email_propietario
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
+            email_inquilino, email_propietario, texto_contrato,
+            inmobiliaria_id, inquilino_id, propietario_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
     sql_pg = """
         INSERT INTO contratos (
-            inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
-            email_inquilino, email_propietario
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
+            email_inquilino, email_propietario, texto_contrato,
+            inmobiliaria_id, inquilino_id, propietario_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         RETURNING id
     """
     sql_sqlite = """
         INSERT INTO contratos (
-            inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
-            email_inquilino, email_propietario
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
+            email_inquilino, email_propietario, texto_contrato,
+            inmobiliaria_id, inquilino_id, propietario_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
+    tenant_id = tenant_actual()
     params = (
+        tenant_id,
         data.get("inmobiliaria"),
         data.get("inquilino"),
         data.get("propietario"),
@@ -277,22 +740,81 @@ def crear_contrato_manual():
         data.get("dias_aviso", 60),
         data.get("email_inquilino"),
         data.get("email_propietario"),
+        data.get("texto_contrato"),
     )
 
-    contrato_id = insert_and_get_id(cur, sql_mysql, sql_pg, sql_sqlite, params)
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)  # vínculos, contrato, resumen y versión: todo o nada
+        ids = partes.vincular_contrato(cur, tenant_id, data)
+        params += (ids["inmobiliaria_id"], ids["inquilino_id"], ids["propietario_id"])
+        contrato_id = insert_and_get_id(cur, sql_mysql, sql_pg, sql_sqlite, params)
+        estadisticas.sumar(cur, tenant_id, estadisticas.altas([(data.get("fecha_fin"), None)]))
+        incrementar_version(cur)
+        conn.commit()
+        cur.close()
 
-    return jsonify({"id": contrato_id}), 201
+    return jsonify({"id": contrato_id, "partes": ids}), 201
 
 
 # =========================================================
 # GET /api/contracts/list (enriquecido + filtro)
 # =========================================================
+ESTADOS_FILTRO = ("por_vencer", "vigente", "vencido", "sin_fecha_fin")
+LIST_LIMIT_DEFAULT = 100
+LIST_LIMIT_MAX = 500
+
+
+def _rango_estado(only, hoy, umbral):
+    """
+    Traduce el filtro `only` a un rango de fecha_fin (inclusive) para el WHERE.
+    Devuelve (desde, hasta, con_fecha, sin_fecha):
+    - con_fecha: si entran filas con fecha_fin
+    - sin_fecha: si entran filas con fecha_fin NULL
+    Es el mismo criterio que _estado_contrato, pero resuelto en SQL.
+    """
+    if only == "vencido":
+        return None, hoy - timedelta(days=1), True, False
+    if only == "por_vencer":
+        return hoy, hoy + timedelta(days=umbral), True, False
+    if only == "vigente":
+        return hoy + timedelta(days=umbral + 1), None, True, False
+    if only == "sin_fecha_fin":
+        return None, None, False, True
+    return None, None, True, True
+
+
+def _encode_cursor(fecha_fin, contrato_id):
+    raw = json.dumps([str(fecha_fin) if fecha_fin else None, contrato_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """
+    Devuelve (fecha_fin_iso | None, id). Lanza ValueError si el cursor es inválido.
+    """
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        fecha_fin, contrato_id = json.loads(base64.urlsafe_b64decode(cursor + pad).decode())
+    except Exception:
+        raise ValueError("cursor inválido")
+
+    if fecha_fin is not None and _parse_iso_date(fecha_fin) is None:
+        raise ValueError("cursor inválido")
+    if not isinstance(contrato_id, int):
+        raise ValueError("cursor inválido")
+    return fecha_fin, contrato_id
+
+
 @app.route("/api/contracts/list", methods=["GET"])
+@http_cache.condicional("contratos")
 def listar_contratos_enriquecidos():
+    """
+    Paginado keyset sobre (fecha_fin, id) dentro del tenant:
+    - primero las filas con fecha_fin (rango por índice idx_contratos_tenant_fecha_fin_id)
+    - después las de fecha_fin NULL, por id (mismo índice)
+    Así el orden es el mismo en los tres motores (cada uno ordena los NULL distinto).
+    """
     umbral = request.args.get("umbral", default="60")
     try:
         umbral = int(umbral)
@@ -300,151 +822,729 @@ def listar_contratos_enriquecidos():
         umbral = 60
 
     only = request.args.get("only")  # por_vencer | vigente | vencido | sin_fecha_fin
+    if only and only not in ESTADOS_FILTRO:
+        return jsonify({"error": "only inválido", "valores": list(ESTADOS_FILTRO)}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    try:
+        limit = int(request.args.get("limit", LIST_LIMIT_DEFAULT))
+    except ValueError:
+        limit = LIST_LIMIT_DEFAULT
+    limit = max(1, min(limit, LIST_LIMIT_MAX))
+
+    cursor = request.args.get("cursor")
+    cursor_fecha, cursor_id = None, None
+    if cursor:
+        try:
+            cursor_fecha, cursor_id = _decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-    cur.execute("""
+    hoy = date.today()
+    tenant_id = tenant_actual()
+    desde, hasta, con_fecha, sin_fecha = _rango_estado(only, hoy, umbral)
+
+    columnas = f"""
         SELECT id, inmobiliaria, inquilino, propietario,
-               fecha_inicio, fecha_fin, dias_aviso, decision_renovacion
+               fecha_inicio, fecha_fin, fecha_aviso, dias_aviso, decision_renovacion,
+               inquilino_id, propietario_id, actualizado_en,
+               {sql_dias_hasta("fecha_fin")} AS dias_restantes
         FROM contratos
-        ORDER BY fecha_fin ASC
-    """)
-    rows = cur.fetchall()
+    """
+
+    rows = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        # tramo 1: fecha_fin NOT NULL (salvo que el cursor ya esté en el tramo NULL)
+        if con_fecha and not (cursor_id is not None and cursor_fecha is None):
+            where = ["tenant_id = %s", "fecha_fin IS NOT NULL"]
+            params = [hoy, tenant_id]
+            if desde:
+                where.append("fecha_fin >= %s")
+                params.append(desde.isoformat())
+            if hasta:
+                where.append("fecha_fin <= %s")
+                params.append(hasta.isoformat())
+            if cursor_id is not None:
+                where.append("fecha_fin >= %s AND (fecha_fin > %s OR id > %s)")
+                params.extend([cursor_fecha, cursor_fecha, cursor_id])
+
+            cur.execute(
+                adaptar_sql(columnas + " WHERE " + " AND ".join(where) + " ORDER BY fecha_fin ASC, id ASC LIMIT %s"),
+                tuple(params) + (limit + 1,),
+            )
+            rows = list(cur.fetchall())
+
+        # tramo 2: fecha_fin NULL
+        if sin_fecha and len(rows) <= limit:
+            where = ["tenant_id = %s", "fecha_fin IS NULL"]
+            params = [hoy, tenant_id]
+            if cursor_id is not None and cursor_fecha is None:
+                where.append("id > %s")
+                params.append(cursor_id)
+
+            cur.execute(
+                adaptar_sql(columnas + " WHERE " + " AND ".join(where) + " ORDER BY id ASC LIMIT %s"),
+                tuple(params) + (limit + 1 - len(rows),),
+            )
+            rows.extend(cur.fetchall())
+
+        cur.close()
 
-    cur.close()
-    conn.close()
+    hay_mas = len(rows) > limit
+    rows = rows[:limit]
 
     items = []
     for r in rows:
-        calc = _estado_contrato(r.get("fecha_fin"), umbral_dias=umbral)
-        item = {
+        calc = _estado_contrato(r.get("dias_restantes"), umbral_dias=umbral)
+        items.append({
             "id": r.get("id"),
             "inmobiliaria": r.get("inmobiliaria"),
             "inquilino": r.get("inquilino"),
             "propietario": r.get("propietario"),
+            "inquilino_id": r.get("inquilino_id"),
+            "propietario_id": r.get("propietario_id"),
+            "actualizado_en": str(r.get("actualizado_en")) if r.get("actualizado_en") else None,
             "fecha_inicio": str(r.get("fecha_inicio")) if r.get("fecha_inicio") else None,
             "fecha_fin": str(r.get("fecha_fin")) if r.get("fecha_fin") else None,
             "dias_aviso": r.get("dias_aviso", 60),
+            "fecha_aviso": str(r.get("fecha_aviso")) if r.get("fecha_aviso") else None,
             "decision_renovacion": r.get("decision_renovacion"),
             **calc,
+        })
+
+    next_cursor = None
+    if hay_mas and rows:
+        next_cursor = _encode_cursor(rows[-1].get("fecha_fin"), rows[-1].get("id"))
+
+    return jsonify({
+        "items": items,
+        "umbral_dias": umbral,
+        "limit": limit,
+        "next_cursor": next_cursor,
+    }), 200
+
+
+# =========================================================
+# GET /api/contracts/search?q=... (texto completo, ver busqueda.py)
+# =========================================================
+SEARCH_LIMIT_DEFAULT = 20
+SEARCH_LIMIT_MAX = 100
+SEARCH_OFFSET_MAX = 1000  # más allá conviene refinar la búsqueda
+
+
+@app.route("/api/contracts/search", methods=["GET"])
+@http_cache.condicional("contratos")
+def buscar_contratos():
+    """
+    Busca en inquilino, propietario, inmobiliaria y texto del contrato, sin
+    tildes y por prefijo. Resultados del tenant ordenados por relevancia,
+    paginados con limit/offset (next_offset = null en la última página).
+    """
+    q = (request.args.get("q") or "").strip()
+    terms = terminos(q)
+    if not terms:
+        return jsonify({"error": "Falta q"}), 400
+
+    try:
+        limit = int(request.args.get("limit", SEARCH_LIMIT_DEFAULT))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit/offset inválidos"}), 400
+    limit = max(1, min(limit, SEARCH_LIMIT_MAX))
+    if offset < 0 or offset > SEARCH_OFFSET_MAX:
+        return jsonify({"error": f"offset fuera de rango (0-{SEARCH_OFFSET_MAX})"}), 400
+
+    sql, params = sql_busqueda(terms, tenant_actual(), limit + 1, offset)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql(sql), params)
+        rows = cur.fetchall()
+        cur.close()
+
+    hay_mas = len(rows) > limit
+    items = [
+        {
+            "id": r.get("id"),
+            "inmobiliaria": r.get("inmobiliaria"),
+            "inquilino": r.get("inquilino"),
+            "propietario": r.get("propietario"),
+            "fecha_inicio": str(r.get("fecha_inicio")) if r.get("fecha_inicio") else None,
+            "fecha_fin": str(r.get("fecha_fin")) if r.get("fecha_fin") else None,
+            "decision_renovacion": r.get("decision_renovacion"),
+            "relevancia": round(float(r.get("relevancia") or 0), 4),
         }
-        if only and item.get("estado") != only:
-            continue
-        items.append(item)
+        for r in rows[:limit]
+    ]
 
-    return jsonify({"items": items, "umbral_dias": umbral}), 200
+    return jsonify({
+        "q": q,
+        "terminos": terms,
+        "items": items,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if hay_mas else None,
+    }), 200
 
 
 # =========================================================
-# POST /api/notifications/run-60d
+# GET /api/contracts/stats (dashboard)
+#
+# Sale de contratos_resumen (estadisticas.py), no de contratos: el costo es
+# por bucket (día de fecha_fin x decisión), no por contrato.
 # =========================================================
-@app.route("/api/notifications/run-60d", methods=["POST"])
-def run_notifications_60d():
-    umbral = 60
-    hoy = date.today()
+STATS_MESES_DEFAULT = 12
+STATS_MESES_MAX = 60
 
-    conn = get_db_connection()
-    cur = conn.cursor()
 
-    if DB_ENGINE in ("postgres", "postgresql"):
-        sql_select = """
-            SELECT id, inquilino, propietario, fecha_fin,
-                   email_inquilino, email_propietario,
-                   notificado_60d, decision_renovacion
-            FROM contratos
-            WHERE estado = 'ACTIVO'
-              AND fecha_fin IS NOT NULL
-              AND notificado_60d = FALSE
-              AND (email_inquilino IS NOT NULL OR email_propietario IS NOT NULL)
-            ORDER BY fecha_fin ASC
-        """
+def _sumar_meses(mes, n):
+    """Primer día del mes `n` meses después de `mes` (un date con day=1)."""
+    total = mes.year * 12 + mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+@app.route("/api/contracts/stats", methods=["GET"])
+@http_cache.condicional("contratos")
+def estadisticas_contratos():
+    """
+    Conteos del tenant por estado (mismo criterio que /api/contracts/list con
+    ?only=), por decisión de renovación, y vencimientos por mes desde ?desde=YYYY-MM
+    (default: mes actual) durante ?meses= meses.
+    """
+    try:
+        umbral = int(request.args.get("umbral", 60))
+        meses = int(request.args.get("meses", STATS_MESES_DEFAULT))
+    except ValueError:
+        return jsonify({"error": "umbral/meses inválidos"}), 400
+    meses = max(1, min(meses, STATS_MESES_MAX))
+
+    hoy = date.today()
+    desde = request.args.get("desde")
+    if desde:
+        try:
+            desde = datetime.strptime(desde, "%Y-%m").date()
+        except ValueError:
+            return jsonify({"error": "desde inválido (YYYY-MM)"}), 400
     else:
-        sql_select = """
-            SELECT id, inquilino, propietario, fecha_fin,
-                   email_inquilino, email_propietario,
-                   notificado_60d, decision_renovacion
-            FROM contratos
-            WHERE estado = 'ACTIVO'
-              AND fecha_fin IS NOT NULL
-              AND notificado_60d = 0
-              AND (email_inquilino IS NOT NULL OR email_propietario IS NOT NULL)
-            ORDER BY fecha_fin ASC
-        """
+        desde = hoy.replace(day=1)
+    hasta = _sumar_meses(desde, meses)
+
+    tenant_id = tenant_actual()
+    rangos = {e: _rango_estado(e, hoy, umbral) for e in ESTADOS_FILTRO}
+    with db_connection() as conn:
+        cur = conn.cursor()
+        matriz = estadisticas.por_estado(cur, tenant_id, rangos)
+        mensual = estadisticas.por_mes(cur, tenant_id, desde, hasta)
+        cur.close()
+
+    por_estado = {e: sum(fila[e] for fila in matriz.values()) for e in ESTADOS_FILTRO}
+    por_decision = {d: fila["total"] for d, fila in matriz.items()}
+    decididos = por_decision.get("RENUEVA", 0) + por_decision.get("NO_RENUEVA", 0)
+
+    vencimientos = []
+    for i in range(meses):
+        mes = _sumar_meses(desde, i).strftime("%Y-%m")
+        decisiones = mensual.get(mes, {})
+        vencimientos.append({"mes": mes, "total": sum(decisiones.values()), "por_decision": decisiones})
 
-    cur.execute(sql_select)
-    rows = cur.fetchall()
+    return jsonify({
+        "hoy": hoy.isoformat(),
+        "umbral": umbral,
+        "total": sum(por_decision.values()),
+        "por_estado": por_estado,
+        "por_decision": por_decision,
+        "por_estado_decision": {
+            e: {d: fila[e] for d, fila in matriz.items() if fila[e]} for e in ESTADOS_FILTRO
+        },
+        "tasa_renovacion": round(por_decision.get("RENUEVA", 0) / decididos, 4) if decididos else None,
+        "vencimientos": vencimientos,
+    }), 200
 
-    notificados = []
-    saltados = []
 
-    for r in rows:
-        fin = _parse_iso_date(r.get("fecha_fin"))
-        if not fin:
-            saltados.append({"id": r.get("id"), "motivo": "sin_fecha_fin"})
-            continue
+# =========================================================
+# POST /api/notifications/run-60d
+#
+# Avisos por etapas: cada contrato recibe un aviso al llegar a su fecha_aviso
+# (fecha_fin - dias_aviso) y después uno por cada etapa de NOTIF_ETAPAS menor
+# a su dias_aviso (ej. dias_aviso=60 -> 60, 30, 7). Cada corrida es de un tenant.
+#
+# Entrega por destinatario (outbox):
+# 1. los avisos pendientes se agrupan por email: un digest (plantillas.py)
+#    con todos los contratos de esa persona, como inquilino o propietario
+# 2. cada digest se guarda en notificaciones_envios, ya renderizado y con una
+#    clave de idempotencia, antes de mandar nada
+# 3. se mandan los pendientes/fallidos del tenant (notifier.despachar_envios)
+#    y cada lote registra el estado de sus envíos
+# 4. un (contrato, etapa) pasa a notificaciones_log cuando todos sus
+#    destinatarios lo recibieron; mientras tanto sus envíos fallidos se
+#    reintentan en las corridas siguientes (hasta NOTIF_MAX_INTENTOS)
+# =========================================================
+NOTIF_ETAPAS = tuple(sorted(
+    {int(x) for x in os.getenv("NOTIF_ETAPAS", "90,60,30,7").split(",") if x.strip()},
+    reverse=True,
+))
+NOTIF_MAX_INTENTOS = int(os.getenv("NOTIF_MAX_INTENTOS", "5"))  # por envío, sumando corridas
+NOTIF_ROLES = ("inquilino", "propietario")
 
-        dias = (fin - hoy).days
-        if not (0 <= dias <= umbral):
-            saltados.append({"id": r.get("id"), "motivo": f"fuera_de_umbral ({dias})"})
-            continue
 
-        if r.get("decision_renovacion") not in (None, "PENDIENTE"):
-            saltados.append({"id": r.get("id"), "motivo": f"decision_renovacion={r.get('decision_renovacion')}"})
-            continue
+def sql_etapa(etapas=NOTIF_ETAPAS):
+    """
+    CASE que da la etapa vigente de cada fila: la menor etapa >= dias_restantes
+    (las etapas son enteros de configuración, van inline). Si no hay ninguna
+    más chica que dias_aviso, la etapa es el propio dias_aviso.
+    """
+    whens = " ".join(
+        f"WHEN d.dias_restantes <= {int(e)} AND {int(e)} < d.dias_aviso THEN {int(e)}"
+        for e in sorted(etapas)
+    )
+    return f"CASE {whens} ELSE d.dias_aviso END" if whens else "d.dias_aviso"
+
+
+def sql_candidatos_aviso(hoy, tenant_id, etapas=NOTIF_ETAPAS):
+    """
+    Contratos del tenant con un aviso pendiente hoy, en una sola consulta:
+    - rango sobre idx_contratos_tenant_estado_fecha_aviso:
+      tenant_id = X AND estado = 'ACTIVO' AND fecha_aviso <= hoy,
+      así los contratos que todavía no entran en ventana no se leen
+      (los vencidos salen de 'ACTIVO' con cerrar_vencidos)
+    - la etapa se calcula en SQL y se descartan las que ya están en notificaciones_log
+    - asignado_<rol>: ese destinatario ya tiene la etapa en un envío (entregado o
+      por reintentar), no se vuelve a incluir en un digest
+    Devuelve (sql con %s, params).
+    """
+    asignados = ",\n".join(
+        f"""
+               CASE WHEN EXISTS (
+                   SELECT 1 FROM notificaciones_items i
+                   WHERE i.contrato_id = c.id AND i.etapa = c.etapa AND i.destinatario = LOWER(TRIM(c.email_{rol}))
+               ) THEN 1 ELSE 0 END AS asignado_{rol}"""
+        for rol in NOTIF_ROLES
+    )
+    sql = f"""
+        SELECT c.*,{asignados}
+        FROM (
+            SELECT d.*, {sql_etapa(etapas)} AS etapa
+            FROM (
+                SELECT id, inquilino, propietario, fecha_fin, dias_aviso,
+                       email_inquilino, email_propietario, decision_renovacion,
+                       {sql_dias_hasta("fecha_fin")} AS dias_restantes
+                FROM contratos
+                WHERE tenant_id = %s
+                  AND estado = 'ACTIVO'
+                  AND fecha_aviso <= %s
+                  AND fecha_fin >= %s
+                  AND (decision_renovacion IS NULL OR decision_renovacion = 'PENDIENTE')
+                  AND (email_inquilino IS NOT NULL OR email_propietario IS NOT NULL)
+            ) d
+        ) c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM notificaciones_log l
+            WHERE l.contrato_id = c.id AND l.etapa = c.etapa
+        )
+        ORDER BY c.fecha_fin ASC, c.id ASC
+    """
+    return sql, (hoy, tenant_id, hoy, hoy)
+
+
+def sql_cerrar_vencidos(hoy, tenant_id):
+    """
+    Pasa a 'VENCIDO' los contratos ACTIVO del tenant cuya fecha_fin ya pasó,
+    para que el rango del selector no crezca con el histórico.
+    fecha_aviso <= fecha_fin, así que también es un rango sobre
+    (tenant_id, estado, fecha_aviso).
+    """
+    sql = """
+        UPDATE contratos SET estado = 'VENCIDO', actualizado_en = %s
+        WHERE tenant_id = %s AND estado = 'ACTIVO' AND fecha_aviso < %s AND fecha_fin < %s
+    """
+    return sql, (datetime.now(), tenant_id, hoy, hoy)
 
-        destinos = []
-        if r.get("email_inquilino"):
-            destinos.append(r.get("email_inquilino"))
-        if r.get("email_propietario"):
-            destinos.append(r.get("email_propietario"))
 
+def cerrar_vencidos(tenant_id, hoy=None):
+    sql, params = sql_cerrar_vencidos(hoy or date.today(), tenant_id)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)
+        cur.execute(adaptar_sql(sql), params)
+        n = cur.rowcount
+        if n:
+            incrementar_version(cur)
+        conn.commit()
+        cur.close()
+    return n
+
+
+def sql_registrar_avisos(avisos):
+    """
+    Lo que hay que escribir por un lote enviado: una fila en notificaciones_log
+    por aviso, la marca notificado_60d (primer aviso) en contratos y la
+    versión de contratos para el cache HTTP.
+    Devuelve [(sql con %s, filas), ...].
+    """
+    ahora = datetime.now()
+    flag = True if DB_ENGINE in ("postgres", "postgresql") else 1
+    return [
+        (
+            """
+            INSERT INTO notificaciones_log (contrato_id, etapa, dias_restantes, destinos, enviado_en)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            [(a["id"], a["etapa"], a["dias_restantes"], ",".join(a["destinos"]), ahora) for a in avisos],
+        ),
+        (
+            """
+            UPDATE contratos SET notificado_60d = %s, notificado_60d_at = COALESCE(notificado_60d_at, %s)
+            WHERE id = %s
+            """,
+            [(flag, ahora, a["id"]) for a in avisos],
+        ),
+        (http_cache.SQL_INCREMENTAR, [("contratos",)]),
+    ]
+
+
+def _insert_ignorando(sql):
+    """INSERT que no falla si la fila ya existe (la creó otra corrida)."""
+    if DB_ENGINE == "mysql":
+        return sql.replace("INSERT INTO", "INSERT IGNORE INTO", 1)
+    return sql + " ON CONFLICT DO NOTHING"
+
+
+def clave_envio(tenant_id, destinatario, contratos):
+    """
+    Clave de idempotencia de un digest: sha256 del tenant, el destinatario y
+    sus (contrato, etapa). El mismo digest da siempre la misma clave, y es la
+    que va como Idempotency-Key a Resend.
+    """
+    items = ",".join(sorted(f"{c['id']}:{c['etapa']}" for c in contratos))
+    return hashlib.sha256(f"{tenant_id}|{destinatario}|{items}".encode()).hexdigest()
+
+
+def armar_envios(rows, tenant_id):
+    """
+    Agrupa los avisos por destinatario: un digest por email con todos sus
+    contratos (ordenados por días restantes), renderizado con plantillas.py.
+    Los (contrato, etapa, destinatario) que ya están en un envío no se repiten:
+    ese envío se reintenta tal cual. El filtro por fecha, etapa, estado y
+    decisión ya lo hizo sql_candidatos_aviso.
+    Si inquilino y propietario tienen el mismo email, el contrato va una sola
+    vez en su digest, con los dos roles.
+    Devuelve (envios, saltados).
+    """
+    por_destino = {}  # destinatario -> {contrato_id: item}
+    saltados = []
+
+    for r in rows:
+        dias = int(r.get("dias_restantes"))
+        destinos = [(rol, r.get(f"email_{rol}")) for rol in NOTIF_ROLES if (r.get(f"email_{rol}") or "").strip()]
         if not destinos:
             saltados.append({"id": r.get("id"), "motivo": "sin_emails"})
             continue
 
-        subject = f"[Alquileres AI] Contrato por vencer en {dias} días (ID {r.get('id')})"
-        body = (
-            "Hola,\n\n"
-            "Aviso automático: un contrato está próximo a vencer.\n\n"
-            f"Contrato ID: {r.get('id')}\n"
-            f"Inquilino: {r.get('inquilino')}\n"
-            f"Propietario: {r.get('propietario')}\n"
-            f"Fecha fin: {fin}\n"
-            f"Días restantes: {dias}\n\n"
-            "Saludos,\n"
-            "Sistema Alquileres AI\n"
+        for rol, email in destinos:
+            if r.get(f"asignado_{rol}"):
+                continue
+            contratos = por_destino.setdefault(email.strip().lower(), {})
+            if r.get("id") in contratos:
+                contratos[r.get("id")]["roles"].append(rol)
+                continue
+            contratos[r.get("id")] = {
+                "id": r.get("id"),
+                "etapa": int(r.get("etapa")),
+                "roles": [rol],
+                "inquilino": r.get("inquilino"),
+                "propietario": r.get("propietario"),
+                "fecha_fin": str(r.get("fecha_fin")),
+                "dias_restantes": dias,
+            }
+
+    envios = []
+    for destinatario, por_id in por_destino.items():
+        contratos = sorted(por_id.values(), key=lambda c: (c["dias_restantes"], c["id"]))
+        asunto, texto, html = plantillas.digest_vencimientos(contratos)
+        envios.append({
+            "destinatario": destinatario,
+            "clave": clave_envio(tenant_id, destinatario, contratos),
+            "asunto": asunto,
+            "texto": texto,
+            "html": html,
+            "contratos": contratos,
+        })
+
+    return envios, saltados
+
+
+def sql_crear_envios(tenant_id, envios):
+    """
+    Los digests nuevos y sus items, antes de mandar nada (si la corrida se
+    corta, la próxima los encuentra pendientes). Idempotente por clave y por
+    (contrato, etapa, destinatario).
+    Devuelve [(sql con %s, filas), ...].
+    """
+    ahora = datetime.now()
+    return [
+        (
+            _insert_ignorando("""
+                INSERT INTO notificaciones_envios
+                    (tenant_id, destinatario, clave, asunto, texto, html, estado, intentos, creado_en)
+                VALUES (%s, %s, %s, %s, %s, %s, 'pendiente', 0, %s)
+            """),
+            [(tenant_id, e["destinatario"], e["clave"], e["asunto"], e["texto"], e["html"], ahora) for e in envios],
+        ),
+        (
+            _insert_ignorando("""
+                INSERT INTO notificaciones_items (contrato_id, etapa, destinatario, clave_envio, rol, dias_restantes)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """),
+            [
+                (c["id"], c["etapa"], e["destinatario"], e["clave"], ",".join(c["roles"]), c["dias_restantes"])
+                for e in envios
+                for c in e["contratos"]
+            ],
+        ),
+    ]
+
+
+def sql_envios_pendientes(tenant_id):
+    """Envíos del tenant por mandar: nuevos y fallidos con intentos disponibles. -> (sql con %s, params)"""
+    sql = """
+        SELECT id, destinatario, clave, asunto, texto, html, estado, intentos
+        FROM notificaciones_envios
+        WHERE tenant_id = %s AND estado IN ('pendiente', 'fallido') AND intentos < %s
+        ORDER BY id ASC
+    """
+    return sql, (tenant_id, NOTIF_MAX_INTENTOS)
+
+
+def sql_actualizar_envios(resultados):
+    """Estado de cada envío de un lote (resultados de notifier.despachar_envios). -> (sql con %s, filas)"""
+    ahora = datetime.now()
+    sql = """
+        UPDATE notificaciones_envios
+        SET estado = %s, intentos = intentos + 1, proveedor_id = %s, error = %s, enviado_en = %s
+        WHERE clave = %s
+    """
+    filas = [
+        (
+            "enviado" if r["ok"] else "fallido",
+            r["proveedor_id"],
+            None if r["ok"] else (r["error"] or "")[:512],
+            ahora if r["ok"] else None,
+            r["envio"]["clave"],
         )
+        for r in resultados
+    ]
+    return sql, filas
 
-        try:
-            for to in destinos:
-                send_email(to=to, subject=subject, body=body)
-
-            ejecutar(
-                cur,
-                "UPDATE contratos SET notificado_60d = %s, notificado_60d_at = %s WHERE id = %s",  # mysql
-                "UPDATE contratos SET notificado_60d = %s, notificado_60d_at = %s WHERE id = %s",  # pg
-                "UPDATE contratos SET notificado_60d = ?, notificado_60d_at = ? WHERE id = ?",     # sqlite
-                (True if DB_ENGINE in ("postgres", "postgresql") else 1, datetime.now(), r.get("id")),
-            )
 
-            notificados.append({"id": r.get("id"), "dias_restantes": dias, "destinos": destinos})
+def sql_items_etapas(claves):
+    """
+    Todos los items (de cualquier destinatario) de los (contrato, etapa) que
+    tocan estos envíos y todavía no están en notificaciones_log, con el estado
+    de su envío. -> (sql con %s, params)
+    """
+    marcas = ", ".join(["%s"] * len(claves))
+    sql = f"""
+        SELECT DISTINCT i.contrato_id, i.etapa, i.destinatario, i.dias_restantes, e.estado
+        FROM notificaciones_items t
+        JOIN notificaciones_items i ON i.contrato_id = t.contrato_id AND i.etapa = t.etapa
+        JOIN notificaciones_envios e ON e.clave = i.clave_envio
+        WHERE t.clave_envio IN ({marcas})
+          AND NOT EXISTS (
+              SELECT 1 FROM notificaciones_log l
+              WHERE l.contrato_id = i.contrato_id AND l.etapa = i.etapa
+          )
+    """
+    return sql, tuple(claves)
 
-        except Exception as e:
-            saltados.append({"id": r.get("id"), "motivo": f"error_envio: {repr(e)}"})
-            continue
 
-    conn.commit()
-    cur.close()
-    conn.close()
+def avisos_completos(items):
+    """
+    (contrato, etapa) con todos sus destinatarios entregados, como los
+    espera sql_registrar_avisos.
+    """
+    por_etapa = {}
+    for it in items:
+        por_etapa.setdefault((it["contrato_id"], int(it["etapa"])), []).append(it)
+
+    return [
+        {
+            "id": contrato_id,
+            "etapa": etapa,
+            "dias_restantes": min(int(it["dias_restantes"]) for it in grupo),
+            "destinos": sorted(it["destinatario"] for it in grupo),
+        }
+        for (contrato_id, etapa), grupo in sorted(por_etapa.items())
+        if all(it["estado"] == "enviado" for it in grupo)
+    ]
+
+
+def guardar_envios(tenant_id, envios):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)
+        for sql, filas in sql_crear_envios(tenant_id, envios):
+            if filas:
+                cur.executemany(adaptar_sql(sql), filas)
+        sql, params = sql_envios_pendientes(tenant_id)
+        cur.execute(adaptar_sql(sql), params)
+        pendientes = cur.fetchall()
+        conn.commit()
+        cur.close()
+    return pendientes
+
+
+def _registrar_envios(resultados):
+    """
+    Registra un lote de envíos, en una sola transacción: su estado y, para
+    los (contrato, etapa) que quedaron completos, notificaciones_log.
+    Devuelve los avisos completados.
+    """
+    claves = [r["envio"]["clave"] for r in resultados if r["ok"]]
+    avisos = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)
+        sql, filas = sql_actualizar_envios(resultados)
+        cur.executemany(adaptar_sql(sql), filas)
+        if claves:
+            sql, params = sql_items_etapas(claves)
+            cur.execute(adaptar_sql(sql), params)
+            avisos = avisos_completos(cur.fetchall())
+        if avisos:
+            for sql, filas in sql_registrar_avisos(avisos):
+                cur.executemany(adaptar_sql(sql), filas)
+        conn.commit()
+        cur.close()
+    if avisos:
+        http_cache.olvidar_version()
+    return avisos
+
+
+def resultado_notificaciones(resultados, notificados, saltados):
+    """
+    resultados: los de notifier.despachar_envios; notificados: los avisos
+    completados (una fila por contrato y etapa, con todos sus destinos).
+    """
+    envios = [
+        {
+            "destinatario": r["envio"]["destinatario"],
+            "estado": "enviado" if r["ok"] else "fallido",
+            "intentos": int(r["envio"].get("intentos") or 0) + 1,
+            "proveedor_id": r["proveedor_id"],
+            "error": r["error"],
+        }
+        for r in resultados
+    ]
 
-    return jsonify({
+    return {
         "ok": True,
-        "umbral_dias": umbral,
+        "etapas_dias": list(NOTIF_ETAPAS),
         "total_notificados": len(notificados),
-        "notificados": notificados,
+        "notificados": sorted(notificados, key=lambda a: (a["id"], a["etapa"])),
+        "total_envios": len(envios),
+        "envios_ok": sum(1 for e in envios if e["estado"] == "enviado"),
+        "envios": envios,
         "saltados": saltados,
-    }), 200
+    }
+
+
+def correr_notificaciones(tenant_id, progreso=None):
+    """
+    Arma los digests del tenant, los guarda y manda los pendientes con
+    notifier.despachar_envios (en paralelo). Cada lote se commitea apenas termina.
+
+    progreso(**contadores): opcional (lo usa el job), recibe total/procesados/exitosos/fallidos
+    (contados en envíos, uno por destinatario).
+    """
+    hoy = date.today()
+    cerrar_vencidos(tenant_id, hoy)
+
+    sql, params = sql_candidatos_aviso(hoy, tenant_id)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql(sql), params)
+        rows = cur.fetchall()
+        cur.close()
+
+    envios, saltados = armar_envios(rows, tenant_id)
+    pendientes = guardar_envios(tenant_id, envios)
+
+    on_progreso = None
+    if progreso:
+        progreso(total=len(pendientes), procesados=0, exitosos=0, fallidos=0)
+
+        def on_progreso(exitosos, fallidos):
+            progreso(procesados=exitosos + fallidos, exitosos=exitosos, fallidos=fallidos)
+
+    notificados = []
+
+    def on_lote(resultados):
+        notificados.extend(_registrar_envios(resultados))
+
+    resultados = despachar_envios(pendientes, on_lote=on_lote, on_progreso=on_progreso)
+    return resultado_notificaciones(resultados, notificados, saltados)
+
+
+@app.route("/api/notifications/run-60d", methods=["POST"])
+def run_notifications_60d():
+    return jsonify(correr_notificaciones(tenant_actual())), 200
+
+
+# =========================================================
+# Jobs en background (los corre worker.py)
+# =========================================================
+def _tenant_job(payload):
+    if payload.get("tenant_id") is None:
+        raise ValueError("job sin tenant_id")
+    return payload["tenant_id"]
+
+
+@jobs.registrar("notificaciones_60d")
+def _job_notificaciones_60d(payload, progreso):
+    return correr_notificaciones(_tenant_job(payload), progreso=progreso)
+
+
+@jobs.registrar("ingesta_contratos")
+def _job_ingesta_contratos(payload, progreso):
+    tenant_id = _tenant_job(payload)
+    textos = list(enumerate(payload.get("textos") or []))
+    progreso(total=len(textos), procesados=0, exitosos=0, fallidos=0)
+
+    items, resumen = [], None
+    exitosos = fallidos = 0
+    for item in ingerir(textos, tenant_id):
+        if "resumen" in item:
+            resumen = item["resumen"]
+            continue
+        items.append(item)
+        if item.get("ok"):
+            exitosos += 1
+        else:
+            fallidos += 1
+        if len(items) % 10 == 0:
+            progreso(procesados=len(items), exitosos=exitosos, fallidos=fallidos)
+
+    progreso(procesados=len(items), exitosos=exitosos, fallidos=fallidos)
+    return {"resumen": resumen, "items": sorted(items, key=lambda x: x["i"])}
+
+
+@app.route("/api/notifications/run-60d/jobs", methods=["POST"])
+def encolar_notificaciones_60d():
+    job_id, creado = jobs.encolar("notificaciones_60d", {"tenant_id": tenant_actual()}, unico=True)
+    return jsonify({
+        "job_id": job_id,
+        "creado": creado,
+        "status_url": f"/api/jobs/{job_id}",
+    }), 202
+
+
+@app.route("/api/jobs/<int:job_id>", methods=["GET"])
+def estado_job(job_id):
+    job = jobs.obtener(job_id)
+    # un job de otro tenant (o de antes de los tenants) no se muestra
+    if not job or (job.get("payload") or {}).get("tenant_id") != tenant_actual():
+        return jsonify({"error": "job no encontrado"}), 404
+    return jsonify(job), 200
 
 
 # =========================================================
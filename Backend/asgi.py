@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import functools
+from datetime import date
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import ai_cache
+import db_async
+from ai import extraer_datos_contrato_async
+from app import (
+    app as flask_app,
+    _parse_iso_date,
+    sql_candidatos_aviso,
+    sql_cerrar_vencidos,
+    sql_registrar_avisos,
+    sql_crear_envios,
+    sql_envios_pendientes,
+    sql_actualizar_envios,
+    sql_items_etapas,
+    armar_envios,
+    avisos_completos,
+    fallo_ia,
+    resultado_notificaciones,
+)
+import estadisticas
+import http_cache
+import metricas
+import partes
+import tenants
+from mailer import close_async_client
+from notifier import despachar_envios_async
+
+# =========================================================
+# Modo ASGI
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+#
+# Las dos rutas lentas (IA con Groq y envío de emails con Resend) corren
+# nativas en async: un proceso sostiene cientos de extracciones en vuelo sin
+# un thread por request. Todas las demás rutas las atiende la app Flask de
+# siempre (montada como WSGI), así que URLs y JSON son exactamente los mismos.
+# =========================================================
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))  # threads para las rutas Flask
+
+
+def _medido(ruta):
+    """Mismas métricas por request que la app Flask, para las rutas nativas async."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(request):
+            t0 = time.perf_counter()
+            status = 500
+            try:
+                resp = await fn(request)
+                status = resp.status_code
+                return resp
+            finally:
+                metricas.registrar_request(request.method, ruta, status, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+
+async def _tenant(request):
+    """Igual que tenants.tenant_actual() en Flask. Devuelve (tenant_id, respuesta de error)."""
+    try:
+        return await asyncio.to_thread(tenants.resolver, request.headers.get(tenants.TENANT_HEADER)), None
+    except tenants.TenantError as e:
+        return None, JSONResponse({"error": str(e), "header": e.header}, status_code=e.status)
+
+
+@_medido("/api/contracts")
+async def crear_contrato(request):
+    tenant_id, error = await _tenant(request)
+    if error:
+        return error
+
+    try:
+        data = await request.json() or {}
+    except Exception:
+        data = {}
+    texto_contrato = data.get("texto_contrato") if isinstance(data, dict) else None
+    if not texto_contrato:
+        return JSONResponse({"error": "Falta texto_contrato"}, status_code=400)
+
+    # cache: memoria + tabla (consulta corta, en un thread para no bloquear el loop)
+    clave = ai_cache.clave_cache(texto_contrato)
+    res, tier = await asyncio.to_thread(ai_cache.buscar, clave)
+
+    if res is None:
+        try:
+            res = await extraer_datos_contrato_async(texto_contrato)
+        except Exception as e:
+            return JSONResponse({"error": "Error en IA", "detalle": repr(e)}, status_code=500)
+        await asyncio.to_thread(ai_cache.guardar, clave, res)
+
+    extraidos = res.get("data") or {}
+    if (not res.get("ok")) or all(extraidos.get(k) is None for k in extraidos.keys()):
+        cuerpo, status, headers = fallo_ia(res)
+        return JSONResponse(cuerpo, status_code=status, headers=headers)
+
+    # el matching de partes son varias consultas cortas: una transacción sync en un thread
+    ids = await asyncio.to_thread(partes.vincular_en_transaccion, tenant_id, extraidos)
+
+    # contrato, resumen y versión en una sola transacción
+    async with db_async.conexion() as c, c.transaccion():
+        contrato_id = await c.insert(
+            """
+            INSERT INTO contratos (
+                tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+                inmobiliaria_id, inquilino_id, propietario_id
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                tenant_id,
+                extraidos.get("inmobiliaria"),
+                extraidos.get("inquilino"),
+                extraidos.get("propietario"),
+                _parse_iso_date(extraidos.get("fecha_inicio")),
+                _parse_iso_date(extraidos.get("fecha_fin")),
+                texto_contrato,
+                ids["inmobiliaria_id"],
+                ids["inquilino_id"],
+                ids["propietario_id"],
+            ),
+        )
+        sql, filas = estadisticas.sql_sumar(tenant_id, estadisticas.altas([(extraidos.get("fecha_fin"), None)]))
+        await c.executemany(sql, filas)
+        await c.execute(http_cache.SQL_INCREMENTAR, ("contratos",))
+    http_cache.olvidar_version()
+
+    return JSONResponse({
+        "id": contrato_id,
+        "extraido": extraidos,
+        "partes": ids,
+        "ia_ok": True,
+        "ia_modelo": res.get("model"),
+        "ia_cache": tier,
+        "ia_fuentes": res.get("fuentes"),
+        "ia_tiempos_ms": res.get("tiempos_ms"),
+        "ia_recorte": res.get("recorte"),
+    }, status_code=201)
+
+
+@_medido("/api/notifications/run-60d")
+async def run_notifications_60d(request):
+    tenant_id, error = await _tenant(request)
+    if error:
+        return error
+
+    hoy = date.today()
+    async with db_async.conexion() as c:
+        sql, params = sql_cerrar_vencidos(hoy, tenant_id)
+        async with c.transaccion():
+            cerrados = await c.execute(sql, params)
+            if cerrados:
+                await c.execute(http_cache.SQL_INCREMENTAR, ("contratos",))
+        if cerrados:
+            http_cache.olvidar_version()
+
+        sql, params = sql_candidatos_aviso(hoy, tenant_id)
+        rows = await c.fetchall(sql, params)
+
+        envios, saltados = armar_envios(rows, tenant_id)
+        async with c.transaccion():
+            for sql, filas in sql_crear_envios(tenant_id, envios):
+                if filas:
+                    await c.executemany(sql, filas)
+        sql, params = sql_envios_pendientes(tenant_id)
+        pendientes = await c.fetchall(sql, params)
+
+    notificados = []
+
+    async def registrar(resultados):
+        claves = [r["envio"]["clave"] for r in resultados if r["ok"]]
+        avisos = []
+        async with db_async.conexion() as c, c.transaccion():
+            sql, filas = sql_actualizar_envios(resultados)
+            await c.executemany(sql, filas)
+            if claves:
+                sql, params = sql_items_etapas(claves)
+                avisos = avisos_completos(await c.fetchall(sql, params))
+            if avisos:
+                for sql, filas in sql_registrar_avisos(avisos):
+                    await c.executemany(sql, filas)
+        if avisos:
+            http_cache.olvidar_version()
+        notificados.extend(avisos)
+
+    resultados = await despachar_envios_async(pendientes, on_lote=registrar)
+    return JSONResponse(resultado_notificaciones(resultados, notificados, saltados))
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    await db_async.init_pool()
+    yield
+    await db_async.close_pool()
+    await close_async_client()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/contracts", crear_contrato, methods=["POST"]),
+        Route("/api/notifications/run-60d", run_notifications_60d, methods=["POST"]),
+        # el resto (y GET /api/contracts) lo resuelve Flask
+        Mount("/", app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
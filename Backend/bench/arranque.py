@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+from bench.util import BACKEND, commit_actual
+
+# =========================================================
+# Perfil de arranque en frío
+#
+#   python -m bench.arranque                    # import de app.py
+#   python -m bench.arranque --modulo asgi --out arranque.json
+#
+# Cada repetición es un proceso nuevo con `python -X importtime`: cuánto
+# tarda importar el módulo, qué imports directos pesan más (acumulado) y qué
+# módulos pesan más por sí solos. Después, en otro proceso, lo que cuesta
+# crear cada recurso del registro (lo que pagaría el primer request si
+# nadie llamó a /api/health/ready).
+# =========================================================
+
+
+def _importtime(modulo, env):
+    """Una corrida -> [(profundidad, nombre, self_us, acumulado_us)] en el orden de -X importtime."""
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    filas = []
+    for linea in p.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        # "import time:      1027 |      67774 |     flask.app" (2 espacios por nivel)
+        propio, acumulado, nombre = linea.split(":", 1)[1].split("|")
+        prof = (len(nombre) - len(nombre.lstrip(" ")) - 1) // 2
+        propio, acumulado = int(propio), int(acumulado)
+        filas.append((prof, nombre.strip(), propio, acumulado))
+    return filas
+
+
+def _perfil(modulo, repeticiones, env):
+    total, directos, propios = [], {}, {}
+    for _ in range(repeticiones):
+        filas = _importtime(modulo, env)
+        raiz = next(f for f in filas if f[1] == modulo and f[0] == 0)
+        total.append(raiz[3])
+
+        # los imports directos del módulo son los de profundidad 1 justo antes de su línea
+        i = filas.index(raiz)
+        j = i - 1
+        while j >= 0 and filas[j][0] >= 1:
+            if filas[j][0] == 1:
+                directos.setdefault(filas[j][1], []).append(filas[j][3])
+            j -= 1
+        for prof, nombre, propio, _ in filas[j + 1:i + 1]:
+            propios.setdefault(nombre, []).append(propio)
+
+    med = lambda xs: round(statistics.median(xs) / 1000, 1)  # noqa: E731  us -> ms
+    return {
+        "import_ms": med(total),
+        "directos_ms": dict(sorted(((k, med(v)) for k, v in directos.items()), key=lambda kv: -kv[1])),
+        "propios_ms": dict(sorted(((k, med(v)) for k, v in propios.items()), key=lambda kv: -kv[1])),
+    }
+
+
+def _recursos(modulo, env):
+    """Recursos del registro creados en frío, después de importar el módulo."""
+    codigo = f"import json, {modulo}, registro; print(json.dumps(registro.calentar(list(registro.RECURSOS))))"
+    p = subprocess.run([sys.executable, "-c", codigo], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--modulo", default="app", help="app (WSGI) o asgi")
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=BACKEND, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("GROQ_API_KEY", "bench")
+
+    perfil = _perfil(args.modulo, args.repeticiones, env)
+    recursos = _recursos(args.modulo, env)
+
+    print(f"▶ import {args.modulo}: {perfil['import_ms']} ms (mediana de {args.repeticiones})")
+    print("  imports directos (acumulado):")
+    for nombre, ms in list(perfil["directos_ms"].items())[:args.top]:
+        print(f"    {nombre:40s} {ms:>8} ms")
+    print("  módulos (propio):")
+    for nombre, ms in list(perfil["propios_ms"].items())[:args.top]:
+        print(f"    {nombre:40s} {ms:>8} ms")
+    print("▶ recursos del registro (creados en frío):")
+    for nombre, r in recursos.items():
+        print(f"    {nombre:40s} {r['ms']:>8} ms  {'ok' if r['listo'] else r['error']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"commit": commit_actual(), "modulo": args.modulo, **perfil, "recursos": recursos}, f, indent=2)
+        print(f"Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+import httpx
+
+from bench.fakes import iniciar_fakes
+from bench.util import BACKEND, percentil, esperar
+
+# =========================================================
+# Benchmark: app Flask (gunicorn, threads) vs modo ASGI (uvicorn)
+#
+#   python -m bench.asgi_vs_wsgi --requests 400 --concurrency 200 --groq-ms 800
+#
+# Los dos sirven sobre la misma SQLite y contra el mismo Groq falso con
+# latencia fija. Se mide POST /api/contracts con textos distintos (sin
+# hits de cache) y se escribe el resultado en JSON.
+# =========================================================
+
+
+async def _carga(url, n, concurrencia, prefijo):
+    latencias, errores = [], 0
+    sem = asyncio.Semaphore(concurrencia)
+    limits = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def uno(i):
+            nonlocal errores
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/api/contracts", json={
+                        "texto_contrato": f"CONTRATO {prefijo}-{i}\nLOCATARIO: Persona {prefijo} {i}\n",
+                    })
+                    if r.status_code != 201:
+                        errores += 1
+                except Exception:
+                    errores += 1
+                latencias.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(uno(i) for i in range(n)))
+        total = time.perf_counter() - t0
+
+    return {
+        "requests": n,
+        "concurrencia": concurrencia,
+        "errores": errores,
+        "segundos": round(total, 3),
+        "rps": round(n / total, 2),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+    }
+
+
+def _correr_modo(modo, env, args, puerto):
+    if modo == "wsgi":
+        cmd = [
+            sys.executable, "-m", "gunicorn", "app:app",
+            "-b", f"127.0.0.1:{puerto}", "-w", str(args.workers),
+            "--threads", str(args.threads), "--timeout", "300",
+        ]
+    else:
+        cmd = [
+            sys.executable, "-m", "uvicorn", "asgi:app",
+            "--host", "127.0.0.1", "--port", str(puerto),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ]
+
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        esperar(url)
+        res = asyncio.run(_carga(url, args.requests, args.concurrency, modo))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    res["server"] = " ".join(cmd[2:])
+    return res
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=400)
+    p.add_argument("--concurrency", type=int, default=200)
+    p.add_argument("--groq-ms", type=float, default=800)
+    p.add_argument("--workers", type=int, default=1, help="procesos por server")
+    p.add_argument("--threads", type=int, default=8, help="threads por worker de gunicorn")
+    p.add_argument("--out", default="bench_asgi.json")
+    args = p.parse_args()
+
+    fakes, fake_url = iniciar_fakes(groq_ms=args.groq_ms)
+
+    tmp = tempfile.mkdtemp(prefix="bench_asgi_")
+    env = {
+        **os.environ,
+        "DB_ENGINE": "sqlite",
+        "DB_PATH": os.path.join(tmp, "bench.db"),
+        "GROQ_API_KEY": "fake",
+        "GROQ_BASE_URL": fake_url,
+        "RESEND_API_KEY": "fake",
+        "RESEND_API_URL": fake_url,
+    }
+    subprocess.run([sys.executable, "db_init.py"], cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    resultados = {}
+    for i, modo in enumerate(("wsgi", "asgi")):
+        print(f"▶ {modo} ...")
+        resultados[modo] = _correr_modo(modo, env, args, 8700 + i)
+        print(f"  {resultados[modo]}")
+
+    fakes.shutdown()
+
+    out = {
+        "benchmark": "asgi_vs_wsgi",
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "groq_ms": args.groq_ms,
+            "workers": args.workers,
+            "threads": args.threads,
+        },
+        "resultados": resultados,
+    }
+    with open(args.out, "w") as f:
+        json.dump(out, f, indent=2)
+    print(f"Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import sys
+import json
+import argparse
+
+# =========================================================
+# Compara dos JSON de bench.suite (antes / después)
+#
+#   python -m bench.comparar bench_antes.json bench_despues.json --umbral 10
+#
+# Imprime p50/p99/rps por tamaño y ruta con la variación en %, y sale con
+# código 1 si alguna ruta empeoró su p99 más que --umbral (útil en CI).
+# =========================================================
+
+
+def _delta(antes, despues):
+    if not antes or despues is None:
+        return None
+    return (despues - antes) / antes * 100
+
+
+def _fmt(v, d):
+    if v is None:
+        return f"{'-':>10}"
+    txt = f"{v:>10}" if d is None else f"{v:>10} ({d:+.0f}%)"
+    return f"{txt:>18}"
+
+
+def comparar(a, b, umbral):
+    peores = []
+    for tam, res_b in b["resultados"].items():
+        res_a = a["resultados"].get(tam)
+        if not res_a:
+            continue
+        print(f"\n▶ {tam} contratos ({a.get('commit')} -> {b.get('commit')})")
+        print(f"  {'ruta':45s} {'p50 ms':>18} {'p99 ms':>18} {'rps':>18}")
+        for ruta, rb in res_b["rutas"].items():
+            ra = res_a["rutas"].get(ruta)
+            if not ra:
+                continue
+            d50 = _delta(ra["p50_ms"], rb["p50_ms"])
+            d99 = _delta(ra["p99_ms"], rb["p99_ms"])
+            drps = _delta(ra["rps"], rb["rps"])
+            marca = ""
+            if d99 is not None and d99 > umbral:
+                marca = "  ⚠️"
+                peores.append((tam, ruta, d99))
+            print(f"  {ruta:45s} {_fmt(rb['p50_ms'], d50)} {_fmt(rb['p99_ms'], d99)} {_fmt(rb['rps'], drps)}{marca}")
+    return peores
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("antes")
+    p.add_argument("despues")
+    p.add_argument("--umbral", type=float, default=10, help="% de empeoramiento del p99 que se considera regresión")
+    args = p.parse_args()
+
+    with open(args.antes) as f:
+        a = json.load(f)
+    with open(args.despues) as f:
+        b = json.load(f)
+
+    peores = comparar(a, b, args.umbral)
+    if peores:
+        print(f"\n{len(peores)} ruta(s) con p99 peor que +{args.umbral:.0f}%:")
+        for tam, ruta, d in peores:
+            print(f"  {tam:>8}  {ruta}  {d:+.0f}%")
+        sys.exit(1)
+    print("\nSin regresiones de p99.")
+
+
+if __name__ == "__main__":
+    main()
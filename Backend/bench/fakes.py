@@ -0,0 +1,255 @@
+import re
+import sys
+import json
+import time
+import random
+import threading
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =========================================================
+# Stand-ins locales de Groq y Resend para benchmarks
+#
+#   python -m bench.fakes --groq-ms 800 --resend-ms 100 --port 8900
+#
+# - POST /openai/v1/chat/completions  (compatible con el SDK de Groq: GROQ_BASE_URL;
+#                                      con "stream": true responde SSE de a ~1 token)
+# - POST /emails                     (compatible con mailer.py: RESEND_API_URL)
+#
+# Fallas inyectables en Groq (para bench.llm_fallas) y en Resend, por flag o en caliente:
+#   POST /_fake/config  {"groq_error": 0.3, "groq_caidos": ["llama-3.3-70b-versatile"], ...}
+#   GET  /_fake/stats   -> pedidos por modelo y resultado ("resend": emails por resultado)
+# /emails respeta Idempotency-Key como Resend: el mismo key devuelve el mismo
+# id sin contar un email nuevo ("duplicado" en stats).
+# =========================================================
+
+
+class _Config:
+    groq_ms = 800
+    resend_ms = 100
+    groq_error = 0.0          # probabilidad de 500
+    groq_429 = 0.0            # probabilidad de 429 (con Retry-After)
+    groq_retry_after = 1.0    # seg.
+    groq_cola = 0.0           # probabilidad de una respuesta lenta
+    groq_cola_ms = 5000       # latencia de esas respuestas
+    groq_caidos = ()          # modelos que responden 503 siempre
+    groq_invalido = 0.0       # probabilidad de un JSON con una clave fuera del esquema
+    groq_ttft = 0.4           # fracción de la latencia hasta el primer token (stream)
+    resend_error = 0.0        # probabilidad de 500 en /emails
+
+
+_CONFIGURABLES = ("groq_ms", "resend_ms", "groq_error", "groq_429", "groq_retry_after",
+                  "groq_cola", "groq_cola_ms", "groq_caidos", "groq_invalido", "groq_ttft", "resend_error")
+_stats = {}
+_stats_lock = threading.Lock()
+_idempotencia = {}  # Idempotency-Key -> id del email
+
+
+def configurar(**kw):
+    """Cambia fallas/latencias del fake (mismas claves que POST /_fake/config)."""
+    for k, v in kw.items():
+        if k not in _CONFIGURABLES:
+            raise ValueError(f"opción desconocida: {k}")
+        setattr(_Config, k, tuple(v) if k == "groq_caidos" else float(v))
+    with _stats_lock:
+        _stats.clear()
+        _idempotencia.clear()
+
+
+def _contar(modelo, resultado):
+    with _stats_lock:
+        por_modelo = _stats.setdefault(modelo, {})
+        por_modelo[resultado] = por_modelo.get(resultado, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como los servicios reales
+    disable_nagle_algorithm = True  # chunks SSE chicos: sin esto cada uno espera el ACK demorado
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _responder(self, status, obj, headers=None):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/_fake/stats":
+            with _stats_lock:
+                return self._responder(200, _stats)
+        self._responder(404, {"error": "not found"})
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        data = json.loads(self.rfile.read(largo) or b"null")
+
+        if self.path == "/_fake/config":
+            try:
+                configurar(**(data or {}))
+            except (ValueError, TypeError) as e:
+                return self._responder(400, {"error": str(e)})
+            return self._responder(200, {k: getattr(_Config, k) for k in _CONFIGURABLES})
+
+        if self.path.endswith("/chat/completions"):
+            return self._groq(data)
+
+        if self.path.endswith("/emails"):
+            return self._email()
+
+        self._responder(404, {"error": "not found"})
+
+    def _email(self):
+        time.sleep(_Config.resend_ms / 1000.0)
+        clave = self.headers.get("Idempotency-Key")
+        with _stats_lock:
+            previo = _idempotencia.get(clave) if clave else None
+        if previo:
+            _contar("resend", "duplicado")
+            return self._responder(200, {"id": previo})
+        if random.random() < _Config.resend_error:
+            _contar("resend", "500")
+            return self._responder(500, {"name": "internal_server_error", "message": "fake"})
+        with _stats_lock:
+            email_id = f"fake-{len(_idempotencia) + 1}-{random.getrandbits(32):08x}"
+            if clave:
+                _idempotencia[clave] = email_id
+        _contar("resend", "200")
+        return self._responder(200, {"id": email_id})
+
+    def _groq(self, data):
+        modelo = (data or {}).get("model", "fake")
+        error = {"error": {"message": "fake", "type": "fake_error"}}
+
+        if modelo in _Config.groq_caidos:
+            _contar(modelo, "503")
+            return self._responder(503, error)
+        if random.random() < _Config.groq_429:
+            _contar(modelo, "429")
+            return self._responder(429, error, {"Retry-After": f"{_Config.groq_retry_after:g}"})
+
+        lento = random.random() < _Config.groq_cola
+        ms = _Config.groq_cola_ms if lento else _Config.groq_ms
+        if random.random() < _Config.groq_error:
+            time.sleep(ms / 1000.0)
+            _contar(modelo, "500")
+            return self._responder(500, error)
+
+        _contar(modelo, "200_lento" if lento else "200")
+        if (data or {}).get("stream"):
+            return self._stream(data, ms)
+        time.sleep(ms / 1000.0)
+        return self._responder(200, _completion(data))
+
+    def _stream(self, data, ms):
+        """SSE como Groq: chunks de ~1 token repartidos en la latencia; usage en x_groq al final."""
+        contenido, n_in, n_out = _contenido(data)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def evento(obj):
+            linea = b"data: " + (obj if isinstance(obj, bytes) else json.dumps(obj).encode()) + b"\n\n"
+            self.wfile.write(f"{len(linea):X}\r\n".encode() + linea + b"\r\n")
+            self.wfile.flush()
+
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": (data or {}).get("model", "fake")}
+        tokens = [contenido[i:i + 4] for i in range(0, len(contenido), 4)]
+        time.sleep(ms * _Config.groq_ttft / 1000.0)
+        for t in tokens:
+            evento({**base, "choices": [{"index": 0, "delta": {"content": t}, "finish_reason": None}]})
+            time.sleep(ms * (1 - _Config.groq_ttft) / len(tokens) / 1000.0)
+        evento({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "x_groq": {"id": "fake", "usage": {"prompt_tokens": n_in, "completion_tokens": n_out,
+                                                   "total_tokens": n_in + n_out}}})
+        evento(b"[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _contenido(req):
+    """JSON de extracción plausible (o, con groq_invalido, con una clave de más) y tokens estimados."""
+    prompt = " ".join(m.get("content", "") for m in (req or {}).get("messages", []))
+    m = re.search(r'LOCATARIO:\s*([^\n,"]+)', prompt)
+    inquilino = m.group(1).strip() if m else "Inquilino Demo"
+    datos = {
+        "inmobiliaria": "Inmobiliaria Demo",
+        "inquilino": inquilino,
+        "propietario": "Propietario Demo",
+        "fecha_inicio": "2025-01-01",
+        "fecha_fin": "2027-01-01",
+    }
+    if random.random() < _Config.groq_invalido:
+        datos = {"observaciones": "El contrato no especifica garantía.", **datos}
+    contenido = json.dumps(datos)
+    return contenido, len(prompt) // 4, len(contenido) // 4
+
+
+def _completion(req):
+    """Respuesta tipo OpenAI con un JSON de extracción plausible."""
+    contenido, n_in, n_out = _contenido(req)
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": (req or {}).get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": contenido},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": n_in, "completion_tokens": n_out, "total_tokens": n_in + n_out},
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # el cliente cortó antes de tiempo (timeout, hedge perdedor, stream cerrado en la llave de cierre)
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def iniciar_fakes(groq_ms=800, resend_ms=100, host="127.0.0.1", port=0):
+    """Levanta el server en un thread. Devuelve (server, base_url)."""
+    _Config.groq_ms = groq_ms
+    _Config.resend_ms = resend_ms
+    server = _Server((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--groq-ms", type=float, default=800)
+    p.add_argument("--resend-ms", type=float, default=100)
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--groq-error", type=float, default=0.0, help="probabilidad de 500")
+    p.add_argument("--groq-429", type=float, default=0.0, help="probabilidad de 429")
+    p.add_argument("--groq-retry-after", type=float, default=1.0)
+    p.add_argument("--groq-cola", type=float, default=0.0, help="probabilidad de respuesta lenta")
+    p.add_argument("--groq-cola-ms", type=float, default=5000)
+    p.add_argument("--groq-caidos", default="", help="modelos que responden 503, separados por coma")
+    p.add_argument("--groq-invalido", type=float, default=0.0, help="probabilidad de JSON fuera del esquema")
+    p.add_argument("--resend-error", type=float, default=0.0, help="probabilidad de 500 en /emails")
+    a = p.parse_args()
+
+    server, url = iniciar_fakes(a.groq_ms, a.resend_ms, port=a.port)
+    configurar(groq_error=a.groq_error, groq_429=a.groq_429, groq_retry_after=a.groq_retry_after,
+               groq_cola=a.groq_cola, groq_cola_ms=a.groq_cola_ms,
+               groq_caidos=[m for m in a.groq_caidos.split(",") if m], groq_invalido=a.groq_invalido,
+               resend_error=a.resend_error)
+    print(f"Fakes en {url}  (GROQ_BASE_URL={url}  RESEND_API_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from bench.util import BACKEND, percentil, commit_actual
+
+# =========================================================
+# Cliente LLM (llm.py) contra un Groq falso con fallas
+#
+#   python -m bench.llm_fallas --requests 200 --concurrency 20 --groq-ms 200
+#   python -m bench.llm_fallas --async --solo "cola" --out fallas.json
+#   python -m bench.llm_fallas --stream       # modo JSON + stream con ai_json
+#
+# El fake corre en otro proceso (como Groq: no compite por el GIL con el
+# cliente) y se configura por HTTP. Cada escenario configura sus fallas, arranca con circuitos y
+# latencias en cero y hace N llamadas a llm.completar (o completar_async).
+# Por escenario: % de éxito, p50/p99, intentos por llamada, cuántas
+# respondió un modelo de fallback, pedidos que le llegaron al fake por
+# modelo y resultado, y cómo quedó cada circuito. Con --stream, además,
+# "ms_invalidas": cuánto tardó en descartarse una respuesta fuera del esquema.
+# =========================================================
+ESCENARIOS = [
+    # (nombre, fallas del fake, settings de llm.py)
+    ("sano", {}, {}),
+    ("cola 5% x4s sin hedge", {"groq_cola": 0.05, "groq_cola_ms": 4000}, {"LLM_HEDGE_MS": "0"}),
+    ("cola 5% x4s con hedge (p95)", {"groq_cola": 0.05, "groq_cola_ms": 4000}, {"LLM_HEDGE_MS": "auto"}),
+    ("30% de 5xx", {"groq_error": 0.3}, {}),
+    ("ráfaga de 429 (50%, Retry-After 0.5s)", {"groq_429": 0.5, "groq_retry_after": 0.5}, {}),
+    ("modelo principal caído", {"groq_caidos": "principal"}, {}),
+    ("10% JSON fuera del esquema", {"groq_invalido": 0.1}, {}),
+]
+
+
+def _levantar_fake(groq_ms):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.fakes", "--port", str(port), "--groq-ms", str(groq_ms)],
+        cwd=BACKEND, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    fin = time.time() + 15
+    while time.time() < fin:
+        try:
+            httpx.get(url + "/_fake/stats", timeout=1)
+            return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("El fake no levantó")
+
+
+def _mensajes(i):
+    return [{"role": "user", "content": f"CONTRATO {i}\nLOCATARIO: Persona {i}\n"}]
+
+
+def _reiniciar(llm):
+    for m in llm.MODELOS:
+        llm._circuitos[m] = llm.Circuito(m)
+        llm._latencias[m].clear()
+
+
+def _carga_sync(llm, n, concurrencia, opciones):
+    def uno(i):
+        t0 = time.perf_counter()
+        try:
+            res = llm.completar(_mensajes(i), **opciones)
+        except (llm.LLMError, llm.RespuestaInvalida) as e:
+            return time.perf_counter() - t0, e, len(e.intentos)
+        return time.perf_counter() - t0, res, len(res["intentos"])
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        return list(pool.map(uno, range(n)))
+
+
+async def _carga_async(llm, n, concurrencia, opciones):
+    sem = asyncio.Semaphore(concurrencia)
+
+    async def uno(i):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                res = await llm.completar_async(_mensajes(i), **opciones)
+            except (llm.LLMError, llm.RespuestaInvalida) as e:
+                return time.perf_counter() - t0, e, len(e.intentos)
+            return time.perf_counter() - t0, res, len(res["intentos"])
+
+    return await asyncio.gather(*(uno(i) for i in range(n)))
+
+
+def correr(llm, fake_url, nombre, fallas, settings, args, loop, opciones):
+    fallas = dict(fallas)
+    if fallas.get("groq_caidos") == "principal":
+        fallas["groq_caidos"] = [llm.MODELOS[0]]
+    previos = {k: getattr(llm, k) for k in settings}
+    for k, v in settings.items():
+        setattr(llm, k, v)
+    httpx.post(fake_url + "/_fake/config", json={
+        "groq_ms": args.groq_ms, "groq_error": 0, "groq_429": 0, "groq_cola": 0, "groq_caidos": [],
+        "groq_invalido": 0, **fallas,
+    }).raise_for_status()
+    _reiniciar(llm)
+
+    t0 = time.perf_counter()
+    try:
+        if args.modo_async:
+            filas = loop.run_until_complete(_carga_async(llm, args.requests, args.concurrency, opciones))
+        else:
+            filas = _carga_sync(llm, args.requests, args.concurrency, opciones)
+    finally:
+        for k, v in previos.items():
+            setattr(llm, k, v)
+    total = time.perf_counter() - t0
+
+    latencias = [seg for seg, res, _ in filas]
+    ok = [res for _, res, _ in filas if isinstance(res, dict)]
+    invalidas = [seg for seg, res, _ in filas if isinstance(res, llm.RespuestaInvalida)]
+    al_fake = httpx.get(fake_url + "/_fake/stats").json()
+    return {
+        "escenario": nombre,
+        "requests": len(filas),
+        "exito_pct": round(100.0 * len(ok) / len(filas), 1),
+        "segundos": round(total, 2),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+        "intentos_promedio": round(sum(n for _, _, n in filas) / len(filas), 2),
+        "fallback": sum(1 for res in ok if res["fallback"]),
+        "invalidas": len(invalidas),
+        "ms_invalidas": round(percentil(invalidas, 50) * 1000, 1) if invalidas else None,
+        "al_fake": al_fake,
+        "circuitos": {m: e["circuito"] for m, e in llm.estado().items()},
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--groq-ms", type=float, default=200)
+    p.add_argument("--async", dest="modo_async", action="store_true", help="completar_async en vez de completar")
+    p.add_argument("--stream", action="store_true", help="modo JSON + stream con el parser incremental (ai_json)")
+    p.add_argument("--solo", default=None, help="sólo escenarios cuyo nombre contenga esto")
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    fake, fake_url = _levantar_fake(args.groq_ms)
+    os.environ["GROQ_BASE_URL"] = fake_url
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    import llm  # después de GROQ_BASE_URL: el cliente lo arma el registro al primer uso
+    from ai_json import ParserExtraccion
+
+    opciones = {"response_format": {"type": "json_object"}}
+    if args.stream:
+        opciones["parser"] = ParserExtraccion
+
+    # un solo event loop para todos los escenarios: el AsyncGroq del registro queda atado al primero
+    loop = asyncio.new_event_loop()
+    resultados = []
+    try:
+        for nombre, fallas, settings in ESCENARIOS:
+            if args.solo and args.solo not in nombre:
+                continue
+            r = correr(llm, fake_url, nombre, fallas, settings, args, loop, opciones)
+            resultados.append(r)
+            print(f"▶ {nombre:40s} éxito {r['exito_pct']:>5}%  p50 {r['p50_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  "
+                  f"intentos {r['intentos_promedio']:>4}  fallback {r['fallback']:>4}  inválidas {r['invalidas']:>3} "
+                  f"({r['ms_invalidas']} ms)  circuitos {r['circuitos']}")
+    finally:
+        loop.close()
+        fake.terminate()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "commit": commit_actual(),
+                "modo": "async" if args.modo_async else "sync",
+                "stream": args.stream,
+                "modelos": llm.MODELOS,
+                "groq_ms": args.groq_ms,
+                "concurrency": args.concurrency,
+                "resultados": resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+from db import get_connection, DB_ENGINE, insert_and_get_id
+from estadisticas import reconstruir
+from tenants import slug
+
+# =========================================================
+# Contratos sintéticos para benchmarks
+#
+#   DB_PATH=/tmp/bench.db python -m bench.seed --n 100000
+#   DB_ENGINE=postgres DATABASE_URL=... python -m bench.seed --n 1000000
+#
+# Siempre los mismos datos para la misma --semilla y el mismo día:
+# fecha_fin repartida entre hace un año y dentro de dos, así hay vencidos,
+# por vencer (en todas las etapas de aviso) y vigentes. Cada inmobiliaria es
+# un tenant (~1/5 de las filas cada uno, "default" las sin inmobiliaria).
+# =========================================================
+NOMBRES = ("Ana", "Juan", "María", "Carlos", "Lucía", "Pedro", "Sofía", "Diego", "Laura", "Martín")
+APELLIDOS = ("Gómez", "Pérez", "López", "Díaz", "Fernández", "Romero", "Sosa", "Torres", "Ruiz", "Álvarez")
+MARCA = "%s" if DB_ENGINE in ("mysql", "postgres", "postgresql") else "?"
+INMOBILIARIAS = ("Inmobiliaria Sur", "Propiedades Norte", "Casa & Co", "Alquileres Centro", None)
+
+
+def _persona(rnd):
+    return f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}"
+
+
+def filas(n, semilla=42, hoy=None):
+    rnd = random.Random(semilla)
+    hoy = hoy or date.today()
+    for i in range(n):
+        fin = hoy + timedelta(days=rnd.randint(-365, 730)) if rnd.random() > 0.02 else None
+        inicio = fin - timedelta(days=730) if fin else None
+        inquilino, propietario = _persona(rnd), _persona(rnd)
+        inmobiliaria = rnd.choice(INMOBILIARIAS)
+        yield (
+            inmobiliaria,
+            inquilino,
+            propietario,
+            inicio.isoformat() if inicio else None,
+            fin.isoformat() if fin else None,
+            rnd.choice((30, 60, 60, 90)),
+            "PENDIENTE" if rnd.random() < 0.8 else rnd.choice(("RENUEVA", "NO_RENUEVA")),
+            f"inq{i}@example.com" if rnd.random() < 0.9 else None,
+            # un propietario suele tener varias unidades: el digest de avisos las junta
+            f"prop{i // 3}@example.com" if rnd.random() < 0.5 else None,
+            # texto corto para la búsqueda de texto completo
+            f"Contrato de locación entre {propietario} (LOCADOR) y {inquilino} (LOCATARIO) "
+            f"por el inmueble de calle {rnd.choice(APELLIDOS)} {rnd.randint(1, 9999)}, "
+            f"desde {inicio} hasta {fin}." + (f" Administra {inmobiliaria}." if inmobiliaria else ""),
+        )
+
+
+def _tenants(cur):
+    """slug -> tenant_id de cada inmobiliaria (crea los que falten)."""
+    ids = {}
+    for nombre in INMOBILIARIAS:
+        valor = slug(nombre)
+        cur.execute(f"SELECT id FROM tenants WHERE slug = {MARCA}", (valor,))
+        row = cur.fetchone()
+        ids[valor] = row["id"] if row else insert_and_get_id(
+            cur,
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (%s, %s, %s)",
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (%s, %s, %s) RETURNING id",
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (?, ?, ?)",
+            (valor, nombre or "Sin inmobiliaria", datetime.now()),
+        )
+    return ids
+
+
+def sembrar(n, semilla=42, lote=5000):
+    """Inserta n contratos en lotes (executemany + commit por lote). Devuelve segundos."""
+    sql = f"""
+        INSERT INTO contratos (
+            tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, dias_aviso,
+            decision_renovacion, email_inquilino, email_propietario, texto_contrato
+        ) VALUES ({", ".join([MARCA] * 11)})
+    """
+
+    t0 = time.perf_counter()
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        ids = _tenants(cur)
+        conn.commit()
+        buf = []
+        for fila in filas(n, semilla):
+            buf.append((ids[slug(fila[0])],) + fila)
+            if len(buf) >= lote:
+                cur.executemany(sql, buf)
+                conn.commit()
+                buf = []
+        if buf:
+            cur.executemany(sql, buf)
+            conn.commit()
+
+        # el INSERT directo no pasa por las rutas que mantienen contratos_resumen
+        reconstruir(cur)
+        conn.commit()
+
+        # estadísticas del planificador al día con los datos nuevos
+        if DB_ENGINE in ("postgres", "postgresql"):
+            cur.execute("ANALYZE contratos")
+        elif DB_ENGINE == "mysql":
+            cur.execute("ANALYZE TABLE contratos")
+        else:
+            cur.execute("ANALYZE")
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    return time.perf_counter() - t0
+
+
+def vaciar():
+    """Borra contratos y todo lo que depende de ellos (para resembrar en Postgres/MySQL)."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        for tabla in ("notificaciones_items", "notificaciones_envios", "notificaciones_log", "contratos_resumen",
+                      "contratos", "partes_bloques", "partes", "jobs", "ia_cache"):
+            cur.execute(f"DELETE FROM {tabla}")
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def reiniciar_avisos():
+    """Deja los contratos como recién sembrados para volver a medir run-60d."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        for tabla in ("notificaciones_items", "notificaciones_envios", "notificaciones_log"):
+            cur.execute(f"DELETE FROM {tabla}")
+        cur.execute(
+            "UPDATE contratos SET estado = 'ACTIVO', notificado_60d = {0}, notificado_60d_at = NULL "
+            "WHERE estado = 'VENCIDO' OR notificado_60d = {0}".format(MARCA),
+            (False, True),
+        )
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--n", type=int, default=10000)
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--vaciar", action="store_true", help="borrar los datos existentes antes")
+    p.add_argument("--reset-avisos", action="store_true", help="sólo borrar avisos enviados y vencimientos (no siembra)")
+    a = p.parse_args()
+
+    if a.reset_avisos:
+        reiniciar_avisos()
+        raise SystemExit(0)
+    if a.vaciar:
+        vaciar()
+    seg = sembrar(a.n, a.semilla)
+    print(f"{a.n} contratos en {seg:.1f} s ({DB_ENGINE})")
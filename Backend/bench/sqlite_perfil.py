@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from bench.util import BACKEND, resumen, commit_actual
+
+# =========================================================
+# SQLite: perfil básico vs. producción (db_sqlite.py)
+#
+#   python -m bench.sqlite_perfil --n 20000 --lectores 12 --escritores 4 --segundos 10
+#   python -m bench.sqlite_perfil --out sqlite.json
+#
+# Por perfil: una base nueva (db_init + bench.seed) y un proceso con
+# lectores y escritores concurrentes contra el pool de db.py durante N
+# segundos, como los threads de Flask:
+# - lectura: una página del listado de un tenant, o un contrato por id
+# - escritura: la decisión de renovación de un contrato + la versión de
+#   contratos (cache HTTP), en una transacción
+# Da operaciones/s, p50/p99 y errores ("database is locked" y otros) de
+# lecturas y escrituras, y la mejora de producción sobre básico.
+# =========================================================
+PERFILES = ("basico", "produccion")
+DECISIONES = ("PENDIENTE", "RENUEVA", "NO_RENUEVA")
+
+
+def _carga(args):
+    """Corre en el proceso hijo (SQLITE_PERFIL y DB_PATH ya en el entorno)."""
+    from db import db_connection, adaptar_sql, pool_stats
+    from http_cache import incrementar_version
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM tenants ORDER BY id")
+        tenants = [r["id"] for r in cur.fetchall()]
+        cur.execute("SELECT MAX(id) AS n FROM contratos")
+        max_id = cur.fetchone()["n"]
+        cur.close()
+
+    sql_pagina = adaptar_sql("""
+        SELECT id, inquilino, propietario, fecha_fin, decision_renovacion FROM contratos
+        WHERE tenant_id = %s ORDER BY fecha_fin ASC, id ASC LIMIT 50 OFFSET %s
+    """)
+    sql_uno = adaptar_sql("SELECT * FROM contratos WHERE id = %s")
+    sql_decision = adaptar_sql("UPDATE contratos SET decision_renovacion = %s, actualizado_en = %s WHERE id = %s")
+
+    def leer(rnd):
+        with db_connection() as conn:
+            cur = conn.cursor()
+            if rnd.random() < 0.5:
+                cur.execute(sql_pagina, (rnd.choice(tenants), rnd.randint(0, 20) * 50))
+            else:
+                cur.execute(sql_uno, (rnd.randint(1, max_id),))
+            cur.fetchall()
+            cur.close()
+
+    def escribir(rnd):
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(sql_decision, (rnd.choice(DECISIONES), time.strftime("%Y-%m-%d %H:%M:%S"), rnd.randint(1, max_id)))
+            incrementar_version(cur)
+            conn.commit()
+            cur.close()
+
+    fin = time.perf_counter() + args.segundos
+    res = {"lecturas": ([], {}), "escrituras": ([], {})}
+
+    def trabajador(tipo, fn, semilla):
+        rnd = random.Random(semilla)
+        latencias, errores = res[tipo]
+        while time.perf_counter() < fin:
+            t0 = time.perf_counter()
+            try:
+                fn(rnd)
+            except Exception as e:
+                motivo = str(e)[:60]
+                errores[motivo] = errores.get(motivo, 0) + 1
+                continue
+            latencias.append(time.perf_counter() - t0)
+
+    hilos = [threading.Thread(target=trabajador, args=("lecturas", leer, i)) for i in range(args.lectores)]
+    hilos += [threading.Thread(target=trabajador, args=("escrituras", escribir, 1000 + i)) for i in range(args.escritores)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - t0
+
+    out = {}
+    for tipo, (latencias, errores) in res.items():
+        out[tipo] = resumen(latencias, sum(errores.values()), total)
+        out[tipo]["ops"] = out[tipo].pop("rps")
+        out[tipo]["detalle_errores"] = errores
+    out["pool"] = pool_stats()
+    return out
+
+
+def correr(perfil, args):
+    db_path = os.path.join(args.dir, f"bench_{perfil}.db")
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + sufijo):
+            os.remove(db_path + sufijo)
+    env = {
+        **os.environ,
+        "DB_ENGINE": "sqlite",
+        "DB_PATH": db_path,
+        "SQLITE_PERFIL": perfil,
+        "DB_POOL_SIZE": str(args.lectores + args.escritores),
+        "PYTHONPATH": BACKEND,
+    }
+    subprocess.run([sys.executable, "db_init.py"], cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(
+        [sys.executable, "-m", "bench.seed", "--n", str(args.n)],
+        cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    p = subprocess.run(
+        [sys.executable, "-m", "bench.sqlite_perfil", "--interno",
+         "--lectores", str(args.lectores), "--escritores", str(args.escritores), "--segundos", str(args.segundos)],
+        cwd=BACKEND, env=env, check=True, capture_output=True, text=True,
+    )
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--n", type=int, default=20000, help="contratos a sembrar")
+    p.add_argument("--lectores", type=int, default=12)
+    p.add_argument("--escritores", type=int, default=4)
+    p.add_argument("--segundos", type=float, default=10)
+    p.add_argument("--dir", default=tempfile.gettempdir(), help="dónde crear las bases (disco local)")
+    p.add_argument("--out", default=None)
+    p.add_argument("--interno", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.interno:
+        print(json.dumps(_carga(args), default=str))
+        return
+
+    resultados = {}
+    for perfil in PERFILES:
+        r = resultados[perfil] = correr(perfil, args)
+        for tipo in ("lecturas", "escrituras"):
+            x = r[tipo]
+            print(f"▶ {perfil:10s} {tipo:10s} {x['ops']:>9} ops/s  p50 {x['p50_ms']:>8} ms  "
+                  f"p99 {x['p99_ms']:>8} ms  errores {x['errores']:>5} {x['detalle_errores'] or ''}")
+
+    mejora = {
+        tipo: round(resultados["produccion"][tipo]["ops"] / resultados["basico"][tipo]["ops"], 2)
+        if resultados["basico"][tipo]["ops"] else None
+        for tipo in ("lecturas", "escrituras")
+    }
+    print(f"Producción / básico (ops/s): {mejora}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "commit": commit_actual(),
+                "n": args.n,
+                "lectores": args.lectores,
+                "escritores": args.escritores,
+                "segundos": args.segundos,
+                "resultados": resultados,
+                "mejora": mejora,
+            }, f, indent=2, ensure_ascii=False, default=str)
+        print(f"Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
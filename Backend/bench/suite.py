@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, date, timedelta
+
+import httpx
+
+from bench.fakes import iniciar_fakes
+from bench.util import BACKEND, resumen, esperar, commit_actual
+from bench.seed import NOMBRES, APELLIDOS
+
+# =========================================================
+# Suite de benchmarks de la API
+#
+#   python -m bench.suite --sizes 10000,100000 --out bench_suite.json
+#   python -m bench.suite --sizes 1000000 --pg-url postgresql://... --out bench_pg.json
+#   python -m bench.comparar bench_antes.json bench_despues.json
+#
+# Por cada tamaño: base nueva (SQLite en un temp, o la de --pg-url vaciada),
+# db_init + bench.seed, server real (gunicorn o uvicorn) contra Groq y Resend
+# falsos (bench.fakes) y todas las rutas de app.py, cada una con su carga,
+# como un tenant (--tenant) de los cinco que siembra bench.seed.
+# Resultado: JSON con rps y p50/p99 por ruta, para comparar entre commits.
+# =========================================================
+
+
+def _cursor(fecha_fin, contrato_id):
+    # mismo formato que app._encode_cursor
+    raw = json.dumps([fecha_fin, contrato_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _texto_libre(i):
+    # sin etiquetas LOCADOR/LOCATARIO: las reglas no alcanzan y se llama a Groq
+    return f"Contrato de alquiler número {i} celebrado entre dos partes por un inmueble en la calle {i}."
+
+
+# (nombre, tipo, generador(i, ctx) -> (método, url, json, headers))
+# tipo: "liviano" (--requests, --concurrency), "pesado" (--requests-pesados, concurrencia baja)
+#       o "secuencial" (de a uno, con reset de avisos antes de cada request)
+ESCENARIOS = [
+    ("GET /api/routes", "liviano", lambda i, ctx: ("GET", "/api/routes", None, None)),
+    ("GET /api/ping", "liviano", lambda i, ctx: ("GET", "/api/ping", None, None)),
+    ("GET /api/metrics", "liviano", lambda i, ctx: ("GET", "/api/metrics", None, None)),
+    ("GET /api/db/pool", "liviano", lambda i, ctx: ("GET", "/api/db/pool", None, None)),
+    ("GET /api/tenants", "liviano",
+     lambda i, ctx: ("GET", "/api/tenants", None, {"Authorization": f"Bearer {ctx['admin_token']}"})),
+    ("GET /api/cache/http", "liviano", lambda i, ctx: ("GET", "/api/cache/http", None, None)),
+    ("GET /api/ai/cache", "liviano", lambda i, ctx: ("GET", "/api/ai/cache", None, None)),
+    ("GET /api/ai/metrics", "liviano", lambda i, ctx: ("GET", "/api/ai/metrics", None, None)),
+    ("GET /api/contracts (304)", "liviano",
+     lambda i, ctx: ("GET", "/api/contracts", None, {"If-None-Match": ctx["etag_contracts"]})),
+    ("GET /api/contracts (cacheado)", "pesado", lambda i, ctx: ("GET", "/api/contracts", None, None)),
+    ("GET /api/contracts (sin cache)", "pesado", lambda i, ctx: ("GET", f"/api/contracts?_b={i}", None, None)),
+    ("GET /api/contracts/list", "liviano",
+     lambda i, ctx: ("GET", f"/api/contracts/list?limit=100&_b={i}", None, None)),
+    ("GET /api/contracts/list?only=por_vencer", "liviano",
+     lambda i, ctx: ("GET", f"/api/contracts/list?only=por_vencer&limit=100&_b={i}", None, None)),
+    ("GET /api/contracts/list (cursor)", "liviano",
+     lambda i, ctx: ("GET", f"/api/contracts/list?limit=100&cursor={ctx['cursor']}&_b={i}", None, None)),
+    ("GET /api/contracts/list (cacheado)", "liviano",
+     lambda i, ctx: ("GET", "/api/contracts/list?limit=100", None, None)),
+    ("GET /api/contracts/search?q=<apellido>", "liviano",
+     lambda i, ctx: ("GET", f"/api/contracts/search?q={APELLIDOS[i % len(APELLIDOS)]}&_b={i}", None, None)),
+    ("GET /api/contracts/search?q=<nombre apellido>", "liviano", lambda i, ctx: (
+        "GET", f"/api/contracts/search?q={NOMBRES[i % len(NOMBRES)]}+{APELLIDOS[i // len(NOMBRES) % len(APELLIDOS)]}"
+               f"&offset=20&_b={i}", None, None,
+    )),
+    ("GET /api/contracts/search?q=<prefijo>", "liviano",
+     lambda i, ctx: ("GET", f"/api/contracts/search?q={APELLIDOS[i % len(APELLIDOS)][:3]}&_b={i}", None, None)),
+    ("GET /api/contracts/stats", "liviano",
+     lambda i, ctx: ("GET", f"/api/contracts/stats?meses=24&_b={i}", None, None)),
+    ("GET /api/contracts/stats (cacheado)", "liviano",
+     lambda i, ctx: ("GET", "/api/contracts/stats", None, None)),
+    ("GET /api/partes/buscar?nombre=<apellido, nombre>", "liviano", lambda i, ctx: (
+        "GET", f"/api/partes/buscar?nombre={APELLIDOS[i % len(APELLIDOS)]},+{NOMBRES[i // len(APELLIDOS) % len(NOMBRES)]}",
+        None, None,
+    )),
+    ("GET /api/contracts/export?format=ndjson", "pesado",
+     lambda i, ctx: ("GET", "/api/contracts/export?format=ndjson", None, None)),
+    ("GET /api/contracts/export?format=csv", "pesado",
+     lambda i, ctx: ("GET", "/api/contracts/export?format=csv", None, None)),
+    ("POST /api/contracts/manual", "liviano", lambda i, ctx: ("POST", "/api/contracts/manual", {
+        "inquilino": f"Bench {i}", "propietario": "Bench Prop",
+        "fecha_fin": (date.today() + timedelta(days=200 + i % 300)).isoformat(),
+        "dias_aviso": 60, "email_inquilino": f"bench{i}@example.com",
+    }, None)),
+    ("PATCH /api/contracts/<id>/renewal", "liviano", lambda i, ctx: (
+        "PATCH", f"/api/contracts/{ctx['rnd'].choice(ctx['ids'])}/renewal",
+        {"decision": "RENUEVA" if i % 2 else "NO_RENUEVA"}, None,
+    )),
+    ("PATCH /api/contracts/renewal (50 ids)", "liviano", lambda i, ctx: (
+        "PATCH", "/api/contracts/renewal",
+        {"items": [
+            {"id": cid, "decision": "RENUEVA" if (i + j) % 2 else "NO_RENUEVA"}
+            for j, cid in enumerate(ctx["rnd"].sample(ctx["ids"], 50))
+        ]}, None,
+    )),
+    ("POST /api/contracts", "liviano",
+     lambda i, ctx: ("POST", "/api/contracts", {"texto_contrato": _texto_libre(f"{ctx['n']}-{i}")}, None)),
+    ("POST /api/contracts/bulk", "pesado", lambda i, ctx: ("POST", "/api/contracts/bulk", {
+        "contratos": [_texto_libre(f"bulk-{ctx['n']}-{i}-{k}") for k in range(10)],
+    }, None)),
+    ("POST /api/notifications/run-60d", "secuencial",
+     lambda i, ctx: ("POST", "/api/notifications/run-60d", None, None)),
+    ("POST /api/notifications/run-60d/jobs", "liviano",
+     lambda i, ctx: ("POST", "/api/notifications/run-60d/jobs", None, None)),
+    ("GET /api/jobs/<id>", "liviano", lambda i, ctx: ("GET", f"/api/jobs/{ctx['job_id']}", None, None)),
+]
+
+
+async def _medir(client, generador, ctx, n, concurrencia, ok=(200, 201, 202, 304)):
+    latencias, errores = [], 0
+    sem = asyncio.Semaphore(concurrencia)
+
+    async def uno(i):
+        nonlocal errores
+        metodo, url, cuerpo, headers = generador(i, ctx)
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(metodo, url, json=cuerpo, headers=headers)
+                await r.aread()
+                if r.status_code not in ok:
+                    errores += 1
+            except Exception:
+                errores += 1
+            latencias.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(uno(i) for i in range(n)))
+    return resumen(latencias, errores, time.perf_counter() - t0)
+
+
+def _reset_avisos(env):
+    subprocess.run(
+        [sys.executable, "-m", "bench.seed", "--reset-avisos"],
+        cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+
+
+async def _correr_escenarios(url, env, n, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {"X-Tenant": args.tenant}
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits, headers=headers) as client:
+        r = await client.get("/api/contracts")
+        r_job = await client.post("/api/notifications/run-60d/jobs")
+        r_ids = await client.get("/api/contracts/list?limit=500")
+        ctx = {
+            "n": n,
+            "rnd": random.Random(7),
+            "ids": [it["id"] for it in r_ids.json()["items"]],
+            "etag_contracts": r.headers.get("ETag", ""),
+            "cursor": _cursor((date.today() + timedelta(days=180)).isoformat(), 0),
+            "job_id": r_job.json().get("job_id"),
+            "admin_token": env["TENANTS_ADMIN_TOKEN"],
+        }
+
+        resultados = {}
+        for nombre, tipo, generador in ESCENARIOS:
+            if args.solo and not any(s in nombre for s in args.solo.split(",")):
+                continue
+
+            if tipo == "secuencial":
+                latencias, errores, total = [], 0, 0.0
+                for i in range(args.requests_pesados):
+                    await asyncio.to_thread(_reset_avisos, env)
+                    res = await _medir(client, generador, ctx, 1, 1)
+                    latencias.append(res["p50_ms"] / 1000)
+                    errores += res["errores"]
+                    total += res["segundos"]
+                res = resumen(latencias, errores, total)
+            else:
+                pesado = tipo == "pesado"
+                cantidad = args.requests_pesados if pesado else args.requests
+                concurrencia = min(args.concurrency, 4) if pesado else args.concurrency
+                # una vuelta previa sin medir (conexiones, caches del proceso)
+                await _medir(client, generador, ctx, 1, 1)
+                res = await _medir(client, generador, ctx, cantidad, concurrencia)
+                res["concurrencia"] = concurrencia
+
+            resultados[nombre] = res
+            print(f"  {nombre:45s} rps={res['rps']!s:>8}  p50={res['p50_ms']!s:>9} ms  "
+                  f"p99={res['p99_ms']!s:>9} ms  err={res['errores']}")
+        return resultados
+
+
+def _server(args, env, puerto):
+    if args.modo == "wsgi":
+        cmd = [
+            sys.executable, "-m", "gunicorn", "app:app",
+            "-b", f"127.0.0.1:{puerto}", "-w", str(args.workers),
+            "--threads", str(args.threads), "--timeout", "600",
+        ]
+    else:
+        cmd = [
+            sys.executable, "-m", "uvicorn", "asgi:app",
+            "--host", "127.0.0.1", "--port", str(puerto),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ]
+    return cmd, subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _correr_tamano(n, args, env_base, puerto):
+    env = dict(env_base)
+    if args.pg_url:
+        env.update(DB_ENGINE="postgres", DATABASE_URL=args.pg_url)
+    else:
+        tmp = tempfile.mkdtemp(prefix=f"bench_suite_{n}_")
+        env.update(DB_ENGINE="sqlite", DB_PATH=os.path.join(tmp, "bench.db"))
+
+    subprocess.run([sys.executable, "db_init.py"], cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL)
+    t0 = time.perf_counter()
+    seed = [sys.executable, "-m", "bench.seed", "--n", str(n), "--semilla", str(args.semilla)]
+    if args.pg_url:
+        seed.append("--vaciar")
+    subprocess.run(seed, cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL)
+    seed_seg = time.perf_counter() - t0
+
+    cmd, proc = _server(args, env, puerto)
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        esperar(url)
+        rutas = asyncio.run(_correr_escenarios(url, env, n, args))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    return {"engine": env["DB_ENGINE"], "seed_segundos": round(seed_seg, 2), "server": " ".join(cmd[2:]), "rutas": rutas}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", default="10000,100000", help="contratos a sembrar, separados por coma (ej. 10000,100000,1000000)")
+    p.add_argument("--requests", type=int, default=200, help="requests por ruta liviana")
+    p.add_argument("--requests-pesados", type=int, default=10, help="requests por ruta pesada (listado completo, export, bulk, run-60d)")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--groq-ms", type=float, default=300)
+    p.add_argument("--resend-ms", type=float, default=50)
+    p.add_argument("--groq-rpm", type=float, default=100000, help="límite de ingesta.py para el bulk (el default real, 30, lo domina)")
+    p.add_argument("--modo", choices=("wsgi", "asgi"), default="wsgi")
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--pg-url", default=None, help="usar este Postgres en vez de SQLite (se vacía y se resiembra)")
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--tenant", default="inmobiliaria-sur", help="X-Tenant de los requests (bench.seed reparte en 5)")
+    p.add_argument("--solo", default=None, help="sólo las rutas que contengan alguno de estos textos (coma)")
+    p.add_argument("--out", default="bench_suite.json")
+    args = p.parse_args()
+
+    fakes, fake_url = iniciar_fakes(groq_ms=args.groq_ms, resend_ms=args.resend_ms)
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND,
+        "GROQ_API_KEY": "fake",
+        "GROQ_BASE_URL": fake_url,
+        "RESEND_API_KEY": "fake",
+        "RESEND_API_URL": fake_url,
+        "TENANTS_ADMIN_TOKEN": "bench",
+        "GROQ_RPM": str(args.groq_rpm),
+    }
+
+    resultados = {}
+    for k, n in enumerate(int(x) for x in args.sizes.split(",") if x.strip()):
+        print(f"▶ {n} contratos ({'postgres' if args.pg_url else 'sqlite'}, {args.modo})")
+        resultados[str(n)] = _correr_tamano(n, args, env, 8800 + k)
+
+    fakes.shutdown()
+
+    out = {
+        "benchmark": "suite",
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k != "pg_url"},
+        "resultados": resultados,
+    }
+    with open(args.out, "w") as f:
+        json.dump(out, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
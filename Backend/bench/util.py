@@ -0,0 +1,48 @@
+import os
+import time
+import subprocess
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    v = sorted(valores)
+    k = min(len(v) - 1, max(0, int(round(p / 100.0 * (len(v) - 1)))))
+    return v[k]
+
+
+def resumen(latencias, errores, segundos):
+    """Latencias en segundos -> dict con rps, p50/p99 en ms."""
+    n = len(latencias)
+    return {
+        "requests": n,
+        "errores": errores,
+        "segundos": round(segundos, 3),
+        "rps": round(n / segundos, 2) if segundos else None,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2) if n else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2) if n else None,
+    }
+
+
+def esperar(url, timeout=30):
+    fin = time.time() + timeout
+    while time.time() < fin:
+        try:
+            if httpx.get(url + "/api/ping", timeout=1).status_code == 200:
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"El server no levantó: {url}")
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
@@ -0,0 +1,70 @@
+import re
+import unicodedata
+
+from db import DB_ENGINE
+
+# =========================================================
+# Búsqueda de texto completo en contratos (partes + texto original)
+#
+# Un índice nativo por motor (ver migraciones.m0005_busqueda):
+# - SQLite: tabla FTS5 contratos_fts (unicode61 remove_diacritics), ranking bm25
+# - Postgres: columna generada busqueda (tsvector, config es_unaccent) + GIN, ts_rank_cd
+# - MySQL: índice FULLTEXT, MATCH ... AGAINST en modo booleano
+#   (la collation utf8mb4_unicode_ci ya ignora tildes)
+#
+# Cada término se busca como prefijo ("gonz" encuentra "González") y tienen
+# que estar todos. Pesos: partes > inmobiliaria > texto del contrato.
+# =========================================================
+BUSQUEDA_MAX_TERMINOS = 8
+
+COLUMNAS = """
+    c.id, c.inmobiliaria, c.inquilino, c.propietario,
+    c.fecha_inicio, c.fecha_fin, c.decision_renovacion
+"""
+
+
+def terminos(q):
+    """'José  Pérez-García' -> ['jose', 'perez', 'garcia'] (sin tildes ni operadores)."""
+    s = unicodedata.normalize("NFKD", q or "").encode("ascii", "ignore").decode().lower()
+    return re.findall(r"[a-z0-9]+", s)[:BUSQUEDA_MAX_TERMINOS]
+
+
+def sql_busqueda(terms, tenant_id, limit, offset):
+    """
+    SELECT de una página de resultados del tenant, de mayor a menor relevancia.
+    terms: salida de terminos() (no vacía). Devuelve (sql con %s, params).
+    """
+    if DB_ENGINE == "mysql":
+        consulta = " ".join(f"+{t}*" for t in terms)
+        match = "MATCH (c.inquilino, c.propietario, c.inmobiliaria, c.texto_contrato) AGAINST (%s IN BOOLEAN MODE)"
+        sql = f"""
+            SELECT {COLUMNAS}, {match} AS relevancia
+            FROM contratos c
+            WHERE c.tenant_id = %s AND {match}
+            ORDER BY relevancia DESC, c.id DESC
+            LIMIT %s OFFSET %s
+        """
+        return sql, (consulta, tenant_id, consulta, limit, offset)
+
+    if DB_ENGINE in ("postgres", "postgresql"):
+        consulta = " & ".join(f"{t}:*" for t in terms)
+        sql = f"""
+            SELECT {COLUMNAS}, ts_rank_cd(c.busqueda, q) AS relevancia
+            FROM contratos c, to_tsquery('es_unaccent', %s) q
+            WHERE c.tenant_id = %s AND c.busqueda @@ q
+            ORDER BY relevancia DESC, c.id DESC
+            LIMIT %s OFFSET %s
+        """
+        return sql, (consulta, tenant_id, limit, offset)
+
+    # bm25: menor es mejor, se invierte para que relevancia crezca igual que en los otros motores
+    consulta = " ".join(f'"{t}"*' for t in terms)
+    sql = f"""
+        SELECT {COLUMNAS}, -bm25(contratos_fts, 10.0, 10.0, 4.0, 1.0) AS relevancia
+        FROM contratos_fts
+        JOIN contratos c ON c.id = contratos_fts.rowid
+        WHERE contratos_fts MATCH %s AND c.tenant_id = %s
+        ORDER BY relevancia DESC, c.id DESC
+        LIMIT %s OFFSET %s
+    """
+    return sql, (consulta, tenant_id, limit, offset)
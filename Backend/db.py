@@ -1,12 +1,30 @@
 import os
-import sqlite3
-from dotenv import load_dotenv
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 
-load_dotenv()
+import registro
+import db_sqlite
+from metricas import db_duracion, op_sql
+
+registro.cargar_entorno()
 
 DB_ENGINE = os.getenv("DB_ENGINE", "sqlite").lower()
 DB_PATH = os.getenv("DB_PATH", "contratos.db")
 
+# Pool de conexiones (uno por proceso)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))              # máximo de conexiones abiertas
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))      # seg. esperando una conexión libre
+DB_POOL_IDLE = float(os.getenv("DB_POOL_IDLE", "300"))           # seg. ociosa antes de cerrarla
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "5"))  # seg. ociosa antes de chequearla
+
+
+def _dict_factory(cursor, row):
+    # filas como dict, igual que DictCursor (MySQL) / RealDictCursor (Postgres)
+    return {col[0]: row[i] for i, col in enumerate(cursor.description)}
+
+
 def get_connection():
     if DB_ENGINE in ("postgres", "postgresql"):
         import psycopg2
@@ -18,6 +36,7 @@ def get_connection():
 
     if DB_ENGINE == "mysql":
         import pymysql
+        from pymysql.constants import CLIENT
         return pymysql.connect(
             host=os.getenv("DB_HOST", "localhost"),
             port=int(os.getenv("DB_PORT", "3306")),
@@ -26,12 +45,383 @@ def get_connection():
             database=os.getenv("DB_NAME", "alquileres_ai"),
             cursorclass=pymysql.cursors.DictCursor,
             autocommit=True,
+            # rowcount = filas que matchearon el WHERE (como Postgres/SQLite), no sólo las que cambiaron
+            client_flag=CLIENT.FOUND_ROWS,
         )
 
-    # sqlite por default
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    # sqlite por default (perfil en db_sqlite.py)
+    # check_same_thread=False: la conexión vuelve al pool y la puede tomar otro thread
+    # (nunca dos a la vez).
+    conn = db_sqlite.conectar(DB_PATH, check_same_thread=False)
+    conn.row_factory = _dict_factory
     return conn
 
+
+# =========================================================
+# Pool de conexiones
+# =========================================================
+class PoolTimeout(RuntimeError):
+    pass
+
+
+def _conexion_viva(conn):
+    """
+    Health check barato antes de entregar una conexión que estuvo ociosa.
+    """
+    try:
+        if DB_ENGINE == "mysql":
+            conn.ping(reconnect=False)
+            return True
+
+        if DB_ENGINE in ("postgres", "postgresql") and conn.closed:
+            return False
+
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        if DB_ENGINE in ("postgres", "postgresql"):
+            conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _cerrar(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Pool acotado, thread-safe, con:
+    - health check al hacer checkout (si la conexión estuvo ociosa > ping_after)
+    - desalojo de conexiones ociosas (> idle_timeout)
+    - reuso LIFO (las más recientes primero, así las viejas expiran solas)
+    """
+
+    def __init__(self, factory, max_size=10, timeout=10.0, idle_timeout=300.0, ping_after=5.0):
+        self._factory = factory
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, ultimo_uso)
+        self._en_uso = 0
+        self._abriendo = 0
+
+        self._stats = {
+            "creadas": 0,
+            "cerradas": 0,
+            "checkouts": 0,
+            "esperas": 0,
+            "timeouts": 0,
+            "descartadas_ping": 0,
+            "desalojadas_idle": 0,
+        }
+
+    def _total(self):
+        return len(self._idle) + self._en_uso + self._abriendo
+
+    def _desalojar_ociosas(self, ahora):
+        """Saca (con el lock tomado) las conexiones ociosas vencidas. Devuelve la lista a cerrar."""
+        vencidas = []
+        while self._idle and ahora - self._idle[0][1] > self.idle_timeout:
+            vencidas.append(self._idle.popleft()[0])
+        self._stats["desalojadas_idle"] += len(vencidas)
+        self._stats["cerradas"] += len(vencidas)
+        return vencidas
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        conn = None
+        ultimo_uso = None
+        a_cerrar = []
+
+        with self._cond:
+            esperando = False
+            while True:
+                a_cerrar.extend(self._desalojar_ociosas(time.monotonic()))
+
+                if self._idle:
+                    conn, ultimo_uso = self._idle.pop()
+                    self._en_uso += 1
+                    break
+
+                if self._total() < self.max_size:
+                    self._abriendo += 1
+                    break
+
+                restante = deadline - time.monotonic()
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No hay conexiones libres en el pool (max={self.max_size}, timeout={self.timeout}s)"
+                    )
+                if not esperando:
+                    self._stats["esperas"] += 1
+                    esperando = True
+                self._cond.wait(restante)
+
+            self._stats["checkouts"] += 1
+
+        for c in a_cerrar:
+            _cerrar(c)
+
+        if conn is not None:
+            if time.monotonic() - ultimo_uso <= self.ping_after or _conexion_viva(conn):
+                return conn
+
+            # estaba rota: la reemplazamos por una nueva
+            _cerrar(conn)
+            with self._cond:
+                self._en_uso -= 1
+                self._abriendo += 1
+                self._stats["descartadas_ping"] += 1
+                self._stats["cerradas"] += 1
+
+        try:
+            conn = self._factory()
+        except Exception:
+            with self._cond:
+                self._abriendo -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._abriendo -= 1
+            self._en_uso += 1
+            self._stats["creadas"] += 1
+        return conn
+
+    def release(self, conn, descartar=False):
+        if not descartar:
+            # deja la conexión limpia para el próximo (sin transacción abierta)
+            try:
+                if DB_ENGINE in ("postgres", "postgresql") and conn.closed:
+                    descartar = True
+                else:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+
+        with self._cond:
+            self._en_uso -= 1
+            if descartar:
+                self._stats["cerradas"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if descartar:
+            _cerrar(conn)
+
+    def close_all(self):
+        with self._cond:
+            ociosas = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._stats["cerradas"] += len(ociosas)
+        for c in ociosas:
+            _cerrar(c)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "engine": DB_ENGINE,
+                "max_size": self.max_size,
+                "en_uso": self._en_uso,
+                "ociosas": len(self._idle),
+                "abriendo": self._abriendo,
+                "total": self._total(),
+                **self._stats,
+            }
+
+
+class CursorMedido:
+    """Cursor que mide cada execute/executemany (metricas.db_duracion)."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def execute(self, sql, params=None):
+        with db_duracion.medir(op=op_sql(sql)):
+            if params is None:
+                return self._raw.execute(sql)
+            return self._raw.execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        with db_duracion.medir(op=op_sql(sql)):
+            return self._raw.executemany(sql, seq_params)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class PooledConnection:
+    """
+    Envuelve una conexión del pool: se usa igual que la conexión real,
+    pero close() la devuelve al pool en vez de cerrarla.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise RuntimeError("Conexión ya devuelta al pool")
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return CursorMedido(self.__getattr__("cursor")(*args, **kwargs))
+
+    def close(self, descartar=False):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw, descartar=descartar)
+
+
+def _crear_pool():
+    if DB_ENGINE not in ("mysql", "postgres", "postgresql"):
+        db_sqlite.iniciar_mantenimiento(DB_PATH)
+    return ConnectionPool(
+        get_connection,
+        max_size=DB_POOL_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        idle_timeout=DB_POOL_IDLE,
+        ping_after=DB_POOL_PING_AFTER,
+    )
+
+
+def get_pool():
+    """Pool por proceso, en el registro (si el proceso se forkea, el hijo arma el suyo)."""
+    return registro.obtener("db")
+
+
+def pool_stats():
+    stats = get_pool().stats()
+    if DB_ENGINE not in ("mysql", "postgres", "postgresql"):
+        stats["sqlite"] = db_sqlite.estado(DB_PATH)
+    return stats
+
+
 def get_db_connection():
-    return get_connection()
\ No newline at end of file
+    """
+    Conexión del pool. Hay que llamar close() para devolverla
+    (o mejor: usar `with db_connection() as conn:`).
+    """
+    pool = get_pool()
+    return PooledConnection(pool, pool.acquire())
+
+
+@contextmanager
+def db_connection():
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ...
+        conn.commit()
+
+    Al salir devuelve la conexión al pool; si hubo excepción, lo no commiteado se descarta.
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def empezar_transaccion(conn):
+    """
+    Para escrituras de varias sentencias que tienen que quedar juntas:
+    MySQL corre con autocommit (cada sentencia se confirma sola) y necesita
+    un BEGIN explícito. Postgres y SQLite ya abren la transacción solos
+    con la primera escritura; hasta conn.commit() todo se puede deshacer.
+    """
+    if DB_ENGINE == "mysql":
+        conn.begin()
+
+
+# =========================================================
+# SQL helpers (MySQL / Postgres / SQLite)
+# =========================================================
+def ejecutar(cur, sql_mysql, sql_pg, sql_sqlite, params=()):
+    if DB_ENGINE == "mysql":
+        cur.execute(sql_mysql, params)
+    elif DB_ENGINE in ("postgres", "postgresql"):
+        cur.execute(sql_pg, params)
+    else:
+        cur.execute(sql_sqlite, params)
+
+
+def ejecutar_many(cur, sql_mysql, sql_pg, sql_sqlite, seq_params):
+    if DB_ENGINE == "mysql":
+        cur.executemany(sql_mysql, seq_params)
+    elif DB_ENGINE in ("postgres", "postgresql"):
+        cur.executemany(sql_pg, seq_params)
+    else:
+        cur.executemany(sql_sqlite, seq_params)
+
+
+def adaptar_sql(sql):
+    """
+    Para SQL armado dinámicamente: se escribe con %s y en SQLite se pasa a ?.
+    """
+    if DB_ENGINE in ("mysql", "postgres", "postgresql"):
+        return sql
+    return sql.replace("%s", "?")
+
+
+def sql_dias_hasta(columna):
+    """
+    Expresión SQL con los días que faltan desde una fecha (un %s) hasta `columna`.
+    NULL si la columna es NULL. Negativo si ya pasó.
+    """
+    if DB_ENGINE == "mysql":
+        return f"DATEDIFF({columna}, %s)"
+    if DB_ENGINE in ("postgres", "postgresql"):
+        return f"({columna} - CAST(%s AS DATE))"
+    return f"CAST(julianday({columna}) - julianday(%s) AS INTEGER)"
+
+
+def insert_and_get_id(cur, sql_mysql, sql_pg, sql_sqlite, params=()):
+    """
+    Inserta y devuelve id.
+    - Postgres: usa RETURNING id
+    - MySQL/SQLite: usa lastrowid
+    """
+    ejecutar(cur, sql_mysql, sql_pg, sql_sqlite, params)
+
+    if DB_ENGINE in ("postgres", "postgresql"):
+        row = cur.fetchone()
+        # RealDictCursor -> {"id": ...}
+        return row["id"] if isinstance(row, dict) else row[0]
+
+    return getattr(cur, "lastrowid", None)
+
+
+def cursor_streaming(conn, nombre="stream"):
+    """
+    Cursor del lado del servidor, para recorrer muchas filas con memoria constante
+    (usar fetchmany en loop):
+    - Postgres: named cursor (las filas quedan en el server hasta cada fetch)
+    - MySQL: SSDictCursor (unbuffered)
+    - SQLite: cursor común (ya itera sin materializar todo)
+    """
+    if DB_ENGINE in ("postgres", "postgresql"):
+        import psycopg2.extras
+        return conn.cursor(name=nombre, cursor_factory=psycopg2.extras.RealDictCursor)
+
+    if DB_ENGINE == "mysql":
+        import pymysql
+        return conn.cursor(pymysql.cursors.SSDictCursor)
+
+    return conn.cursor()
@@ -0,0 +1,249 @@
+import os
+import re
+from datetime import date, datetime
+from contextlib import asynccontextmanager
+
+import db_sqlite
+from db import DB_ENGINE, DB_PATH, DB_POOL_SIZE
+from metricas import db_duracion, op_sql
+
+# Capa de DB async para el modo ASGI (asgi.py):
+# - Postgres: asyncpg (pool)
+# - MySQL: aiomysql (pool)
+# - SQLite: aiosqlite (una conexión por uso; abrir un archivo local es barato)
+#
+# El SQL se escribe igual que en adaptar_sql: con %s. Acá se traduce a $1..$n
+# (asyncpg) o ? (SQLite).
+#
+# SQLite (perfil produccion): aiosqlite abre la conexión con la factory de
+# db_sqlite (kwargs_conexion), así que sus escrituras pasan por el mismo lock
+# de escritor del proceso que las de Flask montado en asgi.py, con BEGIN
+# IMMEDIATE: la primera escritura lo toma (en el thread de aiosqlite, no en
+# el event loop) y commit/rollback/close lo sueltan. transaccion() lo toma
+# de entrada. Lo que queda afuera:
+# - el lock es por proceso: varios workers de uvicorn (o worker.py) se
+#   esperan entre sí con busy_timeout, igual que en el modo WSGI
+# - una ruta async con una escritura abierta no puede esperar una escritura
+#   sync del pool (asyncio.to_thread): la del thread esperaría el lock que
+#   tiene la ruta, hasta SQLITE_BUSY_MS. Commitear antes.
+
+_pool = None
+
+
+def _es_pg():
+    return DB_ENGINE in ("postgres", "postgresql")
+
+
+def _sql_pg(sql):
+    n = 0
+
+    def _sig(_):
+        nonlocal n
+        n += 1
+        return f"${n}"
+
+    return re.sub(r"%s", _sig, sql)
+
+
+def _params_sqlite(params):
+    out = []
+    for p in params:
+        if isinstance(p, datetime):
+            out.append(p.isoformat(" "))
+        elif isinstance(p, date):
+            out.append(p.isoformat())
+        else:
+            out.append(p)
+    return tuple(out)
+
+
+async def init_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    if _es_pg():
+        import asyncpg
+        database_url = os.getenv("DATABASE_URL")
+        if not database_url:
+            raise RuntimeError("Falta DATABASE_URL para Postgres")
+        _pool = await asyncpg.create_pool(dsn=database_url, min_size=1, max_size=DB_POOL_SIZE)
+
+    elif DB_ENGINE == "mysql":
+        import aiomysql
+        from pymysql.constants import CLIENT
+        _pool = await aiomysql.create_pool(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "3306")),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD", ""),
+            db=os.getenv("DB_NAME", "alquileres_ai"),
+            cursorclass=aiomysql.DictCursor,
+            autocommit=True,
+            client_flag=CLIENT.FOUND_ROWS,  # rowcount = filas que matchearon (ver db.get_connection)
+            minsize=1,
+            maxsize=DB_POOL_SIZE,
+        )
+
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is None:
+        return
+    if _es_pg():
+        await _pool.close()
+    else:
+        _pool.close()
+        await _pool.wait_closed()
+    _pool = None
+
+
+class ConexionAsync:
+    """
+    Misma idea que ejecutar/insert_and_get_id, en async y con filas como dict.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._en_transaccion = False
+
+    @asynccontextmanager
+    async def transaccion(self):
+        """
+        async with db_async.conexion() as c, c.transaccion():
+            ...  # todo lo de adentro se confirma junto al salir, o nada si hay excepción
+
+        asyncpg y aiomysql (autocommit) confirman cada sentencia sola; acá se abre
+        una transacción explícita. Adentro, executemany y commit no confirman.
+        """
+        if self._en_transaccion:
+            yield self
+            return
+        self._en_transaccion = True
+        try:
+            if _es_pg():
+                async with self._raw.transaction():
+                    yield self
+                return
+
+            if DB_ENGINE == "mysql":
+                await self._raw.begin()
+            elif db_sqlite.produccion():
+                # toma el lock de escritor ya (db_sqlite.Conexion), no en la primera escritura
+                await self._raw.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+            except BaseException:
+                await self._raw.rollback()
+                raise
+            await self._raw.commit()
+        finally:
+            self._en_transaccion = False
+
+    async def fetchall(self, sql, params=()):
+        with db_duracion.medir(op=op_sql(sql)):
+            if _es_pg():
+                rows = await self._raw.fetch(_sql_pg(sql), *params)
+                return [dict(r) for r in rows]
+
+            if DB_ENGINE == "mysql":
+                async with self._raw.cursor() as cur:
+                    await cur.execute(sql, params)
+                    return list(await cur.fetchall())
+
+            async with self._raw.execute(sql.replace("%s", "?"), _params_sqlite(params)) as cur:
+                return list(await cur.fetchall())
+
+    async def fetchone(self, sql, params=()):
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def execute(self, sql, params=()):
+        """Devuelve las filas afectadas (como cur.rowcount)."""
+        with db_duracion.medir(op=op_sql(sql)):
+            if _es_pg():
+                estado = await self._raw.execute(_sql_pg(sql), *params)  # "UPDATE 3"
+                ultimo = estado.rsplit(" ", 1)[-1]
+                return int(ultimo) if ultimo.isdigit() else 0
+
+            if DB_ENGINE == "mysql":
+                async with self._raw.cursor() as cur:
+                    await cur.execute(sql, params)
+                    return cur.rowcount
+
+            async with self._raw.execute(sql.replace("%s", "?"), _params_sqlite(params)) as cur:
+                return cur.rowcount
+
+    async def executemany(self, sql, seq_params):
+        """En una transacción (todo o nada): la propia, o la de transaccion() si hay una abierta."""
+        with db_duracion.medir(op=op_sql(sql)):
+            if self._en_transaccion:
+                if _es_pg():
+                    await self._raw.executemany(_sql_pg(sql), seq_params)
+                elif DB_ENGINE == "mysql":
+                    async with self._raw.cursor() as cur:
+                        await cur.executemany(sql, seq_params)
+                else:
+                    await self._raw.executemany(sql.replace("%s", "?"), [_params_sqlite(p) for p in seq_params])
+            elif _es_pg():
+                async with self._raw.transaction():
+                    await self._raw.executemany(_sql_pg(sql), seq_params)
+            elif DB_ENGINE == "mysql":
+                await self._raw.begin()
+                try:
+                    async with self._raw.cursor() as cur:
+                        await cur.executemany(sql, seq_params)
+                    await self._raw.commit()
+                except Exception:
+                    await self._raw.rollback()
+                    raise
+            else:
+                await self._raw.executemany(sql.replace("%s", "?"), [_params_sqlite(p) for p in seq_params])
+                await self._raw.commit()
+
+    async def insert(self, sql, params=()):
+        """INSERT que devuelve el id nuevo (RETURNING en Postgres, lastrowid en el resto)."""
+        with db_duracion.medir(op=op_sql(sql)):
+            if _es_pg():
+                return await self._raw.fetchval(_sql_pg(sql) + " RETURNING id", *params)
+
+            if DB_ENGINE == "mysql":
+                async with self._raw.cursor() as cur:
+                    await cur.execute(sql, params)
+                    return cur.lastrowid
+
+            async with self._raw.execute(sql.replace("%s", "?"), _params_sqlite(params)) as cur:
+                return cur.lastrowid
+
+    async def commit(self):
+        # Postgres (fuera de transacción) y MySQL (autocommit) ya confirmaron;
+        # dentro de transaccion() confirma ella al salir
+        if not self._en_transaccion and not _es_pg() and DB_ENGINE != "mysql":
+            await self._raw.commit()
+
+
+@asynccontextmanager
+async def conexion():
+    """
+    async with db_async.conexion() as c:
+        rows = await c.fetchall("SELECT ... WHERE id = %s", (1,))
+    """
+    if _es_pg() or DB_ENGINE == "mysql":
+        pool = await init_pool()
+        async with pool.acquire() as raw:
+            yield ConexionAsync(raw)
+        return
+
+    import aiosqlite
+
+    def _dict_factory(cursor, row):
+        return {col[0]: row[i] for i, col in enumerate(cursor.description)}
+
+    async with aiosqlite.connect(DB_PATH, **db_sqlite.kwargs_conexion()) as raw:
+        raw.row_factory = _dict_factory
+        if db_sqlite.produccion():
+            for p in db_sqlite.pragmas():
+                await raw.execute(p)
+        yield ConexionAsync(raw)
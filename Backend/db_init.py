@@ -1,26 +1,206 @@
-from db import get_db_connection
+from db import get_db_connection, DB_ENGINE
+from migraciones import crear_indice, aplicar_migraciones
+
+
+# =========================================================
+# DDL por motor (MySQL / Postgres / SQLite)
+# =========================================================
+SQL_CONTRATOS_MYSQL = """
+    CREATE TABLE IF NOT EXISTS contratos (
+        id INT NOT NULL AUTO_INCREMENT,
+        inmobiliaria VARCHAR(255) NULL,
+        inquilino VARCHAR(255) NULL,
+        propietario VARCHAR(255) NULL,
+        fecha_inicio DATE NULL,
+        fecha_fin DATE NULL,
+        dias_aviso INT NOT NULL DEFAULT 60,
+        estado VARCHAR(30) NOT NULL DEFAULT 'ACTIVO',
+        decision_renovacion VARCHAR(30) NOT NULL DEFAULT 'PENDIENTE',
+        email_inquilino VARCHAR(255) NULL,
+        email_propietario VARCHAR(255) NULL,
+        notificado_60d TINYINT(1) NOT NULL DEFAULT 0,
+        notificado_60d_at DATETIME NULL,
+        creado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+SQL_CONTRATOS_PG = """
+    CREATE TABLE IF NOT EXISTS contratos (
+        id SERIAL PRIMARY KEY,
+        inmobiliaria VARCHAR(255) NULL,
+        inquilino VARCHAR(255) NULL,
+        propietario VARCHAR(255) NULL,
+        fecha_inicio DATE NULL,
+        fecha_fin DATE NULL,
+        dias_aviso INT NOT NULL DEFAULT 60,
+        estado VARCHAR(30) NOT NULL DEFAULT 'ACTIVO',
+        decision_renovacion VARCHAR(30) NOT NULL DEFAULT 'PENDIENTE',
+        email_inquilino VARCHAR(255) NULL,
+        email_propietario VARCHAR(255) NULL,
+        notificado_60d BOOLEAN NOT NULL DEFAULT FALSE,
+        notificado_60d_at TIMESTAMP NULL,
+        creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SQL_CONTRATOS_SQLITE = """
+    CREATE TABLE IF NOT EXISTS contratos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        inmobiliaria TEXT NULL,
+        inquilino TEXT NULL,
+        propietario TEXT NULL,
+        fecha_inicio TEXT NULL,
+        fecha_fin TEXT NULL,
+        dias_aviso INTEGER NOT NULL DEFAULT 60,
+        estado TEXT NOT NULL DEFAULT 'ACTIVO',
+        decision_renovacion TEXT NOT NULL DEFAULT 'PENDIENTE',
+        email_inquilino TEXT NULL,
+        email_propietario TEXT NULL,
+        notificado_60d INTEGER NOT NULL DEFAULT 0,
+        notificado_60d_at TEXT NULL,
+        creado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SQL_JOBS_MYSQL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INT NOT NULL AUTO_INCREMENT,
+        tipo VARCHAR(60) NOT NULL,
+        payload LONGTEXT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+        intentos INT NOT NULL DEFAULT 0,
+        max_intentos INT NOT NULL DEFAULT 3,
+        disponible_en DATETIME NOT NULL,
+        bloqueado_por VARCHAR(120) NULL,
+        bloqueado_en DATETIME NULL,
+        total INT NOT NULL DEFAULT 0,
+        procesados INT NOT NULL DEFAULT 0,
+        exitosos INT NOT NULL DEFAULT 0,
+        fallidos INT NOT NULL DEFAULT 0,
+        resultado MEDIUMTEXT NULL,
+        error TEXT NULL,
+        creado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+SQL_JOBS_PG = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id SERIAL PRIMARY KEY,
+        tipo VARCHAR(60) NOT NULL,
+        payload TEXT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+        intentos INT NOT NULL DEFAULT 0,
+        max_intentos INT NOT NULL DEFAULT 3,
+        disponible_en TIMESTAMP NOT NULL,
+        bloqueado_por VARCHAR(120) NULL,
+        bloqueado_en TIMESTAMP NULL,
+        total INT NOT NULL DEFAULT 0,
+        procesados INT NOT NULL DEFAULT 0,
+        exitosos INT NOT NULL DEFAULT 0,
+        fallidos INT NOT NULL DEFAULT 0,
+        resultado TEXT NULL,
+        error TEXT NULL,
+        creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SQL_JOBS_SQLITE = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        payload TEXT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        intentos INTEGER NOT NULL DEFAULT 0,
+        max_intentos INTEGER NOT NULL DEFAULT 3,
+        disponible_en TEXT NOT NULL,
+        bloqueado_por TEXT NULL,
+        bloqueado_en TEXT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        procesados INTEGER NOT NULL DEFAULT 0,
+        exitosos INTEGER NOT NULL DEFAULT 0,
+        fallidos INTEGER NOT NULL DEFAULT 0,
+        resultado TEXT NULL,
+        error TEXT NULL,
+        creado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SQL_IA_CACHE_MYSQL = """
+    CREATE TABLE IF NOT EXISTS ia_cache (
+        clave CHAR(64) NOT NULL,
+        modelo VARCHAR(120) NOT NULL,
+        prompt_version VARCHAR(20) NOT NULL,
+        resultado MEDIUMTEXT NOT NULL,
+        hits INT NOT NULL DEFAULT 0,
+        creado_en DATETIME NOT NULL,
+        usado_en DATETIME NOT NULL,
+        PRIMARY KEY (clave)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+SQL_IA_CACHE_PG = """
+    CREATE TABLE IF NOT EXISTS ia_cache (
+        clave CHAR(64) PRIMARY KEY,
+        modelo VARCHAR(120) NOT NULL,
+        prompt_version VARCHAR(20) NOT NULL,
+        resultado TEXT NOT NULL,
+        hits INT NOT NULL DEFAULT 0,
+        creado_en TIMESTAMP NOT NULL,
+        usado_en TIMESTAMP NOT NULL
+    );
+"""
+
+SQL_IA_CACHE_SQLITE = """
+    CREATE TABLE IF NOT EXISTS ia_cache (
+        clave TEXT PRIMARY KEY,
+        modelo TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        resultado TEXT NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        creado_en TEXT NOT NULL,
+        usado_en TEXT NOT NULL
+    );
+"""
+
+# (nombre, tabla, columnas)
+INDICES = [
+    # (los de contratos empiezan por tenant_id: ver migraciones.m0004_tenants)
+    # claim de jobs: WHERE estado = 'pendiente' AND disponible_en <= ahora ORDER BY disponible_en
+    ("idx_jobs_estado_disponible", "jobs", "estado, disponible_en"),
+    # poda LRU / TTL del cache de extracciones IA
+    ("idx_ia_cache_usado_en", "ia_cache", "usado_en"),
+]
+
 
 def init_db():
     conn = get_db_connection()
     cur = conn.cursor()
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS contratos (
-            id INT NOT NULL AUTO_INCREMENT,
-            inmobiliaria VARCHAR(255) NULL,
-            inquilino VARCHAR(255) NULL,
-            propietario VARCHAR(255) NULL,
-            fecha_inicio DATE NULL,
-            fecha_fin DATE NULL,
-            dias_aviso INT NOT NULL DEFAULT 60,
-            estado VARCHAR(30) NOT NULL DEFAULT 'ACTIVO',
-            decision_renovacion VARCHAR(30) NOT NULL DEFAULT 'PENDIENTE',
-            creado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            actualizado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
-                ON UPDATE CURRENT_TIMESTAMP,
-            PRIMARY KEY (id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-    """)
+    if DB_ENGINE == "mysql":
+        cur.execute(SQL_CONTRATOS_MYSQL)
+        cur.execute(SQL_JOBS_MYSQL)
+        cur.execute(SQL_IA_CACHE_MYSQL)
+    elif DB_ENGINE in ("postgres", "postgresql"):
+        cur.execute(SQL_CONTRATOS_PG)
+        cur.execute(SQL_JOBS_PG)
+        cur.execute(SQL_IA_CACHE_PG)
+    else:
+        cur.execute(SQL_CONTRATOS_SQLITE)
+        cur.execute(SQL_JOBS_SQLITE)
+        cur.execute(SQL_IA_CACHE_SQLITE)
+
+    for nombre, tabla, columnas in INDICES:
+        crear_indice(cur, nombre, tabla, columnas)
 
     # Si en tu conexión usás autocommit=True, esto no es necesario,
     # pero dejarlo no hace daño en la mayoría de casos.
@@ -30,8 +210,12 @@ def init_db():
         pass
 
     cur.close()
+
+    # cambios de esquema posteriores (columnas, índices, backfills)
+    aplicar_migraciones(conn)
+
     conn.close()
-    print("Base de datos MySQL inicializada correctamente.")
+    print(f"Base de datos ({DB_ENGINE}) inicializada correctamente.")
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
@@ -0,0 +1,270 @@
+import os
+import time
+import sqlite3
+import threading
+
+from metricas import sqlite_espera_escritor, sqlite_checkpoints
+
+# =========================================================
+# SQLite para un solo nodo (DB_ENGINE=sqlite)
+#
+# SQLITE_PERFIL=produccion (default):
+# - journal WAL: los lectores no bloquean al escritor ni al revés
+# - synchronous=NORMAL: en WAL no pierde consistencia; un corte de luz puede
+#   perder los últimos commits, no corromper la base
+# - mmap_size, cache_size y temp_store en memoria (ver SQLITE_*)
+# - busy_timeout: entre procesos (varios workers de gunicorn, worker.py) un
+#   escritor espera al otro en vez de fallar con "database is locked"
+# - un solo escritor por proceso: la primera escritura de una transacción
+#   toma _escritor y abre BEGIN IMMEDIATE; commit/rollback lo sueltan. Las
+#   transacciones de escritura hacen fila en el lock (sin el sleep/reintento
+#   del busy handler de SQLite) y nunca tienen que "subir" de lectura a
+#   escritura a mitad de camino. Las lecturas no pasan por el lock.
+#   Las conexiones aiosqlite del modo ASGI (db_async) usan la misma factory
+#   y el mismo lock.
+# - mantenimiento periódico en un thread: wal_checkpoint (TRUNCATE si el WAL
+#   creció más de SQLITE_WAL_MAX_MB) y PRAGMA optimize
+#
+# SQLITE_PERFIL=basico: sqlite3.connect sin más (journal DELETE, FULL),
+# como antes; queda para comparar (python -m bench.sqlite_perfil).
+# WAL necesita la base en un disco local (no NFS/SMB).
+# =========================================================
+SQLITE_PERFIL = os.getenv("SQLITE_PERFIL", "produccion").lower()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))           # 0 = sin mmap
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))          # page cache por conexión
+SQLITE_BUSY_MS = int(os.getenv("SQLITE_BUSY_MS", "5000"))          # espera de un escritor (lock y busy_timeout)
+SQLITE_MANTENIMIENTO_S = float(os.getenv("SQLITE_MANTENIMIENTO_S", "300"))  # 0 = sin thread de mantenimiento
+SQLITE_WAL_MAX_MB = float(os.getenv("SQLITE_WAL_MAX_MB", "64"))    # más que esto: checkpoint TRUNCATE
+
+_ESCRITURAS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER", "BEGIN")
+
+_escritor = threading.Lock()
+_mantenimiento = None
+_stats = {"transacciones_escritura": 0, "esperas_escritor": 0, "timeouts_escritor": 0}
+_ultimo_mantenimiento = {}
+
+
+def produccion():
+    return SQLITE_PERFIL == "produccion"
+
+
+def pragmas():
+    """PRAGMAs de cada conexión del perfil de producción (journal_mode queda en el archivo)."""
+    return [
+        "PRAGMA journal_mode = WAL",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_MS}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+
+
+def _es_escritura(sql):
+    palabra = sql.lstrip()[:8].split(None, 1)
+    return bool(palabra) and palabra[0].upper() in _ESCRITURAS
+
+
+def _tomar_escritor():
+    t0 = time.perf_counter()
+    if not _escritor.acquire(blocking=False):
+        _stats["esperas_escritor"] += 1
+        if not _escritor.acquire(timeout=SQLITE_BUSY_MS / 1000.0):
+            _stats["timeouts_escritor"] += 1
+            raise sqlite3.OperationalError("database is locked (otra transacción de escritura no terminó)")
+    _stats["transacciones_escritura"] += 1
+    sqlite_espera_escritor.observar(time.perf_counter() - t0)
+
+
+class _Cursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        self.connection._antes(sql)
+        return super().execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        self.connection._antes(sql)
+        return super().executemany(sql, seq_params)
+
+    def executescript(self, script):
+        conn = self.connection
+        conn._antes("BEGIN")
+        try:
+            return super().executescript(script)
+        finally:
+            if not conn.in_transaction:
+                conn._soltar()
+
+
+class Conexion(sqlite3.Connection):
+    """
+    sqlite3.Connection del perfil de producción: serializa las transacciones
+    de escritura del proceso (ver arriba). Se usa igual que la de siempre.
+    """
+
+    _escribiendo = False
+
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    # los atajos de la conexión ejecutan en C sin pasar por _Cursor.execute
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        return self.cursor().executemany(sql, seq_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def _antes(self, sql):
+        if self._escribiendo or not _es_escritura(sql):
+            return
+        _tomar_escritor()
+        self._escribiendo = True
+        if sql.lstrip()[:5].upper() == "BEGIN" or self.in_transaction:
+            return  # BEGIN IMMEDIATE explícito (jobs.reclamar, renovaciones) o ya había transacción
+        try:
+            super().execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._soltar()
+            raise
+
+    def _soltar(self):
+        if self._escribiendo:
+            self._escribiendo = False
+            _escritor.release()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            if not self.in_transaction:
+                self._soltar()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._soltar()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._soltar()
+
+
+def conectar(path, **kwargs):
+    """Conexión nueva según SQLITE_PERFIL (sin row_factory)."""
+    conn = sqlite3.connect(path, **kwargs_conexion(), **kwargs)
+    if produccion():
+        for p in pragmas():
+            conn.execute(p)
+    return conn
+
+
+def kwargs_conexion():
+    """Lo que va a sqlite3.connect (también vía aiosqlite.connect) para este perfil."""
+    if not produccion():
+        return {}
+    return {"timeout": SQLITE_BUSY_MS / 1000.0, "factory": Conexion}
+
+
+# =========================================================
+# Mantenimiento: checkpoint del WAL y PRAGMA optimize
+# =========================================================
+def _wal_mb(path):
+    try:
+        return os.path.getsize(path + "-wal") / (1024 * 1024)
+    except OSError:
+        return 0.0
+
+
+def mantener(path):
+    """
+    Una pasada de mantenimiento:
+    - wal_checkpoint(PASSIVE): copia al archivo lo que pueda sin esperar a nadie
+    - si el WAL pasó SQLITE_WAL_MAX_MB (lectores largos que no dejaron
+      reciclarlo), TRUNCATE con el lock de escritor tomado: espera a los
+      lectores (busy_timeout) y lo deja en cero
+    - PRAGMA optimize: ANALYZE sólo de lo que lo necesita (barato si no hay nada)
+    """
+    if not produccion():
+        return None
+
+    wal_antes = _wal_mb(path)
+    modo = "TRUNCATE" if wal_antes > SQLITE_WAL_MAX_MB else "PASSIVE"
+    t0 = time.perf_counter()
+    conn = conectar(path, check_same_thread=False)
+    try:
+        if modo == "TRUNCATE":
+            _tomar_escritor()
+            try:
+                ocupado, paginas, copiadas = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+            finally:
+                _escritor.release()
+        else:
+            ocupado, paginas, copiadas = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+    sqlite_checkpoints.inc(modo=modo, resultado="ocupado" if ocupado else "ok")
+    _ultimo_mantenimiento.update({
+        "en": time.time(),
+        "modo": modo,
+        "ocupado": bool(ocupado),
+        "paginas_wal": paginas,
+        "paginas_copiadas": copiadas,
+        "wal_mb_antes": round(wal_antes, 2),
+        "wal_mb_despues": round(_wal_mb(path), 2),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    })
+    return dict(_ultimo_mantenimiento)
+
+
+def _loop_mantenimiento(path):
+    while True:
+        time.sleep(SQLITE_MANTENIMIENTO_S)
+        try:
+            mantener(path)
+        except Exception as e:
+            _ultimo_mantenimiento.update({"en": time.time(), "error": repr(e)})
+
+
+def iniciar_mantenimiento(path):
+    """Arranca (una vez por proceso) el thread de mantenimiento. Lo llama db._crear_pool."""
+    global _mantenimiento
+    if not produccion() or SQLITE_MANTENIMIENTO_S <= 0:
+        return
+    if _mantenimiento is not None and _mantenimiento.is_alive():
+        return
+    _mantenimiento = threading.Thread(
+        target=_loop_mantenimiento, args=(path,), name="sqlite-mantenimiento", daemon=True,
+    )
+    _mantenimiento.start()
+
+
+def estado(path):
+    """Para GET /api/db/pool."""
+    if not produccion():
+        return {"perfil": SQLITE_PERFIL}
+    return {
+        "perfil": SQLITE_PERFIL,
+        "pragmas": pragmas(),
+        "wal_mb": round(_wal_mb(path), 2),
+        "escritor_ocupado": _escritor.locked(),
+        **_stats,
+        "mantenimiento_cada_s": SQLITE_MANTENIMIENTO_S,
+        "ultimo_mantenimiento": dict(_ultimo_mantenimiento) or None,
+    }
+
+
+def _despues_del_fork():
+    global _escritor, _mantenimiento
+    _escritor = threading.Lock()
+    _mantenimiento = None
+
+
+os.register_at_fork(after_in_child=_despues_del_fork)
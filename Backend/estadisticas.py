@@ -0,0 +1,228 @@
+import argparse
+from collections import Counter
+from datetime import date, datetime
+
+from db import DB_ENGINE, adaptar_sql, db_connection
+
+# =========================================================
+# Resumen de contratos para el dashboard (GET /api/contracts/stats)
+#
+# contratos_resumen guarda cuántos contratos hay por
+# (tenant_id, fecha_fin, decisión de renovación). Las escrituras de contratos
+# suman/restan su fila en la misma transacción (sumar), así las estadísticas
+# son GROUP BY sobre a lo sumo unos miles de filas por tenant, no sobre
+# todos los contratos.
+#
+# El bucket es el día de fecha_fin (no el mes) para que los estados
+# vencido / por_vencer / vigente salgan exactos para cualquier "hoy" y umbral.
+# Los contratos sin fecha_fin van al día FECHA_SIN_FIN (la clave primaria no
+# admite NULL en Postgres/MySQL).
+# =========================================================
+FECHA_SIN_FIN = date(1000, 1, 1)
+DECISION_DEFAULT = "PENDIENTE"
+
+SQL_SUMAR = {
+    "mysql": """
+        INSERT INTO contratos_resumen (tenant_id, fecha_fin, decision, cantidad)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)
+    """,
+    "pg": """
+        INSERT INTO contratos_resumen (tenant_id, fecha_fin, decision, cantidad)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (tenant_id, fecha_fin, decision)
+        DO UPDATE SET cantidad = contratos_resumen.cantidad + EXCLUDED.cantidad
+    """,
+    "sqlite": """
+        INSERT INTO contratos_resumen (tenant_id, fecha_fin, decision, cantidad)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (tenant_id, fecha_fin, decision)
+        DO UPDATE SET cantidad = cantidad + excluded.cantidad
+    """,
+}
+
+
+def _motor():
+    if DB_ENGINE == "mysql":
+        return "mysql"
+    if DB_ENGINE in ("postgres", "postgresql"):
+        return "pg"
+    return "sqlite"
+
+
+def bucket(fecha_fin):
+    """fecha_fin (date, 'YYYY-MM-DD' o None) como se guarda en el resumen: un date."""
+    if isinstance(fecha_fin, datetime):
+        return fecha_fin.date()
+    if isinstance(fecha_fin, date):
+        return fecha_fin
+    try:
+        return datetime.strptime(str(fecha_fin), "%Y-%m-%d").date()
+    except ValueError:
+        return FECHA_SIN_FIN
+
+
+def sql_sumar(tenant_id, cambios):
+    """
+    cambios: [(fecha_fin, decision, +n/-n)]. Se agrupan por bucket y se
+    ordenan (mismo orden de locks en escrituras concurrentes).
+    Devuelve (sql con %s, filas) para executemany; filas vacías si no hay nada que sumar.
+    """
+    totales = Counter()
+    for fecha_fin, decision, n in cambios:
+        totales[(bucket(fecha_fin), decision or DECISION_DEFAULT)] += n
+    filas = [(tenant_id, f, d, n) for (f, d), n in sorted(totales.items()) if n]
+    return SQL_SUMAR[_motor()], filas
+
+
+def sumar(cur, tenant_id, cambios):
+    """Aplica los cambios con el cursor de la escritura, antes del commit."""
+    sql, filas = sql_sumar(tenant_id, cambios)
+    if filas:
+        cur.executemany(adaptar_sql(sql), filas)
+
+
+def altas(contratos):
+    """contratos: [(fecha_fin, decision)] recién insertados -> cambios para sumar()."""
+    return [(fecha_fin, decision, 1) for fecha_fin, decision in contratos]
+
+
+def reconstruir(cur, tenant_id=None):
+    """Recalcula el resumen desde contratos (migración, carga masiva por SQL, o si se desfasó)."""
+    where, params = ("WHERE tenant_id = %s", (tenant_id,)) if tenant_id is not None else ("", ())
+    cur.execute(adaptar_sql(f"DELETE FROM contratos_resumen {where}"), params)
+    cur.execute(
+        adaptar_sql(f"""
+            INSERT INTO contratos_resumen (tenant_id, fecha_fin, decision, cantidad)
+            SELECT tenant_id, COALESCE(fecha_fin, '{FECHA_SIN_FIN.isoformat()}'),
+                   COALESCE(decision_renovacion, '{DECISION_DEFAULT}'), COUNT(*)
+            FROM contratos
+            {where}
+            GROUP BY 1, 2, 3
+        """),
+        params,
+    )
+
+
+# =========================================================
+# Lecturas
+# =========================================================
+def sql_mes(columna):
+    """Expresión 'YYYY-MM' de una fecha."""
+    if DB_ENGINE == "mysql":
+        return f"DATE_FORMAT({columna}, '%%Y-%%m')"
+    if DB_ENGINE in ("postgres", "postgresql"):
+        return f"to_char({columna}, 'YYYY-MM')"
+    return f"substr({columna}, 1, 7)"
+
+
+def _condicion(rango):
+    """(desde, hasta, con_fecha, sin_fecha) de app._rango_estado -> (sql, params)."""
+    desde, hasta, con_fecha, sin_fecha = rango
+    if sin_fecha and not con_fecha:
+        return "fecha_fin = %s", [FECHA_SIN_FIN]
+    cond, params = ["fecha_fin > %s"], [FECHA_SIN_FIN]
+    if desde:
+        cond.append("fecha_fin >= %s")
+        params.append(desde)
+    if hasta:
+        cond.append("fecha_fin <= %s")
+        params.append(hasta)
+    return " AND ".join(cond), params
+
+
+def por_estado(cur, tenant_id, rangos):
+    """
+    rangos: {estado: rango de fecha_fin} -> {decision: {estado: n, ..., "total": n}}.
+    Una pasada por el rango (tenant_id, ...) de la clave primaria.
+    """
+    columnas, params = [], []
+    for estado, rango in rangos.items():
+        cond, p = _condicion(rango)
+        columnas.append(f"SUM(CASE WHEN {cond} THEN cantidad ELSE 0 END) AS {estado}")
+        params.extend(p)
+
+    cur.execute(
+        adaptar_sql(f"""
+            SELECT decision, {", ".join(columnas)}, SUM(cantidad) AS total
+            FROM contratos_resumen
+            WHERE tenant_id = %s
+            GROUP BY decision
+        """),
+        tuple(params) + (tenant_id,),
+    )
+    out = {}
+    for r in cur.fetchall():
+        fila = {e: int(r.get(e) or 0) for e in rangos}
+        fila["total"] = int(r.get("total") or 0)
+        if fila["total"]:
+            out[r.get("decision")] = fila
+    return out
+
+
+def por_mes(cur, tenant_id, desde, hasta):
+    """Vencimientos con fecha_fin en [desde, hasta) -> {"YYYY-MM": {decision: n}}."""
+    mes = sql_mes("fecha_fin")
+    cur.execute(
+        adaptar_sql(f"""
+            SELECT {mes} AS mes, decision, SUM(cantidad) AS n
+            FROM contratos_resumen
+            WHERE tenant_id = %s AND fecha_fin >= %s AND fecha_fin < %s
+            GROUP BY 1, 2
+        """),
+        (tenant_id, desde, hasta),
+    )
+    out = {}
+    for r in cur.fetchall():
+        n = int(r.get("n") or 0)
+        if n:
+            out.setdefault(r.get("mes"), {})[r.get("decision")] = n
+    return out
+
+
+def verificar(cur, tenant_id):
+    """Diferencias entre el resumen y un GROUP BY sobre contratos ([] si coinciden)."""
+    cur.execute(
+        adaptar_sql(f"""
+            SELECT COALESCE(fecha_fin, '{FECHA_SIN_FIN.isoformat()}') AS fecha_fin,
+                   COALESCE(decision_renovacion, '{DECISION_DEFAULT}') AS decision, COUNT(*) AS n
+            FROM contratos WHERE tenant_id = %s GROUP BY 1, 2
+        """),
+        (tenant_id,),
+    )
+    real = {(bucket(r.get("fecha_fin")), r.get("decision")): int(r.get("n")) for r in cur.fetchall()}
+    cur.execute(
+        adaptar_sql("SELECT fecha_fin, decision, cantidad FROM contratos_resumen WHERE tenant_id = %s"),
+        (tenant_id,),
+    )
+    guardado = {(bucket(r.get("fecha_fin")), r.get("decision")): int(r.get("cantidad")) for r in cur.fetchall()}
+    return [
+        {"fecha_fin": k[0], "decision": k[1], "contratos": real.get(k, 0), "resumen": guardado.get(k, 0)}
+        for k in sorted(set(real) | set(guardado))
+        if real.get(k, 0) != guardado.get(k, 0)
+    ]
+
+
+if __name__ == "__main__":
+    import tenants
+
+    p = argparse.ArgumentParser(description="Verifica (o reconstruye) contratos_resumen contra contratos.")
+    p.add_argument("--tenant", default=None, help="slug del tenant (default: todos)")
+    p.add_argument("--reconstruir", action="store_true", help="recalcular el resumen desde contratos")
+    a = p.parse_args()
+
+    lista = [t for t in tenants.listar() if a.tenant in (None, t["slug"])]
+    if not lista:
+        raise SystemExit(f"tenant desconocido: {a.tenant}")
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        for t in lista:
+            if a.reconstruir:
+                reconstruir(cur, t["id"])
+                conn.commit()
+            difs = verificar(cur, t["id"])
+            print(f"{t['slug']}: {'ok' if not difs else f'{len(difs)} buckets distintos'}")
+            for d in difs[:10]:
+                print(f"  {d}")
+        cur.close()
@@ -0,0 +1,119 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import date
+from functools import wraps
+
+from cachetools import LRUCache
+from flask import Response, make_response, request
+
+from db import db_connection, adaptar_sql
+from tenants import tenant_actual
+
+# =========================================================
+# Cache HTTP de los listados (ETag / If-None-Match)
+#
+# versiones_tabla guarda un contador por tabla que suben las escrituras
+# (en la misma transacción que el cambio). Las respuestas GET se guardan ya
+# serializadas con clave (tenant, ruta, args, versión, fecha de hoy): la fecha
+# entra porque dias_restantes/estado cambian al cambiar el día aunque nadie escriba.
+#
+# La versión se lee de la tabla como mucho cada HTTP_CACHE_VERSION_TTL seg.
+# por proceso, así un poll que no cambió responde 304 sin tocar la base.
+# Una escritura en este proceso se ve enseguida; en otro worker, en <= TTL.
+# =========================================================
+HTTP_CACHE_MAX = int(os.getenv("HTTP_CACHE_MAX", "256"))                     # respuestas guardadas
+HTTP_CACHE_VERSION_TTL = float(os.getenv("HTTP_CACHE_VERSION_TTL", "1.0"))  # seg.
+
+_respuestas = LRUCache(maxsize=HTTP_CACHE_MAX)
+_versiones = {}  # tabla -> (version, leida_en)
+_lock = threading.Lock()
+_stats = {"304": 0, "hits": 0, "misses": 0, "lecturas_version": 0}
+
+SQL_INCREMENTAR = "UPDATE versiones_tabla SET version = version + 1 WHERE tabla = %s"
+
+
+def incrementar_version(cur, tabla="contratos"):
+    """Llamar con el cursor de la escritura, antes del commit."""
+    cur.execute(adaptar_sql(SQL_INCREMENTAR), (tabla,))
+    with _lock:
+        _versiones.pop(tabla, None)
+
+
+def olvidar_version(tabla="contratos"):
+    """Para escrituras que suben la versión con SQL_INCREMENTAR por su cuenta (lotes, modo ASGI)."""
+    with _lock:
+        _versiones.pop(tabla, None)
+
+
+def version(tabla="contratos"):
+    ahora = time.monotonic()
+    with _lock:
+        v = _versiones.get(tabla)
+        if v and ahora - v[1] < HTTP_CACHE_VERSION_TTL:
+            return v[0]
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql("SELECT version FROM versiones_tabla WHERE tabla = %s"), (tabla,))
+        row = cur.fetchone()
+        cur.close()
+
+    valor = int(row.get("version")) if row else 0
+    with _lock:
+        _versiones[tabla] = (valor, ahora)
+        _stats["lecturas_version"] += 1
+    return valor
+
+
+def condicional(tabla="contratos"):
+    """
+    Decorador para rutas GET que sólo dependen de `tabla`, el tenant, los args y el día:
+    - If-None-Match con el ETag vigente -> 304 (sin ejecutar la vista)
+    - respuesta ya serializada en memoria -> se devuelve tal cual
+    - si no, corre la vista y guarda el cuerpo si fue 200
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            clave = (
+                tenant_actual(),
+                request.path,
+                tuple(sorted(request.args.items(multi=True))),
+                version(tabla),
+                date.today().isoformat(),
+            )
+            etag = hashlib.sha1(repr(clave).encode()).hexdigest()[:24]
+
+            if etag in request.if_none_match:
+                with _lock:
+                    _stats["304"] += 1
+                resp = Response(status=304)
+                resp.set_etag(etag)
+                return resp
+
+            with _lock:
+                guardada = _respuestas.get(clave)
+                _stats["hits" if guardada else "misses"] += 1
+
+            if guardada:
+                cuerpo, mimetype = guardada
+                resp = Response(cuerpo, status=200, mimetype=mimetype)
+            else:
+                resp = make_response(fn(*args, **kwargs))
+                if resp.status_code == 200 and not resp.is_streamed:
+                    with _lock:
+                        _respuestas[clave] = (resp.get_data(), resp.mimetype)
+
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+
+        return wrapper
+    return deco
+
+
+def cache_stats():
+    with _lock:
+        return {**_stats, "respuestas": len(_respuestas), "max": HTTP_CACHE_MAX, "version_ttl_seg": HTTP_CACHE_VERSION_TTL}
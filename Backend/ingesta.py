@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ai_cache import extraer_con_cache
+from db import db_connection, ejecutar_many, empezar_transaccion
+from http_cache import incrementar_version
+from partes import vincular_contrato
+from estadisticas import altas, sumar
+
+IA_BULK_WORKERS = int(os.getenv("IA_BULK_WORKERS", "4"))    # extracciones en paralelo
+IA_BULK_MAX = int(os.getenv("IA_BULK_MAX", "1000"))         # contratos por request
+IA_BULK_LOTE_DB = int(os.getenv("IA_BULK_LOTE_DB", "25"))   # filas por executemany
+GROQ_RPM = float(os.getenv("GROQ_RPM", "30"))               # requests/min permitidos al proveedor
+
+
+class LimitadorTasa:
+    """
+    Token bucket thread-safe: `tasa` tokens por segundo, hasta `rafaga` acumulados.
+    adquirir() bloquea hasta que haya un token.
+    """
+
+    def __init__(self, tasa, rafaga=1):
+        self.tasa = max(tasa, 1e-6)
+        self.rafaga = max(1, int(rafaga))
+        self._tokens = float(self.rafaga)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
+
+
+# Uno por proceso: el límite del proveedor es por API key, no por request.
+limitador_groq = LimitadorTasa(GROQ_RPM / 60.0, rafaga=max(1, IA_BULK_WORKERS))
+
+
+def _insertar(filas, tenant_id):
+    """filas: [(texto, extraidos)] -> partes vinculadas + un executemany, en una transacción."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)
+        memo = {}  # el lote suele repetir inmobiliaria y propietarios
+        filas_db = []
+        for texto, e in filas:
+            ids = vincular_contrato(cur, tenant_id, e, memo)
+            filas_db.append((
+                tenant_id,
+                e.get("inmobiliaria"),
+                e.get("inquilino"),
+                e.get("propietario"),
+                e.get("fecha_inicio"),
+                e.get("fecha_fin"),
+                texto,
+                ids["inmobiliaria_id"],
+                ids["inquilino_id"],
+                ids["propietario_id"],
+            ))
+
+        ejecutar_many(
+            cur,
+            """
+            INSERT INTO contratos (
+                tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+                inmobiliaria_id, inquilino_id, propietario_id
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            """
+            INSERT INTO contratos (
+                tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+                inmobiliaria_id, inquilino_id, propietario_id
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            """
+            INSERT INTO contratos (
+                tenant_id, inmobiliaria, inquilino, propietario, fecha_inicio, fecha_fin, texto_contrato,
+                inmobiliaria_id, inquilino_id, propietario_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            filas_db,
+        )
+        sumar(cur, tenant_id, altas((e.get("fecha_fin"), None) for _, e in filas))
+        incrementar_version(cur)
+        conn.commit()
+        cur.close()
+
+
+def _extraer(texto):
+    return extraer_con_cache(texto, limitador=limitador_groq)
+
+
+def ingerir(textos, tenant_id, workers=None, lote_db=None):
+    """
+    Generador: extrae con concurrencia acotada y guarda en lotes, todo en `tenant_id`.
+
+    textos: lista de (indice, texto | None). Los None/vacíos se reportan como error.
+    Emite un dict por item a medida que queda resuelto (ya guardado en DB):
+        {"i": indice, "ok": bool, "extraido": {...}, "ia_cache": ..., "error": ...}
+    y al final {"resumen": {...}}.
+    """
+    workers = max(1, workers or IA_BULK_WORKERS)
+    lote_db = max(1, lote_db or IA_BULK_LOTE_DB)
+
+    resumen = {"total": len(textos), "guardados": 0, "errores": 0}
+    pendientes = []  # [(texto, extraidos, item)]
+
+    def _flush():
+        if not pendientes:
+            return []
+        filas = [(t, e) for t, e, _ in pendientes]
+        items = [it for _, _, it in pendientes]
+        pendientes.clear()
+        try:
+            _insertar(filas, tenant_id)
+            resumen["guardados"] += len(items)
+        except Exception as ex:
+            resumen["errores"] += len(items)
+            items = [{**it, "ok": False, "error": f"error_db: {repr(ex)}"} for it in items]
+        return items
+
+    validos = []
+    for i, texto in textos:
+        if not isinstance(texto, str) or not texto.strip():
+            resumen["errores"] += 1
+            yield {"i": i, "ok": False, "error": "Falta texto_contrato"}
+        else:
+            validos.append((i, texto))
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingesta")
+    try:
+        futuros = {pool.submit(_extraer, texto): (i, texto) for i, texto in validos}
+
+        for fut in as_completed(futuros):
+            i, texto = futuros[fut]
+            try:
+                res = fut.result() or {}
+            except Exception as ex:
+                res = {"ok": False, "error": repr(ex)}
+
+            extraidos = res.get("data") or {}
+            if not res.get("ok") or all(v is None for v in extraidos.values()):
+                resumen["errores"] += 1
+                error = res.get("error")
+                yield {
+                    "i": i,
+                    "ok": False,
+                    "error": error if isinstance(error, str) else "La IA no pudo extraer datos del contrato.",
+                    "ia_modelo": res.get("model"),
+                    "ia_error": error if isinstance(error, dict) else None,
+                }
+                continue
+
+            pendientes.append((texto, extraidos, {
+                "i": i,
+                "ok": True,
+                "extraido": extraidos,
+                "ia_modelo": res.get("model"),
+                "ia_cache": res.get("cache"),
+            }))
+            if len(pendientes) >= lote_db:
+                yield from _flush()
+
+        yield from _flush()
+    finally:
+        # si el cliente corta el stream, no seguimos gastando tokens,
+        # pero lo ya extraído se guarda igual
+        pool.shutdown(wait=False, cancel_futures=True)
+        _flush()
+
+    yield {"resumen": resumen}
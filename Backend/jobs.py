@@ -0,0 +1,299 @@
+import os
+import json
+import random
+import traceback
+from datetime import datetime, timedelta
+
+from db import db_connection, DB_ENGINE, ejecutar, adaptar_sql, insert_and_get_id
+
+JOB_LEASE = int(os.getenv("JOB_LEASE", "600"))                # seg. sin heartbeat => se puede re-reclamar
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "30"))  # seg. del primer reintento
+
+# tipo -> handler(payload, progreso) -> resultado (serializable a JSON)
+HANDLERS = {}
+
+
+class LeasePerdido(Exception):
+    """
+    El job ya no es de este worker: se le venció el lease (JOB_LEASE sin
+    heartbeat) y otro lo re-reclamó. El worker viejo tiene que soltarlo sin
+    reportar nada; progreso() la levanta para cortar el handler.
+    """
+
+
+def registrar(tipo):
+    """
+    @jobs.registrar("notificaciones_60d")
+    def handler(payload, progreso):
+        progreso(total=10)
+        ...
+        return {"ok": True}
+    """
+    def deco(fn):
+        HANDLERS[tipo] = fn
+        return fn
+    return deco
+
+
+def _job_dict(r):
+    if not r:
+        return None
+    out = {
+        "id": r.get("id"),
+        "tipo": r.get("tipo"),
+        "estado": r.get("estado"),
+        "intentos": r.get("intentos"),
+        "max_intentos": r.get("max_intentos"),
+        "disponible_en": str(r.get("disponible_en")) if r.get("disponible_en") else None,
+        "bloqueado_por": r.get("bloqueado_por"),
+        "progreso": {
+            "total": r.get("total"),
+            "procesados": r.get("procesados"),
+            "exitosos": r.get("exitosos"),
+            "fallidos": r.get("fallidos"),
+        },
+        "error": r.get("error"),
+        "creado_en": str(r.get("creado_en")) if r.get("creado_en") else None,
+        "actualizado_en": str(r.get("actualizado_en")) if r.get("actualizado_en") else None,
+        "payload": json.loads(r["payload"]) if r.get("payload") else None,
+        "resultado": json.loads(r["resultado"]) if r.get("resultado") else None,
+    }
+    return out
+
+
+def _select_job(cur, job_id):
+    ejecutar(
+        cur,
+        "SELECT * FROM jobs WHERE id = %s",
+        "SELECT * FROM jobs WHERE id = %s",
+        "SELECT * FROM jobs WHERE id = ?",
+        (job_id,),
+    )
+    return cur.fetchone()
+
+
+# =========================================================
+# API
+# =========================================================
+def encolar(tipo, payload=None, max_intentos=3, unico=False):
+    """
+    Encola un job y devuelve (job_id, creado).
+    Con unico=True, si ya hay uno del mismo tipo y payload (ej. el mismo tenant)
+    pendiente o en curso devuelve ese.
+    """
+    ahora = datetime.now()
+    payload_json = json.dumps(payload, sort_keys=True) if payload is not None else None
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        if unico:
+            mismo_payload = "payload = %s" if payload_json is not None else "payload IS NULL"
+            cur.execute(
+                adaptar_sql(
+                    f"SELECT id FROM jobs WHERE tipo = %s AND {mismo_payload} "
+                    "AND estado IN ('pendiente', 'en_curso') ORDER BY id LIMIT 1"
+                ),
+                (tipo, payload_json) if payload_json is not None else (tipo,),
+            )
+            row = cur.fetchone()
+            if row:
+                cur.close()
+                return row.get("id"), False
+
+        job_id = insert_and_get_id(
+            cur,
+            "INSERT INTO jobs (tipo, payload, max_intentos, disponible_en) VALUES (%s, %s, %s, %s)",
+            "INSERT INTO jobs (tipo, payload, max_intentos, disponible_en) VALUES (%s, %s, %s, %s) RETURNING id",
+            "INSERT INTO jobs (tipo, payload, max_intentos, disponible_en) VALUES (?, ?, ?, ?)",
+            (tipo, payload_json, max_intentos, ahora),
+        )
+        conn.commit()
+        cur.close()
+
+    return job_id, True
+
+
+def obtener(job_id):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        row = _select_job(cur, job_id)
+        cur.close()
+    return _job_dict(row)
+
+
+def reclamar(worker_id):
+    """
+    Toma el próximo job disponible y lo marca en_curso a nombre de worker_id.
+    También re-toma jobs en_curso cuyo worker dejó de dar señales (> JOB_LEASE).
+
+    - Postgres: UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED)
+    - MySQL 8: SELECT ... FOR UPDATE SKIP LOCKED + UPDATE en la misma transacción
+    - SQLite: BEGIN IMMEDIATE (un solo escritor a la vez) + SELECT + UPDATE
+    """
+    ahora = datetime.now()
+    vencido = ahora - timedelta(seconds=JOB_LEASE)
+
+    sql_candidato = """
+        SELECT id FROM jobs
+        WHERE (estado = 'pendiente' AND disponible_en <= %s)
+           OR (estado = 'en_curso' AND bloqueado_en < %s)
+        ORDER BY disponible_en ASC, id ASC
+        LIMIT 1
+    """
+    sql_claim = """
+        UPDATE jobs
+        SET estado = 'en_curso', intentos = intentos + 1,
+            bloqueado_por = %s, bloqueado_en = %s, actualizado_en = %s
+        WHERE id = %s
+    """
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        if DB_ENGINE in ("postgres", "postgresql"):
+            cur.execute(
+                sql_claim.replace("WHERE id = %s", f"WHERE id = ({sql_candidato} FOR UPDATE SKIP LOCKED)")
+                + " RETURNING *",
+                (worker_id, ahora, ahora, ahora, vencido),
+            )
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+            return _job_dict(row)
+
+        if DB_ENGINE == "mysql":
+            conn.begin()
+            cur.execute(sql_candidato + " FOR UPDATE SKIP LOCKED", (ahora, vencido))
+        else:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(adaptar_sql(sql_candidato), (ahora, vencido))
+
+        cand = cur.fetchone()
+        row = None
+        if cand:
+            cur.execute(adaptar_sql(sql_claim), (worker_id, ahora, ahora, cand.get("id")))
+            row = _select_job(cur, cand.get("id"))
+
+        conn.commit()
+        cur.close()
+
+    return _job_dict(row)
+
+
+# progreso/terminar/fallar sólo tocan el job si sigue a nombre del worker
+# (AND bloqueado_por = worker_id). Si no tocaron ninguna fila, levantan LeasePerdido.
+def progreso(job_id, worker_id, **contadores):
+    """
+    Actualiza contadores (total/procesados/exitosos/fallidos).
+    También sirve de heartbeat: renueva bloqueado_en.
+    """
+    campos = [k for k in ("total", "procesados", "exitosos", "fallidos") if contadores.get(k) is not None]
+    ahora = datetime.now()
+
+    sets = ", ".join(f"{k} = %s" for k in campos + ["bloqueado_en", "actualizado_en"])
+    params = tuple(contadores[k] for k in campos) + (ahora, ahora, job_id, worker_id)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql(f"UPDATE jobs SET {sets} WHERE id = %s AND bloqueado_por = %s"), params)
+        n = cur.rowcount
+        conn.commit()
+        cur.close()
+
+    if n == 0:
+        raise LeasePerdido(f"job {job_id}: ya no está a nombre de {worker_id}")
+
+
+def terminar(job_id, worker_id, resultado=None):
+    ahora = datetime.now()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ejecutar(
+            cur,
+            "UPDATE jobs SET estado = 'ok', resultado = %s, error = NULL, bloqueado_por = NULL, actualizado_en = %s "
+            "WHERE id = %s AND bloqueado_por = %s",
+            "UPDATE jobs SET estado = 'ok', resultado = %s, error = NULL, bloqueado_por = NULL, actualizado_en = %s "
+            "WHERE id = %s AND bloqueado_por = %s",
+            "UPDATE jobs SET estado = 'ok', resultado = ?, error = NULL, bloqueado_por = NULL, actualizado_en = ? "
+            "WHERE id = ? AND bloqueado_por = ?",
+            (json.dumps(resultado, default=str) if resultado is not None else None, ahora, job_id, worker_id),
+        )
+        n = cur.rowcount
+        conn.commit()
+        cur.close()
+
+    if n == 0:
+        raise LeasePerdido(f"job {job_id}: ya no está a nombre de {worker_id}")
+
+
+def _backoff(intentos):
+    """Exponencial con jitter: base * 2^(n-1) + U(0, base)."""
+    return JOB_BACKOFF_BASE * (2 ** max(0, intentos - 1)) + random.uniform(0, JOB_BACKOFF_BASE)
+
+
+def fallar(job, error):
+    """
+    Si quedan intentos, vuelve a 'pendiente' con backoff; si no, queda en 'error'.
+    job es el dict que devolvió reclamar (con su bloqueado_por).
+    """
+    ahora = datetime.now()
+    reintenta = (job.get("intentos") or 0) < (job.get("max_intentos") or 0)
+    estado = "pendiente" if reintenta else "error"
+    disponible_en = ahora + timedelta(seconds=_backoff(job.get("intentos") or 1)) if reintenta else ahora
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ejecutar(
+            cur,
+            "UPDATE jobs SET estado = %s, error = %s, disponible_en = %s, bloqueado_por = NULL, actualizado_en = %s "
+            "WHERE id = %s AND bloqueado_por = %s",
+            "UPDATE jobs SET estado = %s, error = %s, disponible_en = %s, bloqueado_por = NULL, actualizado_en = %s "
+            "WHERE id = %s AND bloqueado_por = %s",
+            "UPDATE jobs SET estado = ?, error = ?, disponible_en = ?, bloqueado_por = NULL, actualizado_en = ? "
+            "WHERE id = ? AND bloqueado_por = ?",
+            (estado, error, disponible_en, ahora, job.get("id"), job.get("bloqueado_por")),
+        )
+        n = cur.rowcount
+        conn.commit()
+        cur.close()
+
+    if n == 0:
+        raise LeasePerdido(f"job {job.get('id')}: ya no está a nombre de {job.get('bloqueado_por')}")
+    return estado
+
+
+def ejecutar_job(job):
+    """
+    Corre el handler del job y registra el resultado. Devuelve el estado final,
+    o 'perdido' si el lease pasó a otro worker (no se registra nada).
+    """
+    try:
+        return _ejecutar_job(job)
+    except LeasePerdido as e:
+        print(f"✗ {e}: lo suelto sin reportar")
+        return "perdido"
+
+
+def _ejecutar_job(job):
+    handler = HANDLERS.get(job.get("tipo"))
+    if handler is None:
+        job = {**job, "intentos": job.get("max_intentos")}  # sin handler no tiene sentido reintentar
+        return fallar(job, f"tipo de job desconocido: {job.get('tipo')}")
+
+    if (job.get("intentos") or 0) > (job.get("max_intentos") or 0):
+        return fallar(job, job.get("error") or "se agotaron los intentos")
+
+    def _progreso(**contadores):
+        progreso(job.get("id"), job.get("bloqueado_por"), **contadores)
+
+    try:
+        resultado = handler(job.get("payload") or {}, _progreso)
+    except LeasePerdido:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        return fallar(job, repr(e))
+
+    terminar(job.get("id"), job.get("bloqueado_por"), resultado)
+    return "ok"
@@ -0,0 +1,649 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import registro
+from metricas import (
+    groq_duracion, groq_intentos, groq_hedges, groq_circuito, groq_primer_token, registrar_uso_groq,
+)
+
+# =========================================================
+# Cliente del proveedor de IA (Groq) tolerante a fallas
+#
+# completar(mensajes) / completar_async(mensajes) devuelven el texto que
+# respondió el modelo. Por cada llamada:
+# - deadline total (LLM_DEADLINE) para reintentos y modelos juntos, y un
+#   timeout por intento (LLM_TIMEOUT) recortado a lo que quede del deadline
+# - reintentos ante 429 / 5xx / timeout / error de red, con backoff
+#   exponencial y jitter completo (y el Retry-After de Groq si entra en el deadline)
+# - circuit breaker por modelo: LLM_CB_FALLOS fallas seguidas (5xx, timeout,
+#   red) lo abren LLM_CB_ESPERA segundos; después pasa un solo intento de
+#   prueba. Un 429 no cuenta: Groq está vivo y el Retry-After ya nos frena.
+#   Tampoco quedarse sin thread para el intento (modo sync, ver _lanzar)
+# - hedging: si un intento tarda más que el p95 reciente del modelo (o
+#   LLM_HEDGE_MS), sale un duplicado y gana el primero que responde
+# - fallback: con un modelo agotado o con el circuito abierto se sigue con el
+#   siguiente de la lista (GROQ_MODEL y después GROQ_MODELOS_FALLBACK)
+# Lo que no se arregla reintentando (400, 401, 404...) pasa directo al
+# siguiente modelo; para el circuito cuenta como respuesta (Groq contestó).
+#
+# Con parser=... el intento va por stream: cada fragmento pasa por el parser
+# (ej. ai_json.ParserExtraccion) y el stream se corta cuando el parser dice
+# que terminó. Si el parser rechaza la respuesta, RespuestaInvalida: es el
+# contenido, no el proveedor, así que no se reintenta ni se pasa a otro modelo.
+# Las líneas SSE se leen crudas (with_streaming_response + json.loads): el
+# SDK arma un modelo pydantic por chunk, ~0.25 ms cada uno, y un stream son
+# decenas de chunks.
+# =========================================================
+MODELOS = list(dict.fromkeys(
+    m.strip()
+    for m in [os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")]
+    + os.getenv("GROQ_MODELOS_FALLBACK", "llama-3.1-8b-instant").split(",")
+    if m.strip()
+))
+
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "20"))          # seg. por llamada, todo incluido
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "8"))             # seg. por intento
+LLM_TIMEOUT_MIN = 0.5                                          # menos que esto no vale la pena intentar
+LLM_REINTENTOS = int(os.getenv("LLM_REINTENTOS", "2"))         # por modelo, además del primer intento
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.25"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_CB_FALLOS = int(os.getenv("LLM_CB_FALLOS", "5"))
+LLM_CB_ESPERA = float(os.getenv("LLM_CB_ESPERA", "30"))
+LLM_HEDGE_MS = os.getenv("LLM_HEDGE_MS", "auto")              # "auto" (p95), ms fijos, o "0" = sin hedging
+LLM_HEDGE_INICIAL_MS = float(os.getenv("LLM_HEDGE_INICIAL_MS", "3000"))  # "auto" sin muestras suficientes
+LLM_HEDGE_MUESTRAS = 20
+LLM_HILOS = int(os.getenv("LLM_HILOS", "64"))                  # intentos en vuelo (modo sync): mitad originales, mitad duplicados
+LLM_HILOS_DRENAJE = int(os.getenv("LLM_HILOS_DRENAJE", "4"))   # colas de stream después del resultado (modo sync)
+
+
+class LLMError(RuntimeError):
+    """
+    No hubo respuesta. tipo:
+    - deadline: se terminó LLM_DEADLINE
+    - no_disponible: todos los modelos fallaron o tienen el circuito abierto
+    reintentar_en: segundos sugeridos antes de volver a probar (o None).
+    """
+
+    def __init__(self, mensaje, tipo, intentos, reintentar_en=None):
+        super().__init__(mensaje)
+        self.tipo = tipo
+        self.intentos = intentos
+        self.reintentar_en = reintentar_en
+
+
+class RespuestaInvalida(ValueError):
+    """El modelo respondió algo que el parser no acepta. texto: lo que llegó hasta ahí."""
+
+    def __init__(self, mensaje, texto, intentos=None):
+        super().__init__(mensaje)
+        self.texto = texto
+        self.intentos = intentos or []
+
+
+class _Timeout(Exception):
+    """El intento no respondió dentro de su timeout (el SDK puede seguir en otro thread)."""
+
+
+class _SinHilo(Exception):
+    """No hubo thread libre para el intento a tiempo: saturación local, no del proveedor."""
+
+
+class _ErrorStream(Exception):
+    """Groq mandó un evento de error en medio del stream."""
+
+
+# =========================================================
+# Circuit breaker y latencias por modelo
+# =========================================================
+class Circuito:
+    def __init__(self, modelo):
+        self.modelo = modelo
+        self.estado = "cerrado"
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._prueba = False
+        self._lock = threading.Lock()
+
+    def _pasar(self, estado):
+        if estado != self.estado:
+            self.estado = estado
+            groq_circuito.inc(model=self.modelo, estado=estado)
+
+    def permitir(self):
+        """¿Puede salir un intento? Semi-abierto: deja pasar uno solo de prueba."""
+        with self._lock:
+            if self.estado == "abierto" and time.monotonic() >= self.abierto_hasta:
+                self._pasar("semi_abierto")
+                self._prueba = False
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "semi_abierto" and not self._prueba:
+                self._prueba = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self._pasar("cerrado")
+
+    def liberar(self):
+        """El intento no dice nada del modelo (429): no cuenta, pero libera la prueba."""
+        with self._lock:
+            self._prueba = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == "semi_abierto" or self.fallos >= LLM_CB_FALLOS:
+                self.abierto_hasta = time.monotonic() + LLM_CB_ESPERA
+                self._pasar("abierto")
+
+    def reintentar_en(self):
+        with self._lock:
+            return max(0.0, self.abierto_hasta - time.monotonic()) if self.estado == "abierto" else 0.0
+
+
+_circuitos = {m: Circuito(m) for m in MODELOS}
+_latencias = {m: deque(maxlen=200) for m in MODELOS}  # seg. de intentos exitosos
+_latencias_lock = threading.Lock()
+
+
+def _registrar_latencia(modelo, seg):
+    with _latencias_lock:
+        _latencias[modelo].append(seg)
+
+
+def _espera_hedge(modelo):
+    """Segundos hasta mandar el duplicado, o None (sin hedging)."""
+    if LLM_HEDGE_MS != "auto":
+        ms = float(LLM_HEDGE_MS)
+        return ms / 1000.0 if ms > 0 else None
+    with _latencias_lock:
+        muestras = sorted(_latencias[modelo])
+    if len(muestras) < LLM_HEDGE_MUESTRAS:
+        return LLM_HEDGE_INICIAL_MS / 1000.0
+    return muestras[int(len(muestras) * 0.95) - 1]
+
+
+def estado():
+    """Para /api/ai/metrics: circuito y p95 por modelo."""
+    out = {}
+    for m in MODELOS:
+        c = _circuitos[m]
+        hedge = _espera_hedge(m)
+        out[m] = {
+            "circuito": c.estado,
+            "fallos_seguidos": c.fallos,
+            "reintentar_en_s": round(c.reintentar_en(), 1),
+            "hedge_ms": round(hedge * 1000) if hedge is not None else None,
+        }
+    return out
+
+
+# =========================================================
+# Clasificación de errores y plan de reintentos
+# =========================================================
+def _clasificar(e):
+    """-> (resultado para métricas, ¿reintentable?, Retry-After en seg. o None)."""
+    if isinstance(e, (_Timeout, asyncio.TimeoutError)):
+        return "timeout", True, None
+    if isinstance(e, _SinHilo):
+        return "sin_hilo", True, None
+    if isinstance(e, RespuestaInvalida):
+        return "respuesta_invalida", False, None
+    if isinstance(e, _ErrorStream):
+        return "error_5xx", True, None
+    nombres = {c.__name__ for c in type(e).__mro__}
+    if "APITimeoutError" in nombres:
+        return "timeout", True, None
+    if "APIConnectionError" in nombres:
+        return "error_red", True, None
+
+    status = getattr(e, "status_code", None)
+    if status == 429:
+        try:
+            retry_after = float(e.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = None
+        return "rate_limit", True, retry_after
+    if status is not None and (status >= 500 or status == 408):
+        return "error_5xx", True, None
+    return "rechazado", False, None
+
+
+class _Plan:
+    """Lleva el deadline y el historial de intentos de una llamada."""
+
+    def __init__(self, deadline):
+        self.fin = time.monotonic() + (deadline or LLM_DEADLINE)
+        self.intentos = []
+
+    def restante(self):
+        return self.fin - time.monotonic()
+
+    def timeout(self):
+        return min(LLM_TIMEOUT, self.restante())
+
+    def fallo(self, modelo, e):
+        """-> (resultado, ¿reintentable?, Retry-After)."""
+        resultado, reintentable, retry_after = _clasificar(e)
+        groq_intentos.inc(model=modelo, resultado=resultado)
+        self.intentos.append({"modelo": modelo, "resultado": resultado, "detalle": repr(e)[:200]})
+        return resultado, reintentable, retry_after
+
+    def ok(self, modelo, seg):
+        groq_intentos.inc(model=modelo, resultado="ok")
+        self.intentos.append({"modelo": modelo, "resultado": "ok", "ms": round(seg * 1000, 1)})
+
+    def backoff(self, n, retry_after):
+        """Espera antes del reintento n (0, 1, ...), o None si no entra en el deadline."""
+        espera = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** n)))
+        if retry_after is not None:
+            espera = max(espera, retry_after)
+        if espera + LLM_TIMEOUT_MIN > self.restante():
+            return None
+        return espera
+
+    def error(self):
+        if self.restante() < LLM_TIMEOUT_MIN:
+            return LLMError("deadline agotado", "deadline", self.intentos)
+        abiertos = [_circuitos[m].reintentar_en() for m in MODELOS if _circuitos[m].estado != "cerrado"]
+        reintentar_en = min(abiertos) if len(abiertos) == len(MODELOS) else None
+        return LLMError("ningún modelo respondió", "no_disponible", self.intentos, reintentar_en)
+
+    def respuesta(self, texto, datos, modelo):
+        return {
+            "texto": texto, "datos": datos, "modelo": modelo,
+            "fallback": modelo != MODELOS[0], "intentos": self.intentos,
+        }
+
+
+class _Lectura:
+    """
+    Las líneas SSE de un stream pasando por el parser (igual en sync y async).
+    Cuando el parser termina, el resultado ya está; lo que queda del stream
+    (chunk final con el usage y [DONE]) se drena aparte con cola(), así la
+    conexión vuelve al pool y el uso de tokens se registra igual.
+    """
+
+    def __init__(self, modelo, parser, timeout):
+        self.modelo = modelo
+        self.parser = parser
+        self.t0 = time.perf_counter()
+        self.limite = self.t0 + timeout
+        self.partes = []
+        self.usage = None
+
+    def _chunk(self, linea):
+        if not linea.startswith("data:"):
+            return None
+        dato = linea[5:].strip()
+        if dato == "[DONE]":
+            return None
+        chunk = json.loads(dato)
+        if chunk.get("error"):
+            raise _ErrorStream(str(chunk["error"])[:200])
+        self.usage = (chunk.get("x_groq") or {}).get("usage") or chunk.get("usage") or self.usage
+        return chunk
+
+    def linea(self, linea):
+        """True cuando el parser ya tiene todo (se puede dejar de esperar el stream)."""
+        chunk = self._chunk(linea)
+        if chunk is None:
+            return False
+        if not self.partes:
+            groq_primer_token.observar(time.perf_counter() - self.t0, model=self.modelo)
+        choices = chunk.get("choices") or [{}]
+        texto = (choices[0].get("delta") or {}).get("content")
+        if texto:
+            self.partes.append(texto)
+            try:
+                if self.parser.alimentar(texto):
+                    return True
+            except ValueError as e:
+                raise RespuestaInvalida(str(e), "".join(self.partes)) from e
+        if time.perf_counter() > self.limite:
+            raise _Timeout(f"{self.modelo}: stream sin terminar")
+        return False
+
+    def cola(self, linea):
+        """Después del resultado: sólo importa el usage."""
+        try:
+            self._chunk(linea)
+        except (ValueError, _ErrorStream):
+            pass
+
+    def fin(self):
+        """-> (texto, datos, seg)."""
+        texto = "".join(self.partes).strip()
+        try:
+            datos = self.parser.terminar()
+        except ValueError as e:
+            raise RespuestaInvalida(str(e), texto) from e
+        return texto, datos, time.perf_counter() - self.t0
+
+    def registrar_uso(self):
+        registrar_uso_groq(self.modelo, self.usage)
+
+
+# =========================================================
+# Modo sync (threads): el intento y su duplicado corren en _hilos()
+#
+# Un intento nunca espera en la cola del executor (esa espera terminaría en un
+# _Timeout que el proveedor no causó): cada uno toma antes un lugar de su cupo
+# y el thread lo suelta al terminar (también el perdedor de un hedge, que
+# sigue hasta su timeout). Originales y duplicados tienen LLM_HILOS / 2 cada
+# uno y el executor tiene lugar para todos. Sin lugar para el original se
+# espera dentro del timeout del intento y, si no alcanza, _SinHilo (no cuenta
+# para el circuito); sin lugar para el duplicado, no se manda.
+# Los drenajes de stream van a su propio executor (_hilos_drenaje).
+# =========================================================
+_CUPO = max(1, LLM_HILOS // 2)
+_cupo_original = threading.BoundedSemaphore(_CUPO)
+_cupo_hedge = threading.BoundedSemaphore(_CUPO)
+_pool = None
+_pool_drenaje = None
+_pool_lock = threading.Lock()
+
+
+def _hilos():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=2 * _CUPO, thread_name_prefix="llm")
+    return _pool
+
+
+def _hilos_drenaje():
+    global _pool_drenaje
+    if _pool_drenaje is None:
+        with _pool_lock:
+            if _pool_drenaje is None:
+                _pool_drenaje = ThreadPoolExecutor(max_workers=max(1, LLM_HILOS_DRENAJE), thread_name_prefix="llm-drenaje")
+    return _pool_drenaje
+
+
+def _lanzar(cupo, *args):
+    """_intento en _hilos(), con un lugar de `cupo` ya tomado: lo suelta el thread al terminar."""
+    def correr():
+        try:
+            return _intento(*args)
+        finally:
+            cupo.release()
+
+    try:
+        return _hilos().submit(correr)
+    except BaseException:
+        cupo.release()
+        raise
+
+
+def _drenar(stream, lineas, lectura):
+    try:
+        for linea in lineas:
+            lectura.cola(linea)
+    except Exception:
+        pass
+    finally:
+        stream.close()
+        lectura.registrar_uso()
+
+
+def _intento(modelo, mensajes, timeout, parser, opciones):
+    """-> (texto, datos del parser o None, seg)."""
+    t0 = time.perf_counter()
+    cliente = registro.obtener("groq")
+    with groq_duracion.medir(model=modelo, ok="false") as span:
+        if parser is None:
+            response = cliente.chat.completions.create(
+                model=modelo, messages=mensajes, temperature=0, timeout=timeout, **opciones,
+            )
+            registrar_uso_groq(modelo, getattr(response, "usage", None))
+            texto, datos, seg = (response.choices[0].message.content or "").strip(), None, time.perf_counter() - t0
+        else:
+            lectura = _Lectura(modelo, parser(), timeout)
+            stream = cliente.chat.completions.create(
+                model=modelo, messages=mensajes, temperature=0, timeout=timeout, stream=True, **opciones,
+            )
+            lineas = stream.response.iter_lines()  # crudas: sin un modelo pydantic por chunk
+            completo = False
+            try:
+                for linea in lineas:
+                    if lectura.linea(linea):
+                        completo = True
+                        break
+                texto, datos, seg = lectura.fin()
+            except BaseException:
+                stream.close()
+                raise
+            if completo:
+                _hilos_drenaje().submit(_drenar, stream, lineas, lectura)
+            else:
+                stream.close()
+                lectura.registrar_uso()
+        span["ok"] = "true"
+    return texto, datos, seg
+
+
+def _intento_con_hedge(modelo, mensajes, timeout, parser, opciones):
+    """Un intento (más un duplicado si tarda); el primero que responde bien gana."""
+    espera = time.monotonic()
+    if not _cupo_original.acquire(timeout=max(0.0, timeout - LLM_TIMEOUT_MIN)):
+        raise _SinHilo(f"{modelo}: sin thread libre en {timeout:.1f} s (LLM_HILOS={LLM_HILOS})")
+    inicio = time.monotonic()
+    timeout -= inicio - espera
+    futuros = {_lanzar(_cupo_original, modelo, mensajes, timeout, parser, opciones): "original"}
+    hedge = _espera_hedge(modelo)
+    hedge_pendiente = hedge is not None and hedge < timeout
+    hedge_enviado = False
+    error = None
+
+    while futuros:
+        transcurrido = time.monotonic() - inicio
+        if transcurrido >= timeout:
+            raise _Timeout(f"{modelo}: sin respuesta en {timeout:.1f} s")
+        limite = timeout if not hedge_pendiente else min(timeout, hedge)
+        listos, _ = wait(futuros, timeout=max(0.0, limite - transcurrido), return_when=FIRST_COMPLETED)
+
+        for f in listos:
+            cual = futuros.pop(f)
+            try:
+                resultado = f.result()
+            except Exception as e:
+                error = e
+                continue
+            if hedge_enviado:
+                groq_hedges.inc(model=modelo, ganador=cual)
+            return resultado  # el otro (si hay) termina solo: el SDK tiene su timeout
+
+        if hedge_pendiente and time.monotonic() - inicio >= hedge:
+            hedge_pendiente = False
+            if _circuitos[modelo].estado == "cerrado" and _cupo_hedge.acquire(blocking=False):
+                restante = timeout - (time.monotonic() - inicio)
+                futuros[_lanzar(_cupo_hedge, modelo, mensajes, restante, parser, opciones)] = "hedge"
+                hedge_enviado = True
+
+    raise error
+
+
+def completar(mensajes, deadline=None, parser=None, **opciones):
+    """
+    -> {"texto", "datos", "modelo", "fallback", "intentos"}. Lanza LLMError o RespuestaInvalida.
+    parser: fábrica de parsers (uno por intento) -> stream; "datos" es lo que devuelve su terminar().
+    opciones: se pasan a chat.completions.create (ej. response_format).
+    """
+    plan = _Plan(deadline)
+    for modelo in MODELOS:
+        circuito = _circuitos[modelo]
+        for n in range(LLM_REINTENTOS + 1):
+            if plan.timeout() < LLM_TIMEOUT_MIN:
+                raise plan.error()
+            if not circuito.permitir():
+                break
+            try:
+                texto, datos, seg = _intento_con_hedge(modelo, mensajes, plan.timeout(), parser, opciones)
+            except Exception as e:
+                resultado, reintentable, retry_after = plan.fallo(modelo, e)
+                if isinstance(e, RespuestaInvalida):
+                    circuito.exito()
+                    e.intentos = plan.intentos
+                    raise
+                if not reintentable:
+                    circuito.exito()  # el proveedor respondió: el problema es el pedido (o el modelo)
+                    break
+                if resultado in ("rate_limit", "sin_hilo"):
+                    circuito.liberar()
+                else:
+                    circuito.fallo()
+                espera = plan.backoff(n, retry_after) if n < LLM_REINTENTOS else None
+                if espera is None:
+                    break
+                time.sleep(espera)
+                continue
+
+            circuito.exito()
+            _registrar_latencia(modelo, seg)
+            plan.ok(modelo, seg)
+            return plan.respuesta(texto, datos, modelo)
+    raise plan.error()
+
+
+# =========================================================
+# Modo async (ASGI): mismo plan, con tasks; el duplicado perdedor se cancela
+# =========================================================
+_drenajes = set()  # tasks de _drenar_async en curso (referencia para que no las junte el GC)
+
+
+async def _drenar_async(stream, lineas, lectura):
+    try:
+        async for linea in lineas:
+            lectura.cola(linea)
+    except Exception:
+        pass
+    finally:
+        await lineas.aclose()
+        await stream.close()
+        lectura.registrar_uso()
+
+
+async def _intento_async(modelo, mensajes, timeout, parser, opciones):
+    t0 = time.perf_counter()
+    cliente = registro.obtener("groq_async")
+    with groq_duracion.medir(model=modelo, ok="false") as span:
+        if parser is None:
+            response = await cliente.chat.completions.create(
+                model=modelo, messages=mensajes, temperature=0, timeout=timeout, **opciones,
+            )
+            registrar_uso_groq(modelo, getattr(response, "usage", None))
+            texto, datos, seg = (response.choices[0].message.content or "").strip(), None, time.perf_counter() - t0
+        else:
+            lectura = _Lectura(modelo, parser(), timeout)
+            stream = await cliente.chat.completions.create(
+                model=modelo, messages=mensajes, temperature=0, timeout=timeout, stream=True, **opciones,
+            )
+            lineas = stream.response.aiter_lines()
+            completo = False
+            try:
+                async for linea in lineas:
+                    if lectura.linea(linea):
+                        completo = True
+                        break
+                texto, datos, seg = lectura.fin()
+            except BaseException:
+                await lineas.aclose()
+                await stream.close()
+                raise
+            if completo:
+                tarea = asyncio.ensure_future(_drenar_async(stream, lineas, lectura))
+                _drenajes.add(tarea)
+                tarea.add_done_callback(_drenajes.discard)
+            else:
+                await stream.close()
+                lectura.registrar_uso()
+        span["ok"] = "true"
+    return texto, datos, seg
+
+
+async def _intento_con_hedge_async(modelo, mensajes, timeout, parser, opciones):
+    inicio = time.monotonic()
+    tareas = {asyncio.ensure_future(_intento_async(modelo, mensajes, timeout, parser, opciones)): "original"}
+    hedge = _espera_hedge(modelo)
+    hedge_pendiente = hedge is not None and hedge < timeout
+    hedge_enviado = False
+    error = None
+
+    try:
+        while tareas:
+            transcurrido = time.monotonic() - inicio
+            if transcurrido >= timeout:
+                raise _Timeout(f"{modelo}: sin respuesta en {timeout:.1f} s")
+            limite = timeout if not hedge_pendiente else min(timeout, hedge)
+            listos, _ = await asyncio.wait(tareas, timeout=max(0.0, limite - transcurrido), return_when=asyncio.FIRST_COMPLETED)
+
+            for t in listos:
+                cual = tareas.pop(t)
+                try:
+                    resultado = t.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if hedge_enviado:
+                    groq_hedges.inc(model=modelo, ganador=cual)
+                return resultado
+
+            if hedge_pendiente and time.monotonic() - inicio >= hedge:
+                hedge_pendiente = False
+                if _circuitos[modelo].estado == "cerrado":
+                    restante = timeout - (time.monotonic() - inicio)
+                    tareas[asyncio.ensure_future(_intento_async(modelo, mensajes, restante, parser, opciones))] = "hedge"
+                    hedge_enviado = True
+        raise error
+    finally:
+        for t in tareas:
+            t.cancel()
+
+
+async def completar_async(mensajes, deadline=None, parser=None, **opciones):
+    """Igual que completar(), sin bloquear el event loop."""
+    plan = _Plan(deadline)
+    for modelo in MODELOS:
+        circuito = _circuitos[modelo]
+        for n in range(LLM_REINTENTOS + 1):
+            if plan.timeout() < LLM_TIMEOUT_MIN:
+                raise plan.error()
+            if not circuito.permitir():
+                break
+            try:
+                texto, datos, seg = await _intento_con_hedge_async(modelo, mensajes, plan.timeout(), parser, opciones)
+            except Exception as e:
+                resultado, reintentable, retry_after = plan.fallo(modelo, e)
+                if isinstance(e, RespuestaInvalida):
+                    circuito.exito()
+                    e.intentos = plan.intentos
+                    raise
+                if not reintentable:
+                    circuito.exito()  # el proveedor respondió: el problema es el pedido (o el modelo)
+                    break
+                if resultado in ("rate_limit", "sin_hilo"):
+                    circuito.liberar()
+                else:
+                    circuito.fallo()
+                espera = plan.backoff(n, retry_after) if n < LLM_REINTENTOS else None
+                if espera is None:
+                    break
+                await asyncio.sleep(espera)
+                continue
+
+            circuito.exito()
+            _registrar_latencia(modelo, seg)
+            plan.ok(modelo, seg)
+            return plan.respuesta(texto, datos, modelo)
+    raise plan.error()
@@ -1,8 +1,42 @@
 import os
-import requests
 
+import registro
+from metricas import resend_duracion, resend_emails
 
-def send_email(to: str, subject: str, body: str):
+RESEND_API_URL = os.getenv("RESEND_API_URL", "https://api.resend.com").rstrip("/")
+RESEND_URL = f"{RESEND_API_URL}/emails"
+
+_async_client = None
+
+
+class ResendError(RuntimeError):
+    """Resend respondió con error (el request llegó y fue rechazado)."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"Resend error {status_code}: {text}")
+        self.status_code = status_code
+
+
+def _crear_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool = int(os.getenv("MAIL_HTTP_POOL", "10"))
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+    return s
+
+
+def get_session():
+    """
+    Session HTTP compartida (keep-alive): evita un handshake TLS por cada email.
+    requests.Session se puede usar desde varios threads para requests simples.
+    Vive en el registro: se crea (e importa requests) con el primer envío o al calentar.
+    """
+    return registro.obtener("http")
+
+
+def _config():
     provider = os.getenv("EMAIL_PROVIDER", "resend").lower()
 
     if provider != "resend":
@@ -18,20 +52,104 @@ def send_email(to: str, subject: str, body: str):
     # Resend acepta From en formato "Nombre <email>"
     from_header = f"{mail_from_name} <{mail_from}>" if mail_from_name else mail_from
 
-    url = "https://api.resend.com/emails"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
+    return from_header, headers
+
+
+def _timeout():
+    return float(os.getenv("RESEND_TIMEOUT", "30"))
+
+
+def _post(url, endpoint, headers, payload):
+    with resend_duracion.medir(endpoint=endpoint, status="error") as span:
+        resp = get_session().post(url, headers=headers, json=payload, timeout=_timeout())
+        span["status"] = resp.status_code
+    resend_emails.inc(endpoint=endpoint, status=resp.status_code)
+    return resp
+
+
+async def _post_async(url, endpoint, headers, payload):
+    with resend_duracion.medir(endpoint=endpoint, status="error") as span:
+        resp = await get_async_client().post(url, headers=headers, json=payload)
+        span["status"] = resp.status_code
+    resend_emails.inc(endpoint=endpoint, status=resp.status_code)
+    return resp
+
+
+def _payload(from_header, to, subject, body, html=None):
     payload = {
         "from": from_header,
         "to": [to],
         "subject": subject,
-        # Para mantenerlo simple: body texto plano
         "text": body,
     }
+    if html:
+        payload["html"] = html
+    return payload
+
+
+def _con_idempotencia(headers, idempotency_key):
+    """
+    Idempotency-Key de Resend: el mismo key (dentro de 24 h) no manda el email
+    otra vez, devuelve el id del primero. Hace seguro reintentar un envío que
+    pudo haber salido (timeout, corte antes de registrarlo).
+    """
+    if not idempotency_key:
+        return headers
+    return {**headers, "Idempotency-Key": idempotency_key}
+
+
+def _id_email(resp):
+    try:
+        return resp.json().get("id")
+    except ValueError:
+        return None
+
+
+def send_email(to: str, subject: str, body: str, html: str = None, idempotency_key: str = None):
+    """Envía un email (texto y, opcional, HTML). Devuelve el id que asignó Resend."""
+    from_header, headers = _config()
+    payload = _payload(from_header, to, subject, body, html)
+
+    resp = _post(RESEND_URL, "emails", _con_idempotencia(headers, idempotency_key), payload)
+
+    if resp.status_code >= 300:
+        raise ResendError(resp.status_code, resp.text)
+    return _id_email(resp)
+
+
+# =========================================================
+# Versión async (modo ASGI)
+# =========================================================
+def get_async_client():
+    """httpx.AsyncClient compartido (keep-alive). Se crea dentro del event loop."""
+    global _async_client
+    if _async_client is None:
+        import httpx
+        pool = int(os.getenv("MAIL_HTTP_POOL", "10"))
+        _async_client = httpx.AsyncClient(
+            timeout=_timeout(),
+            limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool),
+        )
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def send_email_async(to: str, subject: str, body: str, html: str = None, idempotency_key: str = None):
+    from_header, headers = _config()
+    payload = _payload(from_header, to, subject, body, html)
 
-    resp = requests.post(url, headers=headers, json=payload, timeout=30)
+    resp = await _post_async(RESEND_URL, "emails", _con_idempotencia(headers, idempotency_key), payload)
 
     if resp.status_code >= 300:
-        raise RuntimeError(f"Resend error {resp.status_code}: {resp.text}")
\ No newline at end of file
+        raise ResendError(resp.status_code, resp.text)
+    return _id_email(resp)
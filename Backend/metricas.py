@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# =========================================================
+# Métricas en formato texto de Prometheus (GET /api/metrics)
+#
+# Registro propio y chico (sin prometheus_client): histogramas y contadores
+# con labels, en memoria del proceso. Con varios workers de gunicorn cada
+# uno expone lo suyo; Prometheus los junta por instancia.
+# =========================================================
+METRICS_SLOW_MS = float(os.getenv("METRICS_SLOW_MS", "0"))  # > 0: loguea requests más lentos que esto
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_DB = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+BUCKETS_EXTERNO = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+_registro = []
+
+
+def _fmt_labels(nombres, valores, extra=None):
+    pares = list(zip(nombres, valores)) + (extra or [])
+    if not pares:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+
+def _fmt_num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, labels=()):
+        self.nombre, self.ayuda, self.labels = nombre, ayuda, tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def inc(self, n=1, **labels):
+        clave = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + n
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for clave, v in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_fmt_labels(self.labels, clave)} {_fmt_num(v)}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, labels=(), buckets=BUCKETS_HTTP):
+        self.nombre, self.ayuda, self.labels = nombre, ayuda, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # clave -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor, **labels):
+        clave = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            s = self._series.get(clave)
+            if s is None:
+                s = self._series[clave] = [0] * len(self.buckets) + [0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    s[i] += 1
+            s[-2] += valor
+            s[-1] += 1
+
+    @contextmanager
+    def medir(self, **labels):
+        """with hist.medir(op="select"): ...  (labels se pueden completar adentro del bloque)"""
+        t0 = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observar(time.perf_counter() - t0, **labels)
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for clave, s in sorted(self._series.items()):
+                for i, limite in enumerate(self.buckets):
+                    lbl = _fmt_labels(self.labels, clave, [("le", _fmt_num(float(limite)))])
+                    lineas.append(f"{self.nombre}_bucket{lbl} {s[i]}")
+                lbl = _fmt_labels(self.labels, clave, [("le", "+Inf")])
+                lineas.append(f"{self.nombre}_bucket{lbl} {s[-1]}")
+                lineas.append(f"{self.nombre}_sum{_fmt_labels(self.labels, clave)} {_fmt_num(s[-2])}")
+                lineas.append(f"{self.nombre}_count{_fmt_labels(self.labels, clave)} {s[-1]}")
+        return lineas
+
+
+def exportar():
+    lineas = []
+    for m in _registro:
+        lineas.extend(m.exportar())
+    return "\n".join(lineas) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# =========================================================
+# Métricas de la app
+# =========================================================
+http_duracion = Histograma(
+    "http_request_duration_seconds", "Latencia de requests HTTP por ruta.",
+    ("method", "route", "status"), BUCKETS_HTTP,
+)
+db_duracion = Histograma(
+    "db_query_duration_seconds", "Duración de cursor.execute/executemany por tipo de sentencia.",
+    ("op",), BUCKETS_DB,
+)
+groq_duracion = Histograma(
+    "groq_request_duration_seconds", "Duración de llamadas a Groq.",
+    ("model", "ok"), BUCKETS_EXTERNO,
+)
+groq_tokens = Contador(
+    "groq_tokens_total", "Tokens de Groq (usage), de entrada (prompt) y salida (completion).",
+    ("model", "tipo"),
+)
+groq_primer_token = Histograma(
+    "groq_time_to_first_token_seconds", "Hasta el primer chunk de un stream de Groq.",
+    ("model",), BUCKETS_EXTERNO,
+)
+groq_intentos = Contador(
+    "groq_attempts_total",
+    "Intentos contra Groq por resultado (ok, timeout, rate_limit, error_5xx, error_red, rechazado, respuesta_invalida).",
+    ("model", "resultado"),
+)
+groq_hedges = Contador(
+    "groq_hedged_requests_total", "Requests duplicados por latencia (hedging) y cuál respondió primero.",
+    ("model", "ganador"),
+)
+groq_circuito = Contador(
+    "groq_circuit_transitions_total", "Cambios de estado del circuit breaker por modelo.",
+    ("model", "estado"),
+)
+sqlite_espera_escritor = Histograma(
+    "sqlite_writer_wait_seconds", "Espera por el lock de escritor de SQLite (perfil produccion).",
+    (), BUCKETS_DB,
+)
+sqlite_checkpoints = Contador(
+    "sqlite_checkpoints_total", "Checkpoints del WAL del mantenimiento periódico.",
+    ("modo", "resultado"),
+)
+resend_duracion = Histograma(
+    "resend_request_duration_seconds", "Duración de requests a Resend.",
+    ("endpoint", "status"), BUCKETS_EXTERNO,
+)
+resend_emails = Contador(
+    "resend_emails_total", "Emails enviados (o intentados) por Resend.",
+    ("endpoint", "status"),
+)
+
+
+def op_sql(sql):
+    """Primera palabra de la sentencia (select/insert/update/...), para el label op."""
+    palabra = (sql or "").lstrip().split(None, 1)
+    op = palabra[0].lower() if palabra else ""
+    return op if op in ("select", "insert", "update", "delete", "with", "create", "alter", "drop", "begin") else "otro"
+
+
+def registrar_request(method, route, status, segundos):
+    http_duracion.observar(segundos, method=method, route=route, status=status)
+    if METRICS_SLOW_MS and segundos * 1000 >= METRICS_SLOW_MS:
+        print(f"🐢 Request lento: {method} {route} -> {status} en {segundos * 1000:.0f} ms")
+
+
+def registrar_uso_groq(model, usage):
+    """usage: objeto o dict con prompt_tokens / completion_tokens (puede faltar)."""
+    if usage is None:
+        return
+    get = usage.get if isinstance(usage, dict) else lambda k: getattr(usage, k, None)
+    if get("prompt_tokens"):
+        groq_tokens.inc(get("prompt_tokens"), model=model, tipo="prompt")
+    if get("completion_tokens"):
+        groq_tokens.inc(get("completion_tokens"), model=model, tipo="completion")
@@ -0,0 +1,635 @@
+from datetime import datetime
+
+from db import get_db_connection, DB_ENGINE, insert_and_get_id
+import estadisticas
+
+# =========================================================
+# Migraciones de esquema
+#
+#   python migraciones.py
+#
+# Cada migración corre una sola vez y queda registrada en schema_migrations.
+# db_init.py las aplica después de crear las tablas base.
+#
+# Postgres y SQLite corren cada migración en una transacción (DDL incluido;
+# en SQLite con un BEGIN explícito: el módulo sqlite3 no abre transacción
+# antes de un CREATE/ALTER, y sin él cada uno se confirmaba solo). MySQL no: cada CREATE/ALTER se confirma solo y una migración que falla a
+# mitad queda a medias. Por eso en MySQL cada paso es idempotente (IF NOT
+# EXISTS, o information_schema antes: crear_indice, agregar_columna,
+# agregar_fk) y se completa volviendo a correr `python migraciones.py`.
+# =========================================================
+
+
+def _existe_mysql(cur, vista, tabla, columna, nombre):
+    """¿Hay en information_schema.<vista> una fila de la tabla con <columna> = nombre?"""
+    cur.execute(
+        f"""
+        SELECT COUNT(*) AS n FROM information_schema.{vista}
+        WHERE table_schema = DATABASE() AND table_name = %s AND {columna} = %s
+        """,
+        (tabla, nombre),
+    )
+    return cur.fetchone()["n"] > 0
+
+
+def crear_indice(cur, nombre, tabla, columnas, tipo=""):
+    """
+    CREATE INDEX idempotente. MySQL no tiene IF NOT EXISTS para índices,
+    así que ahí se consulta information_schema antes.
+    tipo: "FULLTEXT" (sólo MySQL).
+    """
+    if DB_ENGINE == "mysql":
+        if _existe_mysql(cur, "statistics", tabla, "index_name", nombre):
+            return
+        cur.execute(f"CREATE {tipo + ' ' if tipo else ''}INDEX {nombre} ON {tabla} ({columnas})")
+        return
+
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas})")
+
+
+def agregar_columna(cur, tabla, columna, definicion):
+    """
+    ALTER TABLE ... ADD COLUMN. En MySQL, sólo si la columna no existe (para
+    poder re-correr una migración que quedó a medias). Postgres y SQLite la
+    agregan directo: ahí la migración entera se deshace si falla.
+    """
+    if DB_ENGINE == "mysql" and _existe_mysql(cur, "columns", tabla, "column_name", columna):
+        return
+    cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+def agregar_fk(cur, tabla, nombre, definicion):
+    """ADD CONSTRAINT ... FOREIGN KEY idempotente (sólo MySQL; ver agregar_columna)."""
+    if _existe_mysql(cur, "table_constraints", tabla, "constraint_name", nombre):
+        return
+    cur.execute(f"ALTER TABLE {tabla} ADD CONSTRAINT {nombre} FOREIGN KEY {definicion}")
+
+
+def _es_pg():
+    return DB_ENGINE in ("postgres", "postgresql")
+
+
+# =========================================================
+# Migraciones
+# =========================================================
+def m0001_fecha_aviso(cur):
+    """
+    fecha_aviso = fecha_fin - dias_aviso, como columna generada (se calcula
+    sola en INSERT/UPDATE y al agregarla se completa para las filas existentes).
+    Más el índice para el selector de avisos: (estado, notificado_60d, fecha_fin).
+    """
+    if DB_ENGINE == "mysql":
+        agregar_columna(
+            cur, "contratos", "fecha_aviso",
+            "DATE GENERATED ALWAYS AS (DATE_SUB(fecha_fin, INTERVAL dias_aviso DAY)) STORED",
+        )
+    elif _es_pg():
+        cur.execute("""
+            ALTER TABLE contratos ADD COLUMN fecha_aviso DATE
+                GENERATED ALWAYS AS (fecha_fin - dias_aviso) STORED
+        """)
+    else:
+        # SQLite sólo permite agregar columnas generadas VIRTUAL (igual se pueden indexar)
+        cur.execute("""
+            ALTER TABLE contratos ADD COLUMN fecha_aviso TEXT
+                GENERATED ALWAYS AS (date(fecha_fin, '-' || dias_aviso || ' days')) VIRTUAL
+        """)
+
+    crear_indice(cur, "idx_contratos_estado_notif_fin", "contratos", "estado, notificado_60d, fecha_fin")
+    crear_indice(cur, "idx_contratos_fecha_aviso", "contratos", "fecha_aviso")
+
+
+def borrar_indice(cur, nombre, tabla):
+    if DB_ENGINE == "mysql":
+        if _existe_mysql(cur, "statistics", tabla, "index_name", nombre):
+            cur.execute(f"DROP INDEX {nombre} ON {tabla}")
+        return
+
+    cur.execute(f"DROP INDEX IF EXISTS {nombre}")
+
+
+def m0002_notificaciones_log(cur):
+    """
+    Avisos por etapas (90/60/30/7...): cada envío queda en notificaciones_log,
+    uno por (contrato, etapa). El selector pasa a ser un rango sobre
+    (estado, fecha_aviso), que reemplaza a los dos índices de 0001.
+    """
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_log (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                contrato_id INT NOT NULL,
+                etapa INT NOT NULL,
+                dias_restantes INT NULL,
+                destinos VARCHAR(512) NULL,
+                enviado_en DATETIME NOT NULL,
+                UNIQUE KEY uq_notificaciones_log_contrato_etapa (contrato_id, etapa)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+    elif _es_pg():
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_log (
+                id SERIAL PRIMARY KEY,
+                contrato_id INT NOT NULL,
+                etapa INT NOT NULL,
+                dias_restantes INT NULL,
+                destinos VARCHAR(512) NULL,
+                enviado_en TIMESTAMP NOT NULL,
+                CONSTRAINT uq_notificaciones_log_contrato_etapa UNIQUE (contrato_id, etapa)
+            );
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                contrato_id INTEGER NOT NULL,
+                etapa INTEGER NOT NULL,
+                dias_restantes INTEGER NULL,
+                destinos TEXT NULL,
+                enviado_en TEXT NOT NULL,
+                UNIQUE (contrato_id, etapa)
+            );
+        """)
+
+    crear_indice(cur, "idx_contratos_estado_fecha_aviso", "contratos", "estado, fecha_aviso")
+    borrar_indice(cur, "idx_contratos_estado_notif_fin", "contratos")
+    borrar_indice(cur, "idx_contratos_fecha_aviso", "contratos")
+
+
+def m0003_versiones_tabla(cur):
+    """Contador por tabla para ETags de los listados (http_cache.py)."""
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS versiones_tabla (
+                tabla VARCHAR(64) NOT NULL,
+                version BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (tabla)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        cur.execute("INSERT IGNORE INTO versiones_tabla (tabla, version) VALUES ('contratos', 0)")
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS versiones_tabla (
+                tabla VARCHAR(64) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            );
+        """)
+        cur.execute("INSERT INTO versiones_tabla (tabla, version) VALUES ('contratos', 0) ON CONFLICT (tabla) DO NOTHING")
+
+
+def m0004_tenants(cur):
+    """
+    Multi-tenant por inmobiliaria: tabla tenants, contratos.tenant_id (FK) y
+    los índices de contratos pasan a empezar por tenant_id.
+    Backfill: un tenant por slug de inmobiliaria ("default" para las vacías).
+    """
+    from tenants import slug, SLUG_DEFAULT
+
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS tenants (
+                id INT NOT NULL AUTO_INCREMENT,
+                slug VARCHAR(120) NOT NULL,
+                nombre VARCHAR(255) NULL,
+                creado_en DATETIME NOT NULL,
+                PRIMARY KEY (id),
+                UNIQUE KEY uq_tenants_slug (slug)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        agregar_columna(cur, "contratos", "tenant_id", "INT NULL")
+        agregar_fk(cur, "contratos", "fk_contratos_tenant", "(tenant_id) REFERENCES tenants (id)")
+    elif _es_pg():
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS tenants (
+                id SERIAL PRIMARY KEY,
+                slug VARCHAR(120) NOT NULL UNIQUE,
+                nombre VARCHAR(255) NULL,
+                creado_en TIMESTAMP NOT NULL
+            );
+        """)
+        cur.execute("ALTER TABLE contratos ADD COLUMN tenant_id INT NULL REFERENCES tenants (id)")
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS tenants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                slug TEXT NOT NULL UNIQUE,
+                nombre TEXT NULL,
+                creado_en TEXT NOT NULL
+            );
+        """)
+        # SQLite no permite agregar NOT NULL sin default: la app siempre lo completa
+        cur.execute("ALTER TABLE contratos ADD COLUMN tenant_id INTEGER NULL REFERENCES tenants (id)")
+
+    marca = "%s" if DB_ENGINE == "mysql" or _es_pg() else "?"
+
+    def _tenant(valor, nombre):
+        cur.execute(f"SELECT id FROM tenants WHERE slug = {marca}", (valor,))
+        row = cur.fetchone()
+        if row:
+            return row["id"]
+        return insert_and_get_id(
+            cur,
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (%s, %s, %s)",
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (%s, %s, %s) RETURNING id",
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (?, ?, ?)",
+            (valor, nombre, datetime.now()),
+        )
+
+    _tenant(SLUG_DEFAULT, "Sin inmobiliaria")
+
+    # índice temporal: un UPDATE por inmobiliaria distinta, cada uno un rango
+    crear_indice(cur, "idx_contratos_inmobiliaria_tmp", "contratos", "inmobiliaria")
+    cur.execute("SELECT DISTINCT inmobiliaria FROM contratos")
+    for r in cur.fetchall():
+        nombre = r["inmobiliaria"]
+        tenant_id = _tenant(slug(nombre), nombre or "Sin inmobiliaria")
+        if nombre is None:
+            cur.execute(f"UPDATE contratos SET tenant_id = {marca} WHERE inmobiliaria IS NULL", (tenant_id,))
+        else:
+            cur.execute(
+                f"UPDATE contratos SET tenant_id = {marca} WHERE inmobiliaria = {marca}", (tenant_id, nombre),
+            )
+    borrar_indice(cur, "idx_contratos_inmobiliaria_tmp", "contratos")
+
+    if DB_ENGINE == "mysql":
+        cur.execute("ALTER TABLE contratos MODIFY tenant_id INT NOT NULL")
+    elif _es_pg():
+        cur.execute("ALTER TABLE contratos ALTER COLUMN tenant_id SET NOT NULL")
+
+    # listados (keyset por fecha_fin, id), export (por id) y selector de avisos
+    crear_indice(cur, "idx_contratos_tenant_fecha_fin_id", "contratos", "tenant_id, fecha_fin, id")
+    crear_indice(cur, "idx_contratos_tenant_id", "contratos", "tenant_id, id")
+    crear_indice(cur, "idx_contratos_tenant_estado_fecha_aviso", "contratos", "tenant_id, estado, fecha_aviso")
+    borrar_indice(cur, "idx_contratos_fecha_fin_id", "contratos")
+    borrar_indice(cur, "idx_contratos_estado_fecha_aviso", "contratos")
+
+
+SQL_FTS_COLUMNAS = "inquilino, propietario, inmobiliaria, texto_contrato"
+
+
+def m0005_busqueda(cur):
+    """
+    Texto original del contrato (texto_contrato) y un índice de texto completo
+    nativo sobre partes + texto, sin tildes (ver busqueda.py).
+    """
+    if DB_ENGINE == "mysql":
+        agregar_columna(cur, "contratos", "texto_contrato", "MEDIUMTEXT NULL")
+        crear_indice(cur, "ft_contratos_busqueda", "contratos", SQL_FTS_COLUMNAS, tipo="FULLTEXT")
+        return
+
+    if _es_pg():
+        cur.execute("ALTER TABLE contratos ADD COLUMN texto_contrato TEXT NULL")
+        # configuración spanish que además saca tildes (unaccent antes del stemmer)
+        cur.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+                    CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+                    ALTER TEXT SEARCH CONFIGURATION es_unaccent
+                        ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+                END IF;
+            END
+            $$;
+        """)
+        cur.execute("""
+            ALTER TABLE contratos ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('es_unaccent', coalesce(inquilino, '')), 'A') ||
+                setweight(to_tsvector('es_unaccent', coalesce(propietario, '')), 'A') ||
+                setweight(to_tsvector('es_unaccent', coalesce(inmobiliaria, '')), 'B') ||
+                setweight(to_tsvector('es_unaccent', coalesce(texto_contrato, '')), 'C')
+            ) STORED
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_contratos_busqueda ON contratos USING GIN (busqueda)")
+        return
+
+    # SQLite: FTS5 con contenido externo (no duplica el texto), sincronizada por triggers
+    cur.execute("ALTER TABLE contratos ADD COLUMN texto_contrato TEXT NULL")
+    cur.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS contratos_fts USING fts5(
+            {SQL_FTS_COLUMNAS},
+            content='contratos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    nuevos = ", ".join(f"new.{c.strip()}" for c in SQL_FTS_COLUMNAS.split(","))
+    viejos = ", ".join(f"old.{c.strip()}" for c in SQL_FTS_COLUMNAS.split(","))
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS contratos_fts_ai AFTER INSERT ON contratos BEGIN
+            INSERT INTO contratos_fts (rowid, {SQL_FTS_COLUMNAS}) VALUES (new.id, {nuevos});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS contratos_fts_ad AFTER DELETE ON contratos BEGIN
+            INSERT INTO contratos_fts (contratos_fts, rowid, {SQL_FTS_COLUMNAS}) VALUES ('delete', old.id, {viejos});
+        END
+    """)
+    # sólo si cambian columnas indexadas (no en cada aviso o renovación)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS contratos_fts_au AFTER UPDATE OF {SQL_FTS_COLUMNAS} ON contratos BEGIN
+            INSERT INTO contratos_fts (contratos_fts, rowid, {SQL_FTS_COLUMNAS}) VALUES ('delete', old.id, {viejos});
+            INSERT INTO contratos_fts (rowid, {SQL_FTS_COLUMNAS}) VALUES (new.id, {nuevos});
+        END
+    """)
+    cur.execute("INSERT INTO contratos_fts (contratos_fts) VALUES ('rebuild')")
+
+
+def m0006_partes(cur):
+    """
+    Partes normalizadas (partes.py): personas e inmobiliarias por tenant, su
+    índice de bloqueo y los ids en contratos. Las filas existentes se vinculan
+    aparte con `python partes.py` (puede tardar en tablas grandes).
+    """
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS partes (
+                id INT NOT NULL AUTO_INCREMENT,
+                tenant_id INT NOT NULL,
+                tipo VARCHAR(20) NOT NULL,
+                nombre VARCHAR(255) NOT NULL,
+                clave VARCHAR(255) NOT NULL,
+                creado_en DATETIME NOT NULL,
+                PRIMARY KEY (id),
+                UNIQUE KEY uq_partes_tenant_tipo_clave (tenant_id, tipo, clave),
+                CONSTRAINT fk_partes_tenant FOREIGN KEY (tenant_id) REFERENCES tenants (id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS partes_bloques (
+                tenant_id INT NOT NULL,
+                bloque VARCHAR(120) NOT NULL,
+                parte_id INT NOT NULL,
+                PRIMARY KEY (tenant_id, bloque, parte_id),
+                KEY idx_partes_bloques_parte (parte_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+        """)
+        for rol in ("inquilino", "propietario", "inmobiliaria"):
+            agregar_columna(cur, "contratos", f"{rol}_id", "INT NULL")
+            agregar_fk(cur, "contratos", f"fk_contratos_{rol}", f"({rol}_id) REFERENCES partes (id)")
+    else:
+        serial = "SERIAL PRIMARY KEY" if _es_pg() else "INTEGER PRIMARY KEY AUTOINCREMENT"
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS partes (
+                id {serial},
+                tenant_id INT NOT NULL REFERENCES tenants (id),
+                tipo VARCHAR(20) NOT NULL,
+                nombre VARCHAR(255) NOT NULL,
+                clave VARCHAR(255) NOT NULL,
+                creado_en TIMESTAMP NOT NULL,
+                UNIQUE (tenant_id, tipo, clave)
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS partes_bloques (
+                tenant_id INT NOT NULL,
+                bloque VARCHAR(120) NOT NULL,
+                parte_id INT NOT NULL,
+                PRIMARY KEY (tenant_id, bloque, parte_id)
+            );
+        """)
+        crear_indice(cur, "idx_partes_bloques_parte", "partes_bloques", "parte_id")
+        for columna in ("inquilino_id", "propietario_id", "inmobiliaria_id"):
+            cur.execute(f"ALTER TABLE contratos ADD COLUMN {columna} INT NULL REFERENCES partes (id)")
+
+    # contratos de una parte (agregados, duplicados)
+    crear_indice(cur, "idx_contratos_tenant_inquilino", "contratos", "tenant_id, inquilino_id")
+    crear_indice(cur, "idx_contratos_tenant_propietario", "contratos", "tenant_id, propietario_id")
+
+
+def m0007_resumen(cur):
+    """
+    Resumen incremental para GET /api/contracts/stats (estadisticas.py): contratos
+    por (tenant, día de fecha_fin, decisión). Se llena desde contratos acá y
+    después lo mantienen las escrituras.
+    """
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS contratos_resumen (
+                tenant_id INT NOT NULL,
+                fecha_fin DATE NOT NULL,
+                decision VARCHAR(30) NOT NULL,
+                cantidad INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, fecha_fin, decision),
+                CONSTRAINT fk_contratos_resumen_tenant FOREIGN KEY (tenant_id) REFERENCES tenants (id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS contratos_resumen (
+                tenant_id INT NOT NULL REFERENCES tenants (id),
+                fecha_fin DATE NOT NULL,
+                decision VARCHAR(30) NOT NULL,
+                cantidad INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, fecha_fin, decision)
+            );
+        """)
+    estadisticas.reconstruir(cur)
+
+
+def m0008_actualizado_en_us(cur):
+    """
+    contratos.actualizado_en es la versión de la fila para la concurrencia
+    optimista de PATCH /api/contracts/renewal: en MySQL pasa a microsegundos
+    (DATETIME redondea al segundo y dos cambios en el mismo segundo no se
+    distinguirían). Postgres (TIMESTAMP) y SQLite (texto) ya la guardan completa.
+    """
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            ALTER TABLE contratos MODIFY actualizado_en DATETIME(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+        """)
+
+
+def m0009_notificaciones_envios(cur):
+    """
+    Estado de entrega por destinatario. Cada corrida agrupa los avisos de un
+    destinatario en un solo email (digest): una fila en notificaciones_envios
+    con el mensaje ya renderizado, su estado (pendiente/enviado/fallido) y una
+    clave de idempotencia única; notificaciones_items dice qué (contrato, etapa)
+    lleva cada envío. Un (contrato, etapa, destinatario) está en un solo envío.
+    """
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_envios (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                tenant_id INT NOT NULL,
+                destinatario VARCHAR(255) NOT NULL,
+                clave CHAR(64) NOT NULL,
+                asunto VARCHAR(255) NOT NULL,
+                texto MEDIUMTEXT NOT NULL,
+                html MEDIUMTEXT NOT NULL,
+                estado VARCHAR(16) NOT NULL DEFAULT 'pendiente',
+                intentos INT NOT NULL DEFAULT 0,
+                proveedor_id VARCHAR(100) NULL,
+                error VARCHAR(512) NULL,
+                creado_en DATETIME NOT NULL,
+                enviado_en DATETIME NULL,
+                UNIQUE KEY uq_notificaciones_envios_clave (clave)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_items (
+                contrato_id INT NOT NULL,
+                etapa INT NOT NULL,
+                destinatario VARCHAR(255) NOT NULL,
+                clave_envio CHAR(64) NOT NULL,
+                rol VARCHAR(16) NOT NULL,
+                dias_restantes INT NULL,
+                PRIMARY KEY (contrato_id, etapa, destinatario)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+    elif _es_pg():
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_envios (
+                id SERIAL PRIMARY KEY,
+                tenant_id INT NOT NULL,
+                destinatario VARCHAR(255) NOT NULL,
+                clave CHAR(64) NOT NULL,
+                asunto VARCHAR(255) NOT NULL,
+                texto TEXT NOT NULL,
+                html TEXT NOT NULL,
+                estado VARCHAR(16) NOT NULL DEFAULT 'pendiente',
+                intentos INT NOT NULL DEFAULT 0,
+                proveedor_id VARCHAR(100) NULL,
+                error VARCHAR(512) NULL,
+                creado_en TIMESTAMP NOT NULL,
+                enviado_en TIMESTAMP NULL,
+                CONSTRAINT uq_notificaciones_envios_clave UNIQUE (clave)
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_items (
+                contrato_id INT NOT NULL,
+                etapa INT NOT NULL,
+                destinatario VARCHAR(255) NOT NULL,
+                clave_envio CHAR(64) NOT NULL,
+                rol VARCHAR(16) NOT NULL,
+                dias_restantes INT NULL,
+                PRIMARY KEY (contrato_id, etapa, destinatario)
+            );
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_envios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant_id INTEGER NOT NULL,
+                destinatario TEXT NOT NULL,
+                clave TEXT NOT NULL UNIQUE,
+                asunto TEXT NOT NULL,
+                texto TEXT NOT NULL,
+                html TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                proveedor_id TEXT NULL,
+                error TEXT NULL,
+                creado_en TEXT NOT NULL,
+                enviado_en TEXT NULL
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificaciones_items (
+                contrato_id INTEGER NOT NULL,
+                etapa INTEGER NOT NULL,
+                destinatario TEXT NOT NULL,
+                clave_envio TEXT NOT NULL,
+                rol TEXT NOT NULL,
+                dias_restantes INTEGER NULL,
+                PRIMARY KEY (contrato_id, etapa, destinatario)
+            );
+        """)
+
+    # los pendientes/fallidos de un tenant (cada corrida) y los items de un envío
+    crear_indice(cur, "idx_notificaciones_envios_tenant_estado", "notificaciones_envios", "tenant_id, estado")
+    crear_indice(cur, "idx_notificaciones_items_clave_envio", "notificaciones_items", "clave_envio")
+
+
+def m0010_items_roles(cur):
+    """
+    notificaciones_items.rol guarda los roles del destinatario en ese contrato,
+    separados por coma ("inquilino,propietario" si los dos tienen su email).
+    """
+    if DB_ENGINE == "mysql":
+        cur.execute("ALTER TABLE notificaciones_items MODIFY rol VARCHAR(40) NOT NULL")
+    elif _es_pg():
+        cur.execute("ALTER TABLE notificaciones_items ALTER COLUMN rol TYPE VARCHAR(40)")
+
+
+# (version, función) en orden. No renombrar ni reordenar las ya aplicadas.
+MIGRACIONES = [
+    ("0001_fecha_aviso", m0001_fecha_aviso),
+    ("0002_notificaciones_log", m0002_notificaciones_log),
+    ("0003_versiones_tabla", m0003_versiones_tabla),
+    ("0004_tenants", m0004_tenants),
+    ("0005_busqueda", m0005_busqueda),
+    ("0006_partes", m0006_partes),
+    ("0007_resumen", m0007_resumen),
+    ("0008_actualizado_en_us", m0008_actualizado_en_us),
+    ("0009_notificaciones_envios", m0009_notificaciones_envios),
+    ("0010_items_roles", m0010_items_roles),
+]
+
+
+def _crear_tabla_migraciones(cur):
+    if DB_ENGINE == "mysql":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(100) NOT NULL,
+                aplicada_en DATETIME NOT NULL,
+                PRIMARY KEY (version)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(100) PRIMARY KEY,
+                aplicada_en TIMESTAMP NOT NULL
+            );
+        """)
+
+
+def aplicar_migraciones(conn):
+    """
+    Aplica las migraciones pendientes. En Postgres y SQLite, una transacción
+    por migración: si falla no queda nada. En MySQL el DDL se confirma solo y
+    el rollback no deshace lo ya hecho: lo aplicado queda y la migración se
+    termina corriéndola otra vez (ver el encabezado).
+    """
+    cur = conn.cursor()
+    _crear_tabla_migraciones(cur)
+    conn.commit()
+
+    cur.execute("SELECT version FROM schema_migrations")
+    aplicadas = {r["version"] for r in cur.fetchall()}
+
+    nuevas = []
+    for version, fn in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        try:
+            if DB_ENGINE != "mysql" and not _es_pg():
+                cur.execute("BEGIN")
+            fn(cur)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, aplicada_en) VALUES (%s, %s)"
+                if DB_ENGINE == "mysql" or _es_pg()
+                else "INSERT INTO schema_migrations (version, aplicada_en) VALUES (?, ?)",
+                (version, datetime.now()),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        nuevas.append(version)
+        print(f"Migración aplicada: {version}")
+
+    cur.close()
+    return nuevas
+
+
+if __name__ == "__main__":
+    conn = get_db_connection()
+    try:
+        aplicadas = aplicar_migraciones(conn)
+    finally:
+        conn.close()
+    print(f"{len(aplicadas)} migraciones aplicadas.")
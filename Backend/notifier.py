@@ -0,0 +1,142 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from mailer import send_email, send_email_async
+
+NOTIF_WORKERS = int(os.getenv("NOTIF_WORKERS", "4"))      # envíos en paralelo
+NOTIF_LOTE = int(os.getenv("NOTIF_LOTE", "50"))           # envíos por lote (= un commit)
+
+# =========================================================
+# Motor de envío de digests
+#
+# Un envío es un email ya renderizado para un destinatario (con todos sus
+# contratos) y una clave de idempotencia: ver app.armar_envios. Cada envío sale
+# en su propio request a Resend con esa clave, así que:
+# - un destinatario que falla no arrastra a los demás
+# - reintentar (en la misma corrida o en la próxima) no duplica emails
+# No se usa /emails/batch: la clave de idempotencia de Resend cubre el request
+# entero, y un batch rechazado no dice qué destinatario falló.
+# =========================================================
+
+
+def _resultado(envio, proveedor_id=None, error=None):
+    return {"envio": envio, "ok": error is None, "proveedor_id": proveedor_id, "error": error}
+
+
+def _enviar(envio):
+    try:
+        proveedor_id = send_email(
+            to=envio["destinatario"],
+            subject=envio["asunto"],
+            body=envio["texto"],
+            html=envio["html"],
+            idempotency_key=envio["clave"],
+        )
+    except Exception as e:
+        return _resultado(envio, error=f"error_envio: {repr(e)}")
+    return _resultado(envio, proveedor_id=proveedor_id)
+
+
+def _registrar(on_lote, lote):
+    """
+    Persiste un lote de resultados. Si falla, los emails ya salieron pero no
+    quedaron registrados: se reportan como error_registro (la próxima corrida
+    los reintenta con la misma clave y Resend no los vuelve a mandar).
+    """
+    try:
+        on_lote(lote)
+        return lote
+    except Exception as e:
+        return [_resultado(r["envio"], error=f"error_registro: {repr(e)}") for r in lote]
+
+
+def despachar_envios(envios, on_lote, workers=None, tam_lote=None, on_progreso=None):
+    """
+    envios: [{"destinatario", "clave", "asunto", "texto", "html", ...}]
+    on_lote(resultados): se llama en el thread que invoca cada `tam_lote`
+        envíos terminados (y con el resto al final), para persistir y commitear
+        su estado. Si el proceso se corta a mitad de camino, lo registrado queda.
+    on_progreso(exitosos, fallidos): opcional, acumulados después de cada lote.
+
+    Devuelve [{"envio", "ok", "proveedor_id", "error"}, ...].
+    """
+    workers = max(1, workers or NOTIF_WORKERS)
+    tam_lote = max(1, tam_lote or NOTIF_LOTE)
+
+    resultados, lote = [], []
+    if not envios:
+        return resultados
+
+    def cerrar_lote():
+        resultados.extend(_registrar(on_lote, lote))
+        lote.clear()
+        if on_progreso:
+            exitosos = sum(1 for r in resultados if r["ok"])
+            on_progreso(exitosos, len(resultados) - exitosos)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notif") as pool:
+        futuros = [pool.submit(_enviar, e) for e in envios]
+        for fut in as_completed(futuros):
+            lote.append(fut.result())
+            if len(lote) >= tam_lote:
+                cerrar_lote()
+    if lote:
+        cerrar_lote()
+
+    return resultados
+
+
+# =========================================================
+# Versión async (modo ASGI): mismo criterio, sin threads
+# =========================================================
+async def _enviar_async(envio):
+    try:
+        proveedor_id = await send_email_async(
+            to=envio["destinatario"],
+            subject=envio["asunto"],
+            body=envio["texto"],
+            html=envio["html"],
+            idempotency_key=envio["clave"],
+        )
+    except Exception as e:
+        return _resultado(envio, error=f"error_envio: {repr(e)}")
+    return _resultado(envio, proveedor_id=proveedor_id)
+
+
+async def _registrar_async(on_lote, lote):
+    try:
+        await on_lote(lote)
+        return lote
+    except Exception as e:
+        return [_resultado(r["envio"], error=f"error_registro: {repr(e)}") for r in lote]
+
+
+async def despachar_envios_async(envios, on_lote, workers=None, tam_lote=None):
+    """
+    Igual que despachar_envios, con on_lote async. `workers` acota cuántos
+    envíos hay en vuelo a la vez.
+    """
+    workers = max(1, workers or NOTIF_WORKERS)
+    tam_lote = max(1, tam_lote or NOTIF_LOTE)
+
+    resultados, lote = [], []
+    if not envios:
+        return resultados
+
+    sem = asyncio.Semaphore(workers)
+
+    async def _con_limite(envio):
+        async with sem:
+            return await _enviar_async(envio)
+
+    tareas = [asyncio.ensure_future(_con_limite(e)) for e in envios]
+    for fut in asyncio.as_completed(tareas):
+        lote.append(await fut)
+        if len(lote) >= tam_lote:
+            resultados.extend(await _registrar_async(on_lote, lote))
+            lote = []
+    if lote:
+        resultados.extend(await _registrar_async(on_lote, lote))
+
+    return resultados
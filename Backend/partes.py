@@ -0,0 +1,308 @@
+import os
+import re
+import argparse
+import unicodedata
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from db import db_connection, adaptar_sql, ejecutar, ejecutar_many, empezar_transaccion
+
+# =========================================================
+# Partes normalizadas (personas e inmobiliarias)
+#
+# La IA devuelve nombres como texto libre: "Juan Pérez", "PEREZ, JUAN" y
+# "Juan Perez" son la misma persona. Cada nombre se normaliza a una clave
+# (tokens sin tildes, ordenados) y se vincula a una fila de `partes`:
+# 1. misma clave en el tenant -> esa parte (UNIQUE tenant_id, tipo, clave)
+# 2. si no, candidatos por bloques (claves fonéticas en partes_bloques, rango
+#    por (tenant_id, bloque)) y similitud >= PARTES_UMBRAL -> la más parecida
+# 3. si no, parte nueva con sus bloques
+# Nunca se compara contra todas las partes: sólo contra las que comparten bloque.
+#
+#   python partes.py --tenant inmobiliaria-sur          vincula filas sin parte
+#   python partes.py --desde-cero                       re-agrupa todo
+# =========================================================
+PARTES_UMBRAL = float(os.getenv("PARTES_UMBRAL", "0.85"))       # similitud mínima para unir
+PARTES_CANDIDATOS = int(os.getenv("PARTES_CANDIDATOS", "50"))   # candidatos a puntuar por nombre
+
+TIPOS = ("persona", "inmobiliaria")
+# columna de contratos -> (tipo de parte, columna con el id)
+COLUMNAS = {
+    "inquilino": ("persona", "inquilino_id"),
+    "propietario": ("persona", "propietario_id"),
+    "inmobiliaria": ("inmobiliaria", "inmobiliaria_id"),
+}
+
+TRATAMIENTOS = {"sr", "sra", "srta", "senor", "senora", "don", "dona", "dr", "dra", "lic", "ing", "arq", "cp"}
+PARTICULAS = {"de", "del", "la", "las", "los", "y", "e"}
+SOCIETARIOS = {"sa", "srl", "sas", "sh", "sociedad", "anonima", "responsabilidad", "limitada", "cia", "co"}
+
+
+def tokens(nombre, tipo="persona"):
+    """'PÉREZ, Juan (Sr.)' -> ['juan', 'perez'] sin tildes, tratamientos ni partículas."""
+    s = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode().lower()
+    # "s.a." / "s.r.l." -> "sa" / "srl" antes de separar por puntuación
+    s = re.sub(r"\b((?:[a-z]\.){2,})", lambda m: m.group(1).replace(".", ""), s)
+    fuera = PARTICULAS | (TRATAMIENTOS if tipo == "persona" else SOCIETARIOS)
+    return [t for t in re.findall(r"[a-z0-9]+", s) if t not in fuera]
+
+
+def clave(toks):
+    return " ".join(sorted(toks))[:255]
+
+
+def fonetico(token):
+    """
+    Código fonético simple para español: igual para grafías que suenan igual
+    (v/b, z/s/ce/ci, ll/y, h muda, qu/k/ca...) y sin vocales salvo la inicial.
+    perez/peres -> PRS, gonzalez/gonsales -> GNSLS.
+    """
+    s = token
+    for a, b in (
+        ("ch", "X"), ("ll", "y"), ("qu", "k"), ("gue", "ge"), ("gui", "gi"),
+        ("ce", "se"), ("ci", "si"), ("ge", "je"), ("gi", "ji"),
+    ):
+        s = s.replace(a, b)
+    s = s.translate(str.maketrans({"v": "b", "w": "b", "z": "s", "c": "k", "q": "k", "x": "s", "h": None}))
+    if not s:
+        return ""
+    cuerpo = re.sub(r"[aeiouy]", "", s[1:])
+    codigo = (s[0] + cuerpo).upper()
+    return re.sub(r"(.)\1+", r"\1", codigo)
+
+
+def bloques(tipo, toks):
+    """Claves de bloqueo: una por token (fonético) y una del nombre completo."""
+    fon = sorted({fonetico(t) for t in toks if len(t) >= 2} - {""})
+    pre = tipo[0]
+    out = {f"{pre}t|{f}" for f in fon}
+    if fon:
+        out.add(f"{pre}n|{' '.join(fon)}")
+    return sorted(b[:120] for b in out)
+
+
+def similitud(clave_a, clave_b):
+    return SequenceMatcher(None, clave_a, clave_b).ratio()
+
+
+# =========================================================
+# Vincular (con el cursor de la transacción que guarda el contrato)
+# =========================================================
+def _por_clave(cur, tenant_id, tipo, k):
+    cur.execute(
+        adaptar_sql("SELECT id FROM partes WHERE tenant_id = %s AND tipo = %s AND clave = %s"),
+        (tenant_id, tipo, k),
+    )
+    row = cur.fetchone()
+    return row.get("id") if row else None
+
+
+def candidatos(cur, tenant_id, tipo, toks, limite=None):
+    """[(parte_id, nombre, clave)] que comparten más bloques con el nombre (rango por índice)."""
+    bl = bloques(tipo, toks)
+    if not bl:
+        return []
+    marcas = ", ".join(["%s"] * len(bl))
+    cur.execute(
+        adaptar_sql(f"""
+            SELECT p.id, p.nombre, p.clave
+            FROM (
+                SELECT parte_id, COUNT(*) AS n
+                FROM partes_bloques
+                WHERE tenant_id = %s AND bloque IN ({marcas})
+                GROUP BY parte_id
+                ORDER BY n DESC, parte_id ASC
+                LIMIT %s
+            ) b
+            JOIN partes p ON p.id = b.parte_id
+            WHERE p.tipo = %s
+        """),
+        (tenant_id, *bl, limite or PARTES_CANDIDATOS, tipo),
+    )
+    return [(r.get("id"), r.get("nombre"), r.get("clave")) for r in cur.fetchall()]
+
+
+def _crear(cur, tenant_id, tipo, nombre, k, toks):
+    """INSERT que no falla si otro request creó la misma clave recién; devuelve el id."""
+    ahora = datetime.now()
+    ejecutar(
+        cur,
+        "INSERT IGNORE INTO partes (tenant_id, tipo, nombre, clave, creado_en) VALUES (%s, %s, %s, %s, %s)",
+        "INSERT INTO partes (tenant_id, tipo, nombre, clave, creado_en) VALUES (%s, %s, %s, %s, %s) "
+        "ON CONFLICT (tenant_id, tipo, clave) DO NOTHING",
+        "INSERT INTO partes (tenant_id, tipo, nombre, clave, creado_en) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (tenant_id, tipo, clave) DO NOTHING",
+        (tenant_id, tipo, nombre.strip()[:255], k, ahora),
+    )
+    parte_id = _por_clave(cur, tenant_id, tipo, k)
+
+    filas = [(tenant_id, b, parte_id) for b in bloques(tipo, toks)]
+    if filas:
+        ejecutar_many(
+            cur,
+            "INSERT IGNORE INTO partes_bloques (tenant_id, bloque, parte_id) VALUES (%s, %s, %s)",
+            "INSERT INTO partes_bloques (tenant_id, bloque, parte_id) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+            "INSERT INTO partes_bloques (tenant_id, bloque, parte_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+            filas,
+        )
+    return parte_id
+
+
+def vincular(cur, tenant_id, tipo, nombre):
+    """Nombre libre -> parte_id (existente o nueva). None si el nombre está vacío."""
+    toks = tokens(nombre, tipo)
+    if not toks:
+        return None
+    k = clave(toks)
+
+    parte_id = _por_clave(cur, tenant_id, tipo, k)
+    if parte_id is not None:
+        return parte_id
+
+    mejor, puntaje = None, 0.0
+    for cand_id, _, cand_clave in candidatos(cur, tenant_id, tipo, toks):
+        p = similitud(k, cand_clave)
+        if p > puntaje:
+            mejor, puntaje = cand_id, p
+    if mejor is not None and puntaje >= PARTES_UMBRAL:
+        return mejor
+
+    return _crear(cur, tenant_id, tipo, nombre, k, toks)
+
+
+def vincular_contrato(cur, tenant_id, datos, memo=None):
+    """
+    datos: dict con inquilino/propietario/inmobiliaria (como los devuelve la IA).
+    Devuelve {"inquilino_id": ..., "propietario_id": ..., "inmobiliaria_id": ...}.
+    memo: dict opcional (tipo, nombre) -> id, para lotes con nombres repetidos.
+    """
+    out = {}
+    for campo, (tipo, columna) in COLUMNAS.items():
+        nombre = datos.get(campo)
+        if not nombre:
+            out[columna] = None
+            continue
+        if memo is not None and (tipo, nombre) in memo:
+            out[columna] = memo[(tipo, nombre)]
+            continue
+        out[columna] = vincular(cur, tenant_id, tipo, nombre)
+        if memo is not None:
+            memo[(tipo, nombre)] = out[columna]
+    return out
+
+
+def vincular_en_transaccion(tenant_id, datos):
+    """Para quien no tiene un cursor sync abierto (modo ASGI): vincula y commitea."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        empezar_transaccion(conn)
+        ids = vincular_contrato(cur, tenant_id, datos)
+        conn.commit()
+        cur.close()
+    return ids
+
+
+def buscar(tenant_id, nombre, tipo="persona"):
+    """Partes parecidas a `nombre`, con su similitud (sin crear nada)."""
+    toks = tokens(nombre, tipo)
+    if not toks:
+        return []
+    k = clave(toks)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cands = candidatos(cur, tenant_id, tipo, toks)
+        cur.close()
+    out = [
+        {"id": cid, "nombre": cnombre, "clave": cclave, "similitud": round(similitud(k, cclave), 3)}
+        for cid, cnombre, cclave in cands
+    ]
+    out.sort(key=lambda x: (-x["similitud"], x["id"]))
+    return out
+
+
+# =========================================================
+# Re-agrupado en lote (filas históricas)
+# =========================================================
+def reclusterizar(tenant_id, desde_cero=False, lote=1000, progreso=None):
+    """
+    Vincula los contratos del tenant que tienen nombre pero no parte.
+    desde_cero=True borra las partes del tenant y re-agrupa todo (por ejemplo
+    después de cambiar PARTES_UMBRAL o las reglas de normalización).
+    Devuelve {"contratos": n, "partes": n}.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if desde_cero:
+            cur.execute(
+                adaptar_sql(
+                    "UPDATE contratos SET inquilino_id = NULL, propietario_id = NULL, inmobiliaria_id = NULL "
+                    "WHERE tenant_id = %s"
+                ),
+                (tenant_id,),
+            )
+            cur.execute(adaptar_sql("DELETE FROM partes_bloques WHERE tenant_id = %s"), (tenant_id,))
+            cur.execute(adaptar_sql("DELETE FROM partes WHERE tenant_id = %s"), (tenant_id,))
+            conn.commit()
+
+        pendiente = " OR ".join(f"({c} IS NOT NULL AND {col} IS NULL)" for c, (_, col) in COLUMNAS.items())
+        memo = {}
+        ultimo, total = 0, 0
+        while True:
+            cur.execute(
+                adaptar_sql(f"""
+                    SELECT id, inquilino, propietario, inmobiliaria, inquilino_id, propietario_id, inmobiliaria_id
+                    FROM contratos
+                    WHERE tenant_id = %s AND id > %s AND ({pendiente})
+                    ORDER BY id ASC
+                    LIMIT %s
+                """),
+                (tenant_id, ultimo, lote),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            filas = []
+            for r in rows:
+                # las columnas ya vinculadas se respetan
+                faltan = {c: r.get(c) for c, (_, col) in COLUMNAS.items() if r.get(col) is None}
+                ids = vincular_contrato(cur, tenant_id, faltan, memo)
+                filas.append(tuple(r.get(col) or ids[col] for _, col in COLUMNAS.values()) + (r.get("id"),))
+            cur.executemany(
+                adaptar_sql(
+                    "UPDATE contratos SET inquilino_id = %s, propietario_id = %s, inmobiliaria_id = %s WHERE id = %s"
+                ),
+                filas,
+            )
+            conn.commit()
+
+            ultimo = rows[-1].get("id")
+            total += len(rows)
+            if progreso:
+                progreso(total)
+
+        cur.execute(adaptar_sql("SELECT COUNT(*) AS n FROM partes WHERE tenant_id = %s"), (tenant_id,))
+        n_partes = cur.fetchone().get("n")
+        cur.close()
+
+    return {"contratos": total, "partes": int(n_partes)}
+
+
+if __name__ == "__main__":
+    import tenants
+
+    p = argparse.ArgumentParser(description="Vincula contratos a partes normalizadas (re-agrupado en lote).")
+    p.add_argument("--tenant", default=None, help="slug del tenant (default: todos)")
+    p.add_argument("--desde-cero", action="store_true", help="borrar las partes y re-agrupar todo")
+    p.add_argument("--lote", type=int, default=1000)
+    a = p.parse_args()
+
+    lista = [t for t in tenants.listar() if a.tenant in (None, t["slug"])]
+    if not lista:
+        raise SystemExit(f"tenant desconocido: {a.tenant}")
+
+    for t in lista:
+        t0 = datetime.now()
+        res = reclusterizar(t["id"], desde_cero=a.desde_cero, lote=a.lote)
+        seg = (datetime.now() - t0).total_seconds()
+        print(f"{t['slug']}: {res['contratos']} contratos vinculados, {res['partes']} partes ({seg:.1f} s)")
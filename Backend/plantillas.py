@@ -0,0 +1,52 @@
+import os
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+# =========================================================
+# Plantillas de email (Jinja2)
+#
+# Se compilan una vez, al importar el módulo: renderizar un aviso es sólo
+# ejecutar la plantilla ya compilada. Cada email sale en texto y en HTML
+# (templates/avisos/<nombre>.txt y .html); el HTML escapa lo que viene de
+# los contratos (nombres cargados por la IA o a mano).
+# =========================================================
+DIR_PLANTILLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "avisos")
+
+ROLES = {"inquilino": "Inquilino", "propietario": "Propietario"}
+
+_env = Environment(
+    loader=FileSystemLoader(DIR_PLANTILLAS),
+    autoescape=select_autoescape(["html"]),
+    undefined=StrictUndefined,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+    auto_reload=False,
+)
+_env.globals["ROLES"] = ROLES
+_env.filters["roles"] = lambda roles: " y ".join(ROLES[r] for r in roles)
+
+_ASUNTO = _env.from_string(
+    "[Alquileres AI] "
+    "{% if contratos|length == 1 %}"
+    "Contrato por vencer en {{ contratos[0].dias_restantes }} días (ID {{ contratos[0].id }})"
+    "{% else %}"
+    "{{ contratos|length }} contratos por vencer (el primero en {{ contratos[0].dias_restantes }} días)"
+    "{% endif %}"
+)
+_TEXTO = _env.get_template("vencimientos.txt")
+_HTML = _env.get_template("vencimientos.html")
+
+
+def digest_vencimientos(contratos):
+    """
+    Un email con todos los contratos por vencer de un destinatario.
+    contratos: [{"id", "roles", "inquilino", "propietario", "fecha_fin", "dias_restantes"}],
+    en el orden en que se listan (el primero es el más próximo).
+    Devuelve (asunto, texto, html).
+    """
+    return (
+        _ASUNTO.render(contratos=contratos),
+        _TEXTO.render(contratos=contratos),
+        _HTML.render(contratos=contratos),
+    )
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+import importlib
+
+from dotenv import load_dotenv
+
+# =========================================================
+# Recursos de proceso (singletons perezosos)
+#
+# Los clientes caros de armar se crean la primera vez que alguien los pide,
+# una sola vez por proceso, y quedan acá:
+#   - db:         pool de conexiones (motor y parámetros de DB_*)
+#   - groq:       cliente Groq (importar groq solo ya son ~0.3 s)
+#   - groq_async: AsyncGroq para el modo ASGI
+#   - http:       requests.Session de mailer (keep-alive con Resend)
+#
+# Cada recurso es "modulo:funcion" y el módulo se importa recién al crearlo,
+# así importar la app no arrastra groq ni requests. /api/health/ready los
+# crea a propósito (calentar) para que el primer request real no pague el
+# arranque; `python -m bench.arranque` mide cuánto cuesta cada cosa.
+#
+# Después de un fork (gunicorn --preload) el hijo arranca sin instancias:
+# conexiones y sockets no se comparten entre procesos.
+# =========================================================
+RECURSOS = {
+    "db": "db:_crear_pool",
+    "groq": "ai:_crear_cliente",
+    "groq_async": "ai:_crear_cliente_async",
+    "http": "mailer:_crear_session",
+}
+READY_RECURSOS = [r.strip() for r in os.getenv("READY_RECURSOS", "db,groq,groq_async,http").split(",") if r.strip()]
+
+_instancias = {}
+_tiempos_ms = {}
+_errores = {}
+_lock = threading.RLock()
+_entorno_cargado = False
+_calentando = None
+
+
+def cargar_entorno():
+    """load_dotenv() una sola vez por proceso (lo llaman db.py y ai.py al importarse)."""
+    global _entorno_cargado
+    if not _entorno_cargado:
+        with _lock:
+            if not _entorno_cargado:
+                load_dotenv()
+                _entorno_cargado = True
+
+
+def obtener(nombre):
+    """La instancia del recurso; la crea si es la primera vez. Propaga el error de creación."""
+    inst = _instancias.get(nombre)
+    if inst is not None:
+        return inst
+
+    with _lock:
+        if nombre in _instancias:
+            return _instancias[nombre]
+
+        modulo, funcion = RECURSOS[nombre].split(":")
+        t0 = time.perf_counter()
+        try:
+            inst = getattr(importlib.import_module(modulo), funcion)()
+        except Exception as e:
+            _errores[nombre] = repr(e)
+            raise
+        finally:
+            _tiempos_ms[nombre] = round((time.perf_counter() - t0) * 1000, 1)
+        _errores.pop(nombre, None)
+        _instancias[nombre] = inst
+    return inst
+
+
+def calentar(nombres=None):
+    """Crea los recursos (default READY_RECURSOS) y devuelve estado() de esos."""
+    nombres = nombres or READY_RECURSOS
+    for nombre in nombres:
+        try:
+            obtener(nombre)
+        except Exception:
+            pass  # queda en _errores; lo reporta estado()
+    return estado(nombres)
+
+
+def calentar_en_fondo(nombres=None):
+    """calentar() en un thread, una sola vez a la vez (para liveness: responde sin esperar)."""
+    global _calentando
+    with _lock:
+        if _calentando is not None and _calentando.is_alive():
+            return
+        _calentando = threading.Thread(target=calentar, args=(nombres,), name="registro-calentar", daemon=True)
+        _calentando.start()
+
+
+def estado(nombres=None):
+    """{nombre: {"listo", "ms" (lo que tardó en crearse), "error"}}."""
+    return {
+        nombre: {
+            "listo": nombre in _instancias,
+            "ms": _tiempos_ms.get(nombre),
+            "error": _errores.get(nombre),
+        }
+        for nombre in (nombres or RECURSOS)
+    }
+
+
+def _despues_del_fork():
+    global _lock, _calentando
+    _lock = threading.RLock()
+    _calentando = None
+    _instancias.clear()
+    _tiempos_ms.clear()
+    _errores.clear()
+
+
+os.register_at_fork(after_in_child=_despues_del_fork)
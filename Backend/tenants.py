@@ -0,0 +1,144 @@
+import os
+import re
+import hmac
+import threading
+import unicodedata
+from datetime import datetime
+
+from flask import g, request
+
+from db import db_connection, adaptar_sql, insert_and_get_id
+
+# =========================================================
+# Tenants (una inmobiliaria = un tenant)
+#
+# Cada request trae el tenant en el header X-Tenant (slug, ej. "inmobiliaria-sur").
+# Todas las consultas de contratos filtran por tenant_id y los índices de
+# contratos empiezan por tenant_id, así cada consulta es un rango sobre las
+# filas de un solo tenant.
+#
+# El header es obligatorio (400 sin él): la migración 0004 repartió los
+# contratos por inmobiliaria, así que caer en un tenant fijo haría que un
+# cliente viejo vea (y notifique) sólo una parte sin enterarse.
+# TENANT_DEFAULT=<slug> restablece un tenant por default, a propósito.
+#
+# Alta y listado de tenants (/api/tenants) son de administración: piden
+# Authorization: Bearer <TENANTS_ADMIN_TOKEN>, y sin ese token configurado
+# no existen (404).
+# =========================================================
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant")
+TENANT_DEFAULT = os.getenv("TENANT_DEFAULT", "").strip().lower()
+TENANTS_ADMIN_TOKEN = os.getenv("TENANTS_ADMIN_TOKEN", "")
+SLUG_DEFAULT = "default"
+
+_ids = {}  # slug -> id (los tenants no se borran: se cachean para siempre)
+_lock = threading.Lock()
+
+
+class TenantError(Exception):
+    def __init__(self, mensaje, status=400, header=None):
+        super().__init__(mensaje)
+        self.status = status
+        self.header = header or TENANT_HEADER
+
+
+def slug(nombre):
+    """'Casa & Co. S.A.' -> 'casa-co-s-a'. Vacío/None -> 'default'."""
+    s = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode()
+    s = re.sub(r"[^a-z0-9]+", "-", s.lower()).strip("-")
+    return s[:120] or SLUG_DEFAULT
+
+
+def _fila(r):
+    return {
+        "id": r.get("id"),
+        "slug": r.get("slug"),
+        "nombre": r.get("nombre"),
+        "creado_en": str(r.get("creado_en")) if r.get("creado_en") else None,
+    }
+
+
+def buscar_id(valor):
+    """id del tenant con ese slug, o None si no existe."""
+    with _lock:
+        if valor in _ids:
+            return _ids[valor]
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql("SELECT id FROM tenants WHERE slug = %s"), (valor,))
+        row = cur.fetchone()
+        cur.close()
+
+    if not row:
+        return None
+    with _lock:
+        _ids[valor] = row.get("id")
+    return row.get("id")
+
+
+def resolver(valor):
+    """Header X-Tenant -> tenant_id. Lanza TenantError (400 sin tenant, 404 desconocido)."""
+    valor = (valor or "").strip().lower() or TENANT_DEFAULT
+    if not valor:
+        raise TenantError(f"Falta el header {TENANT_HEADER}", 400)
+
+    tenant_id = buscar_id(valor)
+    if tenant_id is None:
+        raise TenantError(f"tenant desconocido: {valor}", 404)
+    return tenant_id
+
+
+def exigir_admin(authorization):
+    """
+    Header Authorization de las rutas de administración de tenants.
+    Lanza TenantError (404 si no hay TENANTS_ADMIN_TOKEN, 401 si no coincide).
+    """
+    if not TENANTS_ADMIN_TOKEN:
+        raise TenantError("not found", 404, "Authorization")
+    esquema, _, token = (authorization or "").partition(" ")
+    if esquema.lower() != "bearer" or not hmac.compare_digest(token.strip(), TENANTS_ADMIN_TOKEN):
+        raise TenantError("no autorizado", 401, "Authorization")
+
+
+def tenant_actual():
+    """tenant_id del request Flask en curso (se resuelve una vez por request)."""
+    if "tenant_id" not in g:
+        g.tenant_id = resolver(request.headers.get(TENANT_HEADER))
+    return g.tenant_id
+
+
+def crear(nombre, valor=None):
+    """Alta de un tenant. Devuelve (tenant, creado); si el slug ya existe devuelve ese."""
+    valor = slug(valor or nombre)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(adaptar_sql("SELECT * FROM tenants WHERE slug = %s"), (valor,))
+        row = cur.fetchone()
+        if row:
+            cur.close()
+            return _fila(row), False
+
+        ahora = datetime.now()
+        tenant_id = insert_and_get_id(
+            cur,
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (%s, %s, %s)",
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (%s, %s, %s) RETURNING id",
+            "INSERT INTO tenants (slug, nombre, creado_en) VALUES (?, ?, ?)",
+            (valor, nombre, ahora),
+        )
+        conn.commit()
+        cur.close()
+
+    with _lock:
+        _ids[valor] = tenant_id
+    return {"id": tenant_id, "slug": valor, "nombre": nombre, "creado_en": str(ahora)}, True
+
+
+def listar():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM tenants ORDER BY id ASC")
+        rows = cur.fetchall()
+        cur.close()
+    return [_fila(r) for r in rows]
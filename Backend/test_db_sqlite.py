@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import pytest
+
+import db_async
+import db_sqlite
+
+#   python -m pytest -q test_db_sqlite.py
+
+pytestmark = pytest.mark.skipif(
+    db_async.DB_ENGINE != "sqlite" or not db_sqlite.produccion(), reason="perfil de producción de SQLite",
+)
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    path = str(tmp_path / "t.db")
+    conn = db_sqlite.conectar(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db_async, "DB_PATH", path)
+    return path
+
+
+def test_escritura_async_toma_el_lock_de_escritor(base):
+    async def correr():
+        async with db_async.conexion() as c:
+            await c.fetchall("SELECT * FROM t")
+            assert not db_sqlite._escritor.locked()  # las lecturas no lo toman
+            await c.execute("INSERT INTO t (v) VALUES (%s)", ("a",))
+            assert db_sqlite._escritor.locked()
+            await c.commit()
+            assert not db_sqlite._escritor.locked()
+
+    asyncio.run(correr())
+
+
+def test_transaccion_async_serializa_con_escrituras_sync(base):
+    orden = []
+
+    def escritura_sync(listo):
+        listo.wait()
+        conn = db_sqlite.conectar(base)
+        conn.execute("INSERT INTO t (v) VALUES ('sync')")  # espera a que la async suelte el lock
+        orden.append("sync")
+        conn.commit()
+        conn.close()
+
+    async def correr():
+        listo = threading.Event()
+        hilo = threading.Thread(target=escritura_sync, args=(listo,))
+        hilo.start()
+        async with db_async.conexion() as c:
+            async with c.transaccion():
+                assert db_sqlite._escritor.locked()  # BEGIN IMMEDIATE de entrada
+                listo.set()
+                await asyncio.sleep(0.2)
+                await c.execute("INSERT INTO t (v) VALUES (%s)", ("async",))
+                orden.append("async")
+            assert not db_sqlite._escritor.locked()
+        await asyncio.to_thread(hilo.join)
+
+    asyncio.run(correr())
+    assert orden == ["async", "sync"]
+
+
+def test_transaccion_async_rollback_suelta_el_lock(base):
+    async def correr():
+        async with db_async.conexion() as c:
+            with pytest.raises(RuntimeError):
+                async with c.transaccion():
+                    await c.execute("INSERT INTO t (v) VALUES (%s)", ("x",))
+                    raise RuntimeError("falla")
+            assert not db_sqlite._escritor.locked()
+            return await c.fetchall("SELECT * FROM t")
+
+    assert asyncio.run(correr()) == []
@@ -0,0 +1,346 @@
+import pytest
+
+import llm
+import ai_cache
+from ai_json import ParserExtraccion, JSONInvalido, parsear
+from ai_reglas import extraer_por_reglas, campos_confiables, fecha_iso
+
+#   python -m pytest -q test_ia.py
+
+
+# =========================================================
+# ai_json: parser incremental del JSON de extracción
+# =========================================================
+COMPLETO = (
+    '{"inmobiliaria": "Inmobiliaria Sur", "inquilino": "Ana Gómez", "propietario": null, '
+    '"fecha_inicio": "2024-03-01", "fecha_fin": "2026-02-28"}'
+)
+
+
+def _alimentar_de_a(texto, n):
+    p = ParserExtraccion()
+    for i in range(0, len(texto), n):
+        p.alimentar(texto[i:i + n])
+    return p.terminar()
+
+
+def test_json_de_una_vez():
+    assert parsear(COMPLETO) == {
+        "inmobiliaria": "Inmobiliaria Sur",
+        "inquilino": "Ana Gómez",
+        "propietario": None,
+        "fecha_inicio": "2024-03-01",
+        "fecha_fin": "2026-02-28",
+    }
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7])
+def test_json_claves_y_valores_partidos_entre_fragmentos(n):
+    assert _alimentar_de_a(COMPLETO, n) == parsear(COMPLETO)
+
+
+def test_json_null_partido():
+    p = ParserExtraccion()
+    for fragmento in ('{"propietario": n', "u", "ll", "}"):
+        p.alimentar(fragmento)
+    assert p.terminar() == {"propietario": None}
+
+
+def test_json_comillas_escapadas():
+    assert parsear(r'{"inmobiliaria": "La \"Casa\" SRL"}') == {"inmobiliaria": 'La "Casa" SRL'}
+
+
+def test_json_escape_partido_entre_fragmentos():
+    p = ParserExtraccion()
+    for fragmento in ('{"inquilino": "Juan \\', '"Tito\\', '" Pérez"}'):
+        p.alimentar(fragmento)
+    assert p.terminar() == {"inquilino": 'Juan "Tito" Pérez'}
+
+
+def test_json_escapes_unicode():
+    texto = '{"inquilino": "Mar\\u00eda N\\u00fa\\u00f1ez"}'
+    assert parsear(texto) == {"inquilino": "María Núñez"}
+    assert _alimentar_de_a(texto, 1) == {"inquilino": "María Núñez"}
+
+
+def test_json_cierra_con_la_llave():
+    p = ParserExtraccion()
+    assert p.alimentar('{"fecha_fin": "2026-02-28"') is False
+    assert p.alimentar("}") is True
+    assert p.completo
+
+
+@pytest.mark.parametrize("texto, motivo", [
+    ('{"monto": "1000"}', "clave fuera del esquema"),
+    ('{"inquilino": "Ana", "inquilino": "Beto"}', "clave repetida"),
+    ('{"inquilino": "Ana"} x', "texto después del objeto"),
+    ('{"inquilino": "Ana"}{}', "texto después del objeto"),
+    ('{"inquilino": 3}', "sólo string o null"),
+    ('{"inquilino": nul}', "sólo string o null"),
+    ('```json {"inquilino": "Ana"}', "se esperaba '{'"),
+    ('{"inquilino": "Ana",}', "se esperaba una clave"),
+    ('{"inquilino": "\\x"}', "escape inválido"),
+])
+def test_json_rechazos(texto, motivo):
+    with pytest.raises(JSONInvalido, match=motivo):
+        parsear(texto)
+
+
+def test_json_clave_desconocida_corta_sin_esperar_el_resto():
+    p = ParserExtraccion()
+    with pytest.raises(JSONInvalido, match="clave fuera del esquema"):
+        p.alimentar('{"inquilino": "Ana", "extra"')
+
+
+def test_json_espacios_despues_del_objeto():
+    assert parsear(COMPLETO + " \n") == parsear(COMPLETO)
+
+
+@pytest.mark.parametrize("texto, motivo", [
+    ("", "respuesta vacía"),
+    ('{"inquilino": "An', "respuesta incompleta"),
+])
+def test_json_stream_cortado(texto, motivo):
+    with pytest.raises(JSONInvalido, match=motivo):
+        parsear(texto)
+
+
+# =========================================================
+# ai_reglas: pre-extracción por reglas
+# =========================================================
+PLANTILLA = """
+CONTRATO DE LOCACIÓN
+LOCADOR: Carlos Méndez, DNI 20.123.456
+LOCATARIO: Lucía Díaz, DNI 30.456.789
+INMOBILIARIA: Inmobiliaria Sur
+El plazo rige desde el 01/03/2024 hasta el 28/02/2026.
+"""
+
+
+def test_reglas_plantilla():
+    pre = extraer_por_reglas(PLANTILLA)
+    assert pre["data"] == {
+        "inmobiliaria": "Inmobiliaria Sur",
+        "inquilino": "Lucía Díaz",
+        "propietario": "Carlos Méndez",
+        "fecha_inicio": "2024-03-01",
+        "fecha_fin": "2026-02-28",
+    }
+    assert campos_confiables(pre) == ["inmobiliaria", "inquilino", "propietario", "fecha_inicio", "fecha_fin"]
+
+
+def test_reglas_en_adelante():
+    texto = (
+        "Entre Carlos Méndez, DNI 20.123.456, en adelante EL LOCADOR; "
+        "y Lucía Díaz, DNI 30.456.789, en adelante LA LOCATARIA; convienen:"
+    )
+    pre = extraer_por_reglas(texto)
+    assert pre["data"]["propietario"] == "Carlos Méndez"
+    assert pre["data"]["inquilino"] == "Lucía Díaz"
+    assert pre["confianza"]["propietario"] == pytest.approx(0.85)
+
+
+def test_reglas_sin_datos():
+    pre = extraer_por_reglas("Texto sin nada reconocible.")
+    assert all(v is None for v in pre["data"].values())
+    assert campos_confiables(pre) == []
+
+
+def test_reglas_valores_distintos_bajan_la_confianza():
+    pre = extraer_por_reglas("LOCADOR: Carlos Méndez.\nPROPIETARIO: Jorge Ruiz.\n")
+    assert pre["confianza"]["propietario"] == pytest.approx(0.95 * 0.5)
+    assert "propietario" not in campos_confiables(pre)
+
+
+def test_reglas_inquilino_igual_a_propietario():
+    pre = extraer_por_reglas("LOCADOR: Ana Gómez.\nLOCATARIO: Ana Gómez.\n")
+    assert pre["confianza"]["inquilino"] == pre["confianza"]["propietario"] == 0.0
+
+
+def test_reglas_fechas_invertidas():
+    pre = extraer_por_reglas("Rige desde el 01/03/2026 hasta el 28/02/2024.")
+    assert pre["confianza"]["fecha_inicio"] == pre["confianza"]["fecha_fin"] == 0.0
+
+
+def test_reglas_intermediario_no_alcanza_el_minimo():
+    pre = extraer_por_reglas("Se firma por intermedio de Inmobiliaria Norte, en la ciudad.")
+    assert pre["data"]["inmobiliaria"] == "Inmobiliaria Norte"
+    assert campos_confiables(pre) == []
+    assert campos_confiables(pre, minimo=0.7) == ["inmobiliaria"]
+
+
+@pytest.mark.parametrize("texto, iso", [
+    ("01/03/2024", "2024-03-01"),
+    ("1-3-2024", "2024-03-01"),
+    ("2024-03-01", "2024-03-01"),
+    ("1° de marzo de 2024", "2024-03-01"),
+    ("15 de setiembre del 2025", "2025-09-15"),
+    ("31/02/2024", None),
+    ("1 de brumario de 2024", None),
+    ("", None),
+])
+def test_fecha_iso(texto, iso):
+    assert fecha_iso(texto) == iso
+
+
+# =========================================================
+# llm.Circuito: cerrado -> abierto -> semi_abierto -> cerrado/abierto
+# =========================================================
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(llm.time, "monotonic", lambda: ahora[0])
+    monkeypatch.setattr(llm, "LLM_CB_FALLOS", 3)
+    monkeypatch.setattr(llm, "LLM_CB_ESPERA", 30.0)
+    return ahora
+
+
+def _abrir(c):
+    for _ in range(llm.LLM_CB_FALLOS):
+        assert c.permitir()
+        c.fallo()
+
+
+def test_circuito_abre_con_fallas_seguidas(reloj):
+    c = llm.Circuito("modelo-test")
+    c.fallo()
+    c.fallo()
+    assert c.estado == "cerrado" and c.permitir()
+    c.fallo()
+    assert c.estado == "abierto"
+    assert not c.permitir()
+    assert c.reintentar_en() == pytest.approx(30.0)
+
+
+def test_circuito_un_exito_resetea_las_fallas(reloj):
+    c = llm.Circuito("modelo-test")
+    c.fallo()
+    c.fallo()
+    c.exito()
+    c.fallo()
+    c.fallo()
+    assert c.estado == "cerrado"
+
+
+def test_circuito_semi_abierto_deja_pasar_una_prueba(reloj):
+    c = llm.Circuito("modelo-test")
+    _abrir(c)
+    reloj[0] += 29.9
+    assert not c.permitir()
+    reloj[0] += 0.1
+    assert c.permitir()
+    assert c.estado == "semi_abierto"
+    assert not c.permitir()  # la prueba está en vuelo
+
+
+def test_circuito_prueba_exitosa_cierra(reloj):
+    c = llm.Circuito("modelo-test")
+    _abrir(c)
+    reloj[0] += 30
+    assert c.permitir()
+    c.exito()
+    assert c.estado == "cerrado" and c.fallos == 0
+    assert c.permitir() and c.permitir()
+
+
+def test_circuito_prueba_fallida_vuelve_a_abrir(reloj):
+    c = llm.Circuito("modelo-test")
+    _abrir(c)
+    reloj[0] += 30
+    assert c.permitir()
+    c.fallo()
+    assert c.estado == "abierto"
+    assert not c.permitir()
+    assert c.reintentar_en() == pytest.approx(30.0)
+
+
+def test_circuito_liberar_no_cuenta_pero_suelta_la_prueba(reloj):
+    c = llm.Circuito("modelo-test")
+    _abrir(c)
+    reloj[0] += 30
+    assert c.permitir()
+    c.liberar()  # 429: no dice nada del modelo
+    assert c.estado == "semi_abierto"
+    assert c.permitir()
+    assert not c.permitir()
+
+
+
+# =========================================================
+# llm, modo sync: cupos de threads para originales y duplicados
+# =========================================================
+@pytest.fixture
+def cupos(monkeypatch):
+    monkeypatch.setattr(llm, "_cupo_original", llm.threading.BoundedSemaphore(1))
+    monkeypatch.setattr(llm, "_cupo_hedge", llm.threading.BoundedSemaphore(1))
+    monkeypatch.setattr(llm, "_circuitos", {m: llm.Circuito(m) for m in llm.MODELOS})
+    llamadas = []
+
+    def intento(modelo, mensajes, timeout, parser, opciones, demoras=[0.3, 0.0]):
+        n = len(llamadas)
+        llamadas.append(timeout)
+        llm.time.sleep(demoras[min(n, len(demoras) - 1)])
+        return f"respuesta {n}", None, 0.0
+
+    monkeypatch.setattr(llm, "_intento", intento)
+    return llamadas
+
+
+def test_sin_thread_para_el_original_es_sin_hilo_y_no_timeout(cupos):
+    llm._cupo_original.acquire()  # otro pedido lo tiene
+    t0 = llm.time.monotonic()
+    with pytest.raises(llm._SinHilo):
+        llm._intento_con_hedge(llm.MODELOS[0], [], 0.8, None, {})
+    assert llm.time.monotonic() - t0 < 0.8
+    assert cupos == []
+
+
+def test_duplicado_sin_cupo_no_se_manda(cupos, monkeypatch):
+    monkeypatch.setattr(llm, "_espera_hedge", lambda modelo: 0.05)
+    llm._cupo_hedge.acquire()
+    texto, _, _ = llm._intento_con_hedge(llm.MODELOS[0], [], 2.0, None, {})
+    assert texto == "respuesta 0" and len(cupos) == 1
+
+
+def test_duplicado_gana_y_los_cupos_vuelven(cupos, monkeypatch):
+    monkeypatch.setattr(llm, "_espera_hedge", lambda modelo: 0.05)
+    texto, _, _ = llm._intento_con_hedge(llm.MODELOS[0], [], 2.0, None, {})
+    assert texto == "respuesta 1" and len(cupos) == 2
+    # el original perdedor suelta su cupo cuando termina
+    assert llm._cupo_original.acquire(timeout=1) and llm._cupo_hedge.acquire(timeout=1)
+
+
+def test_sin_hilo_no_abre_el_circuito(cupos, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_CB_FALLOS", 1)
+    monkeypatch.setattr(llm, "LLM_REINTENTOS", 0)
+
+    def saturado(*args):
+        raise llm._SinHilo("sin thread")
+
+    monkeypatch.setattr(llm, "_intento_con_hedge", saturado)
+    with pytest.raises(llm.LLMError) as e:
+        llm.completar([{"role": "user", "content": "x"}])
+    assert {i["resultado"] for i in e.value.intentos} == {"sin_hilo"}
+    assert all(c.estado == "cerrado" for c in llm._circuitos.values())
+
+# =========================================================
+def test_cache_hit_es_copia_sin_tiempos_de_la_extraccion_original(monkeypatch):
+    monkeypatch.setattr(ai_cache, "_mem", ai_cache.TTLCache(maxsize=10, ttl=60))
+    monkeypatch.setattr(ai_cache, "_guardar_db", lambda clave, res: None)
+    res = {
+        "ok": True, "model": ai_cache.MODEL, "raw": '{"inquilino": "Ana"}',
+        "data": {"inquilino": "Ana", "fecha_fin": None},
+        "tiempos_ms": {"reglas": 0.4, "llm": 812.0}, "recorte": {"recortado": True}, "intentos": 2,
+    }
+    ai_cache.guardar("k", res)
+    res["data"]["inquilino"] = "modificado después de guardar"
+
+    hit, tier = ai_cache.buscar("k")
+    assert tier == "memoria"
+    assert hit["data"] == {"inquilino": "Ana", "fecha_fin": None}
+    assert set(hit["tiempos_ms"]) == {"cache"}
+    assert hit["raw"] is None and hit["recorte"] is None and hit["intentos"] == 0
+
+    hit["data"]["inquilino"] = "otro request"
+    otro, _ = ai_cache.buscar("k")
+    assert otro["data"]["inquilino"] == "Ana"
@@ -0,0 +1,59 @@
+from app import armar_envios, sql_crear_envios
+
+#   python -m pytest -q test_notificaciones.py
+
+
+def _fila(id, email_inquilino, email_propietario, dias=30, **extra):
+    return {
+        "id": id,
+        "etapa": 30,
+        "dias_restantes": dias,
+        "inquilino": "Lucía Díaz",
+        "propietario": "Carlos Méndez",
+        "fecha_fin": "2026-02-28",
+        "email_inquilino": email_inquilino,
+        "email_propietario": email_propietario,
+        **extra,
+    }
+
+
+def test_un_digest_por_destinatario():
+    envios, saltados = armar_envios([
+        _fila(1, "ana@x.com", "carlos@x.com", dias=20),
+        _fila(2, "ana@x.com", "jorge@x.com", dias=10),
+        _fila(3, None, " "),
+    ], tenant_id=1)
+    por_email = {e["destinatario"]: e for e in envios}
+    assert sorted(por_email) == ["ana@x.com", "carlos@x.com", "jorge@x.com"]
+    assert [c["id"] for c in por_email["ana@x.com"]["contratos"]] == [2, 1]
+    assert saltados == [{"id": 3, "motivo": "sin_emails"}]
+
+
+def test_mismo_email_para_inquilino_y_propietario():
+    envios, _ = armar_envios([_fila(7, "Ana@X.com", " ana@x.com ")], tenant_id=1)
+
+    assert len(envios) == 1
+    e = envios[0]
+    assert e["destinatario"] == "ana@x.com"
+    assert len(e["contratos"]) == 1
+    assert e["contratos"][0]["roles"] == ["inquilino", "propietario"]
+    assert e["texto"].count("Contrato ID: 7") == 1
+    assert "Tu rol: Inquilino y Propietario" in e["texto"]
+    assert e["html"].count("<td>7</td>") == 1
+
+    _, (_, items) = sql_crear_envios(1, envios)
+    assert items == [(7, 30, "ana@x.com", e["clave"], "inquilino,propietario", 30)]
+
+
+def test_misma_clave_con_uno_o_dos_roles():
+    solo, _ = armar_envios([_fila(7, "ana@x.com", None)], tenant_id=1)
+    ambos, _ = armar_envios([_fila(7, "ana@x.com", "ana@x.com")], tenant_id=1)
+    assert solo[0]["clave"] == ambos[0]["clave"]
+
+
+def test_rol_ya_asignado_no_se_repite():
+    envios, _ = armar_envios(
+        [_fila(7, "ana@x.com", "carlos@x.com", asignado_inquilino=1)], tenant_id=1,
+    )
+    assert [e["destinatario"] for e in envios] == ["carlos@x.com"]
+    assert envios[0]["contratos"][0]["roles"] == ["propietario"]
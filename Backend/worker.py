@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import signal
+import socket
+
+import jobs
+import app  # noqa: F401  (registra los handlers de jobs)
+
+JOB_POLL = float(os.getenv("JOB_POLL", "2"))  # seg. entre consultas cuando no hay jobs
+
+_parar = False
+
+
+def _on_signal(signum, frame):
+    global _parar
+    _parar = True
+    print(f"Señal {signum}: termino el job actual y salgo.")
+
+
+def main(once=False):
+    """
+    Loop del worker: reclama un job, lo corre, repite.
+    Se pueden levantar varios workers (en una o varias máquinas): el claim usa
+    bloqueo de filas, así que cada job lo toma uno solo.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    print(f"Worker {worker_id} iniciado (handlers: {', '.join(sorted(jobs.HANDLERS))})")
+
+    while not _parar:
+        job = jobs.reclamar(worker_id)
+        if not job:
+            if once:
+                break
+            time.sleep(JOB_POLL)
+            continue
+
+        print(f"▶ job {job['id']} ({job['tipo']}) intento {job['intentos']}/{job['max_intentos']}")
+        estado = jobs.ejecutar_job(job)
+        print(f"■ job {job['id']} -> {estado}")
+
+
+if __name__ == "__main__":
+    main(once="--once" in sys.argv)